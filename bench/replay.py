@@ -0,0 +1,160 @@
+import os
+import json
+import hashlib
+import aiohttp
+from aiohttp import web
+from urllib.parse import urlsplit, parse_qsl, urlencode
+from typing import Dict, Tuple
+
+from common.scheduler import FetchScheduler, HostLimits, DEFAULT_HOST_LIMITS
+
+"""
+Recorded HTTP fixtures + a local stand-in server to replay them
+
+record: RecordingScheduler tees every body the fetchers read into {fixtures}/http
+replay: ReplayScheduler points every request at ReplayServer, which serves those bodies back
+fixtures are keyed by method + host + path + sorted query (minus per-session params like the yahoo crumb)
+"""
+
+VOLATILE_PARAMS = ["crumb"]
+
+
+def fixture_key(method: str, url: str) -> str:
+    parts = urlsplit(url)
+    query = sorted(
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key not in VOLATILE_PARAMS
+    )
+    return f"{method.upper()} {parts.hostname}{parts.path}?{urlencode(query)}"
+
+
+class FixtureStore:
+    def __init__(self, dir: str):
+        self.dir = os.path.join(dir, "http")
+        self.index_path = os.path.join(self.dir, "index.json")
+        self.index: Dict[str, Dict] = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r") as f:
+                self.index = json.load(f)
+
+    def save(self, method: str, url: str, status: int, content_type: str, body: bytes):
+        key = fixture_key(method, url)
+        file_name = f"{hashlib.sha1(key.encode()).hexdigest()}.bin"
+        os.makedirs(self.dir, exist_ok=True)
+        with open(os.path.join(self.dir, file_name), "wb") as f:
+            f.write(body)
+
+        self.index[key] = {
+            "url": url,
+            "status": status,
+            "content_type": content_type,
+            "file": file_name,
+        }
+
+    def load(self, key: str) -> Tuple[Dict, bytes] | None:
+        entry = self.index.get(key)
+        if not entry:
+            return None
+
+        with open(os.path.join(self.dir, entry["file"]), "rb") as f:
+            return entry, f.read()
+
+    def find(self, url_contains: str) -> bytes | None:
+        for key in self.index:
+            if url_contains in key:
+                return self.load(key)[1]
+        return None
+
+    def flush(self):
+        os.makedirs(self.dir, exist_ok=True)
+        with open(self.index_path, "w") as f:
+            json.dump(self.index, f, indent=4, sort_keys=True)
+
+
+class RecordingScheduler(FetchScheduler):
+    def __init__(self, fixtures: FixtureStore, **kwargs):
+        super().__init__(**kwargs)
+        self.fixtures = fixtures
+
+    async def request(self, session, method, url, read, **kwargs):
+        async def recording_read(response: aiohttp.ClientResponse):
+            # aiohttp keeps the body around so read() then json()/text() is fine
+            body = await response.read()
+            self.fixtures.save(
+                method,
+                url,
+                response.status,
+                response.headers.get("Content-Type", ""),
+                body,
+            )
+            return await read(response)
+
+        return await super().request(session, method, url, recording_read, **kwargs)
+
+
+class ReplayScheduler(FetchScheduler):
+    def __init__(self, base_url: str, **kwargs):
+        # replay measures our cost, not the sites' rate limits
+        host_limits = {
+            host: HostLimits(max_concurrency=64, rate=1e6, burst=1e6)
+            for host in DEFAULT_HOST_LIMITS
+        }
+        super().__init__(
+            host_limits=host_limits,
+            default_limits=HostLimits(max_concurrency=64, rate=1e6, burst=1e6),
+            retries=0,
+            **kwargs,
+        )
+        self.base_url = base_url
+
+    def resolve_url(self, url: str) -> str:
+        parts = urlsplit(url)
+        query = f"?{parts.query}" if parts.query else ""
+        return f"{self.base_url}/{parts.hostname}{parts.path}{query}"
+
+
+class ReplayServer:
+    def __init__(self, fixtures: FixtureStore, host: str = "127.0.0.1", port: int = 0):
+        self.fixtures = fixtures
+        self.host = host
+        self.port = port
+        self.hits = 0
+        self.misses = []
+        self._runner: web.AppRunner = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def handle(self, request: web.Request) -> web.Response:
+        host, _, path = request.match_info["tail"].partition("/")
+        query = f"?{request.query_string}" if request.query_string else ""
+        key = fixture_key(request.method, f"https://{host}/{path}{query}")
+
+        fixture = self.fixtures.load(key)
+        if not fixture:
+            self.misses.append(key)
+            return web.Response(status=404)
+
+        self.hits += 1
+        entry, body = fixture
+        return web.Response(
+            status=entry["status"],
+            body=body,
+            headers={"Content-Type": entry["content_type"] or "application/octet-stream"},
+        )
+
+    async def __aenter__(self):
+        app = web.Application()
+        app.router.add_route("*", "/{tail:.*}", self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        # port 0 -> grab whatever the os handed out
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self
+
+    async def __aexit__(self, *args):
+        await self._runner.cleanup()
@@ -0,0 +1,493 @@
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import tracemalloc
+import aiohttp
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from typing import Callable, Dict, List
+
+from bench.replay import FixtureStore, RecordingScheduler, ReplayScheduler, ReplayServer
+from blackrock.blk_fund import blk_get_fund_data_async
+from common.Bond import VectorizedBond
+from common.fund_flows import (
+    calc_estimated_shares_outstanding,
+    multi_fetch_fund_flow_data_async,
+)
+from common.spreadsheetml import read_spreadsheetml
+from common.treasuries import multi_download_year_treasury_par_yield_curve_rate_async
+from common.yahoofinance import (
+    YahooFinanceClient,
+    multi_download_historical_data_yahoofinance_async,
+)
+from vanguard.vg_fund import vg_daily_data, vg_multi_ticker_to_ticker_id_async
+from vanguard.vg_holdings import (
+    vg_parallel_get_portfolio_data_api_async,
+    ETFInfo,
+    Asset,
+)
+
+"""
+Benchmarks for the refresh pipeline hot paths
+
+    python -m bench.run --record          hit the live sites once, save http fixtures + the resulting store
+    python -m bench.run                   replay everything offline and time each stage
+    python -m bench.run --save-baseline   also append this run to bench/baselines.json
+
+stages without fixtures fall back to seeded synthetic inputs (bond analytics, spreadsheetml, shares kernel)
+or are skipped (replayed fetches, summary books)
+
+every replayed fetch goes through the scheduler, including the ishares product screener - fixtures recorded
+before the screener moved onto the scheduler miss it, re-record
+"""
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(BENCH_DIR, "fixtures")
+BASELINES_PATH = os.path.join(BENCH_DIR, "baselines.json")
+
+VG_TICKERS = ["VGLT", "VGIT", "VGSH", "EDV"]
+BLK_TICKERS = ["TLT", "HYG"]
+WORK_DIRS = [
+    "yahoofinance",
+    "flows",
+    "treasuries",
+    "vanguard/vg_funds_holdings_clean_data",
+    "vanguard/vg_nav_data",
+    "blackrock/blk_funds_data",
+]
+
+
+@dataclass
+class BenchResult:
+    stage: str
+    seconds: float
+    count: int
+    unit: str
+    peak_mb: float
+
+    @property
+    def throughput(self) -> float:
+        return self.count / self.seconds if self.seconds else float("inf")
+
+
+def measure(
+    stage: str, fn: Callable[[], int], unit: str, repeat: int = 3
+) -> BenchResult:
+    # best of n for time, one extra traced run for peak memory so tracing doesn't skew timings
+    timings = []
+    count = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = fn()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return BenchResult(stage, min(timings), count, unit, peak / 1e6)
+
+
+def make_work_dir(store_src: str = None) -> str:
+    work_dir = tempfile.mkdtemp(prefix="etf_bench_")
+    for dir in WORK_DIRS:
+        os.makedirs(os.path.join(work_dir, dir), exist_ok=True)
+    if store_src and os.path.isdir(store_src):
+        shutil.copytree(store_src, os.path.join(work_dir, "store"))
+    return work_dir
+
+
+def read_manifest() -> Dict | None:
+    path = os.path.join(FIXTURES_DIR, "manifest.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+"""
+synthetic inputs - seeded so runs are comparable
+"""
+
+
+def synthetic_holdings(n: int, seed: int = 0) -> Dict[str, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    T = rng.uniform(0.5, 30, n)
+    c = rng.uniform(0.0, 0.07, n)
+    par = rng.uniform(1e5, 1e7, n)
+    ytm = rng.uniform(0.03, 0.06, n)
+    periods = np.arange(1, 31)
+    mask = periods[None, :] <= np.floor(T)[:, None]
+    pv = (c[:, None] * par[:, None] / (1 + ytm[:, None]) ** periods * mask).sum(axis=1)
+    mv = pv + par / (1 + ytm) ** T
+    return {"par": par, "c": c, "mv": mv, "T": T}
+
+
+def synthetic_spreadsheetml(n: int) -> bytes:
+    def cell(value, type="String"):
+        return f'<ss:Cell><ss:Data ss:Type="{type}">{value}</ss:Data></ss:Cell>'
+
+    header = ["Ticker", "Name", "Par Value", "Coupon (%)", "Market Value", "Maturity"]
+    rows = ["<ss:Row>" + cell("Fund Holdings as of") + cell("Nov 14, 2023") + "</ss:Row>"]
+    rows += ["<ss:Row/>"] * 6
+    rows.append("<ss:Row>" + "".join(cell(x) for x in header) + "</ss:Row>")
+    for i in range(n):
+        rows.append(
+            "<ss:Row>"
+            + cell(f"T{i}")
+            + cell(f"TREASURY BOND {i}")
+            + cell(1000 + i, "Number")
+            + cell(4.5, "Number")
+            + cell(990.5, "Number")
+            + cell("Nov 15, 2043")
+            + "</ss:Row>"
+        )
+
+    return (
+        '<?xml version="1.0"?><ss:Workbook xmlns:ss="urn:schemas-microsoft-com:office:spreadsheet">'
+        + '<ss:Worksheet ss:Name="Holdings"><ss:Table>'
+        + "".join(rows)
+        + "</ss:Table></ss:Worksheet></ss:Workbook>"
+    ).encode()
+
+
+"""
+stages
+"""
+
+
+def bench_bond_analytics(repeat: int) -> List[BenchResult]:
+    holdings = synthetic_holdings(5000)
+
+    def run() -> int:
+        VectorizedBond.calc_analytics(
+            holdings["par"], holdings["c"], holdings["mv"], holdings["T"], n=1
+        )
+        return len(holdings["par"])
+
+    return [measure("bond_analytics", run, "holdings", repeat)]
+
+
+def bench_shares_outstanding(repeat: int) -> List[BenchResult]:
+    dates = pd.bdate_range("2000-01-03", periods=6000)
+    units = np.random.default_rng(0).normal(0, 1e4, len(dates))
+
+    def run() -> int:
+        calc_estimated_shares_outstanding(dates, units, dates[3000], 1e8)
+        return len(dates)
+
+    return [measure("shares_outstanding", run, "rows", repeat)]
+
+
+def bench_spreadsheetml(repeat: int, fixtures: FixtureStore) -> List[BenchResult]:
+    raw = fixtures.find("fileType=xls") if fixtures else None
+    raw = raw if raw else synthetic_spreadsheetml(20000)
+
+    def run() -> int:
+        return len(read_spreadsheetml(raw, ["Holdings"], {"Holdings": 7})["Holdings"])
+
+    return [measure("spreadsheetml_holdings", run, "holdings", repeat)]
+
+
+def bench_fetch_replay(
+    repeat: int, fixtures: FixtureStore, manifest: Dict
+) -> List[BenchResult]:
+    from_date = datetime.fromisoformat(manifest["from_date"])
+    to_date = datetime.fromisoformat(manifest["to_date"])
+    tickers = manifest["vg_tickers"]
+    all_tickers = tickers + manifest["blk_tickers"]
+    results = []
+
+    async def replay(core) -> int:
+        async with ReplayServer(fixtures) as server:
+            scheduler = ReplayScheduler(server.base_url)
+            async with aiohttp.ClientSession() as session:
+                async with YahooFinanceClient(
+                    session=session, scheduler=scheduler
+                ) as client:
+                    count = await core(session, scheduler, client)
+            if server.misses:
+                print(f"{len(server.misses)} fixture misses - re-record?")
+            return count
+
+    def in_work_dir(core) -> Callable[[], int]:
+        def run() -> int:
+            curr_dir = os.getcwd()
+            work_dir = make_work_dir()
+            os.chdir(work_dir)
+            try:
+                return asyncio.run(replay(core))
+            finally:
+                os.chdir(curr_dir)
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+        return run
+
+    async def yahoo(session, scheduler, client) -> int:
+        dfs = await multi_download_historical_data_yahoofinance_async(
+            all_tickers, from_date, to_date, client, incremental=True
+        )
+        return len(dfs)
+
+    async def flows(session, scheduler, client) -> int:
+        data = await multi_fetch_fund_flow_data_async(
+            all_tickers, "bench", from_date, to_date, session, scheduler
+        )
+        return len(data)
+
+    async def vg_holdings(session, scheduler, client) -> int:
+        data = await vg_parallel_get_portfolio_data_api_async(
+            [ETFInfo(t, Asset.fixed_income) for t in tickers],
+            None,
+            session,
+            scheduler,
+        )
+        return len(data)
+
+    async def vg_fund_ids(session, scheduler, client) -> int:
+        ids = await vg_multi_ticker_to_ticker_id_async(tickers, session, scheduler)
+        return len(ids)
+
+    async def ishares_funds(session, scheduler, client) -> int:
+        # product screener lookup + the fund data downloads, parsed and written to the store
+        data = await blk_get_fund_data_async(
+            list(manifest["blk_tickers"]),
+            os.path.join(os.getcwd(), "blackrock/blk_funds_data"),
+            session,
+            scheduler,
+        )
+        return len(data)
+
+    async def treasuries(session, scheduler, client) -> int:
+        await multi_download_year_treasury_par_yield_curve_rate_async(
+            manifest["years"], os.path.join(os.getcwd(), "treasuries"), session, scheduler
+        )
+        return len(manifest["years"])
+
+    for stage, core in [
+        ("replay_yahoo", yahoo),
+        ("replay_fund_flows", flows),
+        ("replay_vg_holdings", vg_holdings),
+        ("replay_vg_fund_ids", vg_fund_ids),
+        ("replay_ishares_funds", ishares_funds),
+        ("replay_treasuries", treasuries),
+    ]:
+        unit = "years" if stage == "replay_treasuries" else "tickers"
+        results.append(measure(stage, in_work_dir(core), unit, repeat))
+
+    return results
+
+
+def bench_summary_books(repeat: int, manifest: Dict) -> List[BenchResult]:
+    from vanguard.vg import vg_build_summary_book
+    from blackrock.blk import blk_summary_book
+    from common.store import read_frame
+
+    store_src = os.path.join(FIXTURES_DIR, "store")
+    vg_tickers = manifest["vg_tickers"]
+    blk_tickers = manifest["blk_tickers"]
+    # fixed anchors so the builders never go out for outstanding shares
+    anchor_date = manifest["shares_anchor_date"]
+    anchors = {ticker: (anchor_date, 1e8) for ticker in vg_tickers}
+
+    def with_store(fn: Callable[[str], int]) -> Callable[[], int]:
+        def run() -> int:
+            curr_dir = os.getcwd()
+            work_dir = make_work_dir(store_src)
+            os.chdir(work_dir)
+            try:
+                return fn(work_dir)
+            finally:
+                os.chdir(curr_dir)
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+        return run
+
+    def vg_daily(_) -> int:
+        for ticker in vg_tickers:
+            vg_daily_data(ticker, starting_date=anchor_date, shares_outstanding=1e8)
+        return len(vg_tickers)
+
+    def vg_book(work_dir: str) -> int:
+        vg_build_summary_book(
+            vg_tickers,
+            os.path.join(work_dir, "vg_summary_book.xlsx"),
+            shares_outstanding=anchors,
+        )
+        return sum(len(read_frame("vanguard_holdings", x)) for x in vg_tickers)
+
+    def blk_book(work_dir: str) -> int:
+        blk_summary_book(
+            blk_tickers,
+            full_summary_book_path=os.path.join(work_dir, "blk_summary_book.xlsx"),
+        )
+        return sum(len(read_frame("ishares_holdings", x)) for x in blk_tickers)
+
+    return [
+        measure("vg_daily_data", with_store(vg_daily), "tickers", repeat),
+        measure("vg_build_summary_book", with_store(vg_book), "holdings", repeat),
+        measure("blk_summary_book", with_store(blk_book), "holdings", repeat),
+    ]
+
+
+"""
+record / baselines / report
+"""
+
+
+def record(from_date: datetime, to_date: datetime):
+    from main import vg_data_refresh, blk_data_refresh
+    from vanguard.vg_summary import vg_all_funds_data
+
+    fixtures = FixtureStore(FIXTURES_DIR)
+    scheduler = RecordingScheduler(fixtures)
+
+    curr_dir = os.getcwd()
+    work_dir = make_work_dir()
+    os.chdir(work_dir)
+    try:
+        vg_all_funds_data()
+        vg_data_refresh(VG_TICKERS, from_date, to_date, scheduler=scheduler)
+        blk_data_refresh(
+            BLK_TICKERS, from_date, to_date, run_treasuries=False, scheduler=scheduler
+        )
+        fixtures.flush()
+
+        store_dst = os.path.join(FIXTURES_DIR, "store")
+        shutil.rmtree(store_dst, ignore_errors=True)
+        shutil.copytree(os.path.join(work_dir, "store"), store_dst)
+    finally:
+        os.chdir(curr_dir)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    years = sorted({from_date.year, to_date.year})
+    manifest = {
+        "from_date": from_date.isoformat(),
+        "to_date": to_date.isoformat(),
+        "vg_tickers": VG_TICKERS,
+        "blk_tickers": BLK_TICKERS,
+        "years": years,
+        "shares_anchor_date": (from_date + (to_date - from_date) / 2).strftime("%Y-%m-%d"),
+        "recorded_at": datetime.now().isoformat(),
+    }
+    with open(os.path.join(FIXTURES_DIR, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=4)
+
+    print(f"recorded {len(fixtures.index)} responses to {FIXTURES_DIR}")
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BENCH_DIR,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+    except Exception:
+        return ""
+
+
+def read_baselines() -> List[Dict]:
+    if not os.path.exists(BASELINES_PATH):
+        return []
+    with open(BASELINES_PATH, "r") as f:
+        return json.load(f)
+
+
+def save_baseline(results: List[BenchResult]):
+    baselines = read_baselines()
+    baselines.append(
+        {
+            "run_at": datetime.now().isoformat(),
+            "commit": git_commit(),
+            "python": sys.version.split(" ")[0],
+            "results": {x.stage: asdict(x) for x in results},
+        }
+    )
+    with open(BASELINES_PATH, "w") as f:
+        json.dump(baselines, f, indent=4)
+
+
+def report(results: List[BenchResult], threshold: float) -> bool:
+    baselines = read_baselines()
+    last = baselines[-1]["results"] if baselines else {}
+
+    regressed = False
+    print(
+        f"{'stage':<26}{'seconds':>10}{'throughput':>18}{'peak MB':>10}{'vs baseline':>14}"
+    )
+    for x in results:
+        change = ""
+        if x.stage in last and last[x.stage]["seconds"]:
+            ratio = x.seconds / last[x.stage]["seconds"] - 1
+            change = f"{ratio:+.1%}"
+            if ratio > threshold:
+                change += " !!"
+                regressed = True
+        print(
+            f"{x.stage:<26}{x.seconds:>10.4f}{x.throughput:>12.0f} {x.unit + '/s':<8}{x.peak_mb:>7.1f}{change:>14}"
+        )
+
+    return regressed
+
+
+def run(stages: List[str] = None, repeat: int = 3) -> List[BenchResult]:
+    manifest = read_manifest()
+    fixtures = FixtureStore(FIXTURES_DIR) if manifest else None
+    if not manifest:
+        print("no fixtures recorded - replay and summary book stages skipped")
+
+    benches = {
+        "bond_analytics": lambda: bench_bond_analytics(repeat),
+        "shares_outstanding": lambda: bench_shares_outstanding(repeat),
+        "spreadsheetml": lambda: bench_spreadsheetml(repeat, fixtures),
+    }
+    if manifest:
+        benches["replay"] = lambda: bench_fetch_replay(repeat, fixtures, manifest)
+        benches["summary_books"] = lambda: bench_summary_books(repeat, manifest)
+
+    results = []
+    for name, bench in benches.items():
+        if stages and name not in stages:
+            continue
+        try:
+            results += bench()
+        except Exception as e:
+            print(f"{name} failed: {e}")
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--record", action="store_true")
+    parser.add_argument("--from-date", default="2023-01-01")
+    parser.add_argument("--to-date", default=datetime.today().strftime("%Y-%m-%d"))
+    parser.add_argument("--stages", default=None, help="comma separated")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    args = parser.parse_args()
+
+    if args.record:
+        record(
+            datetime.strptime(args.from_date, "%Y-%m-%d"),
+            datetime.strptime(args.to_date, "%Y-%m-%d"),
+        )
+
+    results = run(args.stages.split(",") if args.stages else None, args.repeat)
+    regressed = report(results, args.threshold)
+    if args.save_baseline:
+        save_baseline(results)
+
+    sys.exit(1 if regressed else 0)
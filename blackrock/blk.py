@@ -3,9 +3,17 @@ import numpy as np
 import os
 import webbrowser
 import http
-from datetime import datetime
-from typing import List
-from common.Bond import Bond
+from typing import Dict, List
+from common.cashflows import holdings_cash_flow_matrix
+from common.credit import Credit
+from common.curves import ZeroCurves
+from common.scenarios import holdings_scenario_engine, standard_scenarios
+from common.fund_flows import (
+    get_fund_flow_data_by_ticker,
+    calc_estimated_shares_outstanding,
+)
+from common.yahoofinance import get_yahoofinance_data_by_ticker
+from common.store import read_frame, has_frame, list_as_of_dates
 
 
 def blk_get_headers(
@@ -50,44 +58,32 @@ def blk_get_headers(
 
 
 def blk_summary_book(
-    tickers: List[str], starting_date: str = None, shares_outstanding: int = None
-) -> pd.DataFrame:
-    def get_next_idx(df, current_idx):
-        after = df.truncate(before=current_idx).iloc[1:]
-        return after.index[0] if 0 < len(after) else None
-
-    def get_prev_idx(df, current_idx):
-        before = df.truncate(after=current_idx).iloc[:-1]
-        return before.index[-1] if 0 < len(before) else None
-    
-    full_summary_book_path = (
-        f"C:/Users/chris/trade/curr_pos/blackrock/blk_summary_book/blk_summary_book.xlsx"
-    )
+    tickers: List[str],
+    starting_date: str = None,
+    shares_outstanding: int = None,
+    full_summary_book_path: str = "C:/Users/chris/trade/curr_pos/blackrock/blk_summary_book/blk_summary_book.xlsx",
+    curve: ZeroCurves = None,
+) -> Dict[str, Dict]:
     wb_dict = {}
     for ticker in tickers:
-        fund_flow_data_path = (
-            f"C:/Users/chris/trade/curr_pos/flows/{ticker}_fund_flow_data.xlsx"
-        )
-        all_path = f"C:/Users/chris/trade/curr_pos/blackrock/blk_funds_data/{ticker}_blk_fund_data.xlsx"
-        fund_data_path = f"C:/Users/chris/trade/curr_pos/yahoofinance/{ticker}_yahoofin_historical_data.xlsx"
+        if not has_frame("ishares_historical", ticker):
+            print(f"{ticker} - no iShares fund data stored - run blk_get_fund_data first")
+            continue
 
-        xlsx = pd.ExcelFile(all_path)
-
-        fund_flow_df = pd.read_excel(fund_flow_data_path, parse_dates=["asOf"], index_col=0)
+        fund_flow_df = get_fund_flow_data_by_ticker(ticker).set_index("asOf")
         fund_flow_df.index.names = ["Date"]
         fund_flow_df.rename(columns={"value": "flow"}, inplace=True)
         fund_flow_df["flow"] = fund_flow_df["flow"].apply(lambda x: x * 1e6)
         fund_flow_df.replace(np.nan, 0, inplace=True)
 
-        nav_df = pd.read_excel(
-            xlsx, sheet_name="Historical", parse_dates=["As Of"]
-        ).sort_values("As Of")
+        nav_df = read_frame("ishares_historical", ticker)
         nav_df.rename(columns={"As Of": "date"}, inplace=True)
-        nav_df["date"] = pd.to_datetime(nav_df["date"], format="%m/%d/%Y")
+        nav_df["date"] = pd.to_datetime(nav_df["date"])
+        nav_df = nav_df.sort_values("date")
         nav_df = nav_df[nav_df["date"].dt.year == 2023]
         nav_df.set_index("date", inplace=True)
 
-        fund_data_df = pd.read_excel(fund_data_path, parse_dates=["Date"], index_col=0)
+        fund_data_df = get_yahoofinance_data_by_ticker(ticker).set_index("Date")
 
         df = pd.concat([fund_data_df, nav_df, fund_flow_df], axis=1)
         df = df.dropna(subset=["NAV per Share", "flow"])
@@ -106,45 +102,83 @@ def blk_summary_book(
                 "date": starting_date,
                 "shares": shares_outstanding,
             }
-            df["Estimated Shares Outstanding"] = np.nan
-            df.at[
-                shares_outstanding_starting["date"], "Estimated Shares Outstanding"
-            ] = shares_outstanding_starting["shares"]
-            for idx in df.index:
-                if idx > datetime.strptime(shares_outstanding_starting["date"], "%Y-%m-%d"):
-                    df.loc[idx, "Estimated Shares Outstanding"] = (
-                        df.loc[get_prev_idx(df, idx), "Estimated Shares Outstanding"]
-                        + df.loc[idx, "Estimated Daily Creation Units"]
-                    )
-            for idx in reversed(df.index):
-                if idx < datetime.strptime(shares_outstanding_starting["date"], "%Y-%m-%d"):
-                    df.loc[idx, "Estimated Shares Outstanding"] = (
-                        df.loc[get_next_idx(df, idx), "Estimated Shares Outstanding"]
-                        - df.loc[idx, "Estimated Daily Creation Units"]
-                    )
-
-        holdings_df = pd.read_excel(xlsx, sheet_name="Holdings", skiprows=7)
-        try:
-            holdings_df["TTM"] = holdings_df["Maturity"].apply(
-                lambda x: Bond.calc_time_to_maturity_blk(x)
+            df["Estimated Shares Outstanding"] = calc_estimated_shares_outstanding(
+                df.index,
+                df["Estimated Daily Creation Units"],
+                shares_outstanding_starting["date"],
+                shares_outstanding_starting["shares"],
             )
-            holdings_df["Convexity"] = holdings_df.apply(
-                lambda row: Bond.calc_convexity(
-                    row["Par Value"] * 100,
-                    row["Coupon (%)"] / 100,
-                    row["Market Value"],
-                    row["TTM"],
-                    n=1,
-                ),
-                axis=1,
+
+        # holdings partitions are keyed by the sheet's "Fund Holdings as of" date - settle analytics on it
+        holdings_as_of = (list_as_of_dates("ishares_holdings", ticker) or [None])[-1]
+        holdings_df = read_frame("ishares_holdings", ticker, holdings_as_of)
+        # per holding ttm/convexity and the fund duration/convexity/yield off one set of cash flows,
+        # settled on the holdings date with semiannual coupons
+        cash_flows = None
+        market_value = pd.to_numeric(holdings_df["Market Value"], errors="coerce")
+        par_value = pd.to_numeric(holdings_df["Par Value"], errors="coerce")
+        try:
+            cash_flows = holdings_cash_flow_matrix(holdings_df, holdings_as_of)
+            maturities = pd.to_datetime(
+                holdings_df["Maturity"], format="%b %d, %Y", errors="coerce"
             )
+            holdings_df["TTM"] = (maturities - pd.Timestamp(cash_flows.settle)).dt.days / 365.0
+            with np.errstate(all="ignore"):
+                yields = cash_flows.yields((market_value / par_value).to_numpy(float))
+            holdings_df["Convexity"] = cash_flows.durations(yields)["convexity"].to_numpy()
         except Exception as e:
             print('convexity calc failed')
             print(e)
-            
-        wb_dict[ticker] = {'daily': df, 'holdings': holdings_df}
-    
-    print(wb_dict)
+
+        fund_analytics = None
+        try:
+            in_matrix = np.diff(cash_flows.flows.indptr) > 0
+            # market value already includes accrued, same as the flows price
+            fund_analytics = cash_flows.fund_analytics(
+                par_value.where(in_matrix, 0).to_numpy(float),
+                fund_value=market_value[in_matrix].sum(),
+            )
+            print(f"{ticker} fund analytics: {fund_analytics}")
+        except Exception as e:
+            print("fund analytics calc failed")
+            print(e)
+
+        # per holding z-spreads off the treasury spot curve + mv weighted fund spread
+        fund_z_spread = None
+        if curve is not None:
+            try:
+                holdings_df, fund_z_spread = Credit.calc_holdings_z_spreads(
+                    holdings_df, curve
+                )
+                print(f"{ticker} fund z-spread: {fund_z_spread}")
+            except Exception as e:
+                print("z-spread calc failed")
+                print(e)
+
+        # key rate durations + parallel/twist scenario pnl off the same curve
+        key_rate_durations, scenario_pnl = None, None
+        if curve is not None:
+            try:
+                engine = holdings_scenario_engine(
+                    holdings_df, curve, settle=holdings_as_of
+                )
+                par_value = pd.to_numeric(holdings_df["Par Value"], errors="coerce")
+                key_rate_durations = engine.fund_key_rate_durations(par_value)
+                scenario_pnl = engine.scenario_pnl(standard_scenarios(), par_value)
+                print(f"{ticker} key rate durations: {key_rate_durations.to_dict()}")
+            except Exception as e:
+                print("scenario calc failed")
+                print(e)
+
+        wb_dict[ticker] = {
+            'daily': df,
+            'holdings': holdings_df,
+            'z_spread': fund_z_spread,
+            'fund_analytics': fund_analytics,
+            'key_rate_durations': key_rate_durations,
+            'scenarios': scenario_pnl,
+        }
+
     with pd.ExcelWriter(full_summary_book_path, engine="openpyxl") as writer:
         pd.DataFrame().to_excel(writer, index=False)
         for ticker, wb in wb_dict.items():
@@ -154,6 +188,22 @@ def blk_summary_book(
             daily_df.to_excel(writer, sheet_name=f"{ticker}_daily", index=False)
             holdings_df.to_excel(writer, sheet_name=f"{ticker}_holding ", index=False)
 
+            analytics = dict(wb['fund_analytics'] or {})
+            if wb['z_spread'] is not None:
+                analytics['zSpread'] = wb['z_spread']
+            if analytics:
+                pd.Series(analytics, name="value").to_excel(
+                    writer, sheet_name=f"{ticker}_analytics", index_label="metric"
+                )
+            if wb['key_rate_durations'] is not None:
+                wb['key_rate_durations'].rename("Key Rate Duration").to_excel(
+                    writer, sheet_name=f"{ticker}_krd", index_label="tenor"
+                )
+            if wb['scenarios'] is not None:
+                wb['scenarios'].to_excel(
+                    writer, sheet_name=f"{ticker}_scenarios", index_label="scenario"
+                )
+
     return wb_dict
 
 
@@ -1,40 +1,57 @@
 import pandas as pd
-import requests
 import os
 import http
 import aiohttp
 import asyncio
-import codecs
-import lxml.etree as ET_lxml
-from openpyxl import Workbook
+from datetime import date, datetime
 from typing import List, Dict
 from blackrock.blk import blk_get_headers
+from common.scheduler import FetchScheduler
+from common.http_cache import cached_fetch
+from common.symbology import get_symbology
+from common.spreadsheetml import read_spreadsheetml, iter_spreadsheetml_rows
+from common.store import write_frame
 
 
-def blk_get_aladdian_info(
-    tickers: List[str], cj: http.cookiejar = None
+BLK_SCREENER_URL = "https://www.ishares.com/us/product-screener/product-screener-v3.1.jsn?dcrPath=/templatedata/config/product-screener-v3/data/en/us-ishares/ishares-product-screener-backend-config&siteEntryPassthrough=true"
+
+
+async def blk_get_aladdian_info_async(
+    tickers: List[str],
+    session: aiohttp.ClientSession,
+    scheduler: FetchScheduler,
+    cj: http.cookiejar = None,
 ) -> Dict[str, Dict]:
-    url = "https://www.ishares.com/us/product-screener/product-screener-v3.1.jsn?dcrPath=/templatedata/config/product-screener-v3/data/en/us-ishares/ishares-product-screener-backend-config&siteEntryPassthrough=true"
-    headers = blk_get_headers(url, cj)
-    res = requests.get(url, headers=headers)
-    json = res.json()
+    symbology = get_symbology()
+    if not all(symbology.aladdin_info(ticker) for ticker in tickers):
+        headers = blk_get_headers(BLK_SCREENER_URL, cj)
+        res = await cached_fetch(session, scheduler, BLK_SCREENER_URL, headers=headers)
+        symbology.add_blackrock_screener(res.json())
 
     dict = {}
-    for key in json:
-        fund = json[key]
-        if fund["localExchangeTicker"] in tickers:
-            dict[fund["localExchangeTicker"]] = {
-                "aladdian_id": key,
-                "product_url": fund["productPageUrl"],
-                "fund_name": fund["fundName"],
-            }
-            tickers.remove(fund["localExchangeTicker"])
+    for ticker in list(tickers):
+        info = symbology.aladdin_info(ticker)
+        if info:
+            dict[ticker] = info
+            tickers.remove(ticker)
 
     if len(tickers) > 0:
         print(f"tickers not found: {tickers}")
     return dict
 
 
+def blk_get_aladdian_info(
+    tickers: List[str], cj: http.cookiejar = None, scheduler: FetchScheduler = None
+) -> Dict[str, Dict]:
+    async def run_fetch() -> Dict[str, Dict]:
+        async with aiohttp.ClientSession() as session:
+            return await blk_get_aladdian_info_async(
+                tickers, session, scheduler or FetchScheduler(), cj
+            )
+
+    return asyncio.run(run_fetch())
+
+
 """
 Blackrock/iShares publishes daily ETF data including current market value (and risk metrics) of holdings, 
 NAV per shares, shares outstanding, historical performance, and distributions 
@@ -43,100 +60,107 @@ below function will divide data into respective folders
 """
 
 
-def blk_get_fund_data(tickers: List[str], raw_path: str, cj: http.cookiejar = None):
-    async def fetch(
-        session: aiohttp.ClientSession, url: str, ticker: str
-    ) -> pd.DataFrame:
+BLK_FUND_SHEETS = {
+    # sheet name -> (store source, header row)
+    "Holdings": ("ishares_holdings", 7),
+    "Historical": ("ishares_historical", 0),
+    "Performance": ("ishares_performance", 0),
+    "Distributions": ("ishares_distributions", 0),
+}
+
+
+def blk_holdings_as_of_date(bytes: bytes) -> date:
+    # holdings preamble has a "Fund Holdings as of" row above the header
+    try:
+        for sheet, row in iter_spreadsheetml_rows(bytes, ["Holdings"]):
+            if row and str(row[0]).strip() == "Fund Holdings as of":
+                return datetime.strptime(str(row[1]).strip(), "%b %d, %Y").date()
+            if len(row) > 7:
+                break
+    except Exception as e:
+        print(e)
+
+    return date.today()
+
+
+def blk_fund_data_to_frames(bytes: bytes) -> Dict[str, pd.DataFrame]:
+    dfs = read_spreadsheetml(
+        bytes,
+        list(BLK_FUND_SHEETS.keys()),
+        {sheet: header for sheet, (_, header) in BLK_FUND_SHEETS.items()},
+    )
+    return {sheet.lower(): dfs.get(sheet, pd.DataFrame()) for sheet in BLK_FUND_SHEETS}
+
+
+async def blk_get_fund_data_async(
+    tickers: List[str],
+    raw_path: str,
+    session: aiohttp.ClientSession,
+    scheduler: FetchScheduler,
+    cj: http.cookiejar = None,
+    make_xlsx=False,
+) -> List[Dict[str, Dict[str, pd.DataFrame]]]:
+    async def fetch(url: str, ticker: str) -> pd.DataFrame:
         try:
             headers = blk_get_headers(url, cj)
-            full_file_path = os.path.join(raw_path, f"{ticker}_blk_fund_data.xls")
-            async with session.get(url, headers=headers) as response:
-                if response.status == 200:
-                    bytes = await response.content.read()
-                    # https://en.wikipedia.org/wiki/Byte_order_mark
-                    bytes = bytes.replace(codecs.BOM_UTF8, b"")
-
-                    _, updated_full_file_path = xls_to_xlsx(bytes, full_file_path)
-                    xlsx = pd.ExcelFile(f"{updated_full_file_path}.xlsx")
-                    wb_df = {
-                        ticker: {
-                            "holdings": pd.read_excel(xlsx, "Holdings"),
-                            "historical": pd.read_excel(xlsx, "Historical"),
-                            "performance": pd.read_excel(xlsx, "Performance"),
-                            "distributions": pd.read_excel(xlsx, "Distributions"),
-                        }
-                    }
-
-                    return wb_df
-
-                else:
-                    raise Exception(f"Bad Status: {response.status}")
+            res = await cached_fetch(session, scheduler, url, headers=headers)
+            bytes = res.content
+
+            dfs = blk_fund_data_to_frames(bytes)
+            as_of = blk_holdings_as_of_date(bytes)
+            for sheet, (source, _) in BLK_FUND_SHEETS.items():
+                df = dfs[sheet.lower()]
+                write_frame(df, source, ticker, as_of if sheet == "Holdings" else None)
+
+            if make_xlsx:
+                with pd.ExcelWriter(
+                    os.path.join(raw_path, f"{ticker}_blk_fund_data.xlsx")
+                ) as writer:
+                    for sheet in BLK_FUND_SHEETS:
+                        dfs[sheet.lower()].to_excel(writer, sheet_name=sheet, index=False)
+
+            return {ticker: dfs}
         except Exception as e:
-            print(e)
+            print(f"{ticker}: {e}")
             return pd.DataFrame()
 
-    def xls_to_xlsx(bytes: bytes, path: str = None) -> Workbook:
-        ns = {"ss": "urn:schemas-microsoft-com:office:spreadsheet"}
-
-        xml_string = bytes.decode("utf-8")
-        parser = ET_lxml.XMLParser(recover=True)
-        root = ET_lxml.ElementTree(ET_lxml.fromstring(xml_string, parser=parser))
-
-        workbook = Workbook()
-        workbook.remove(workbook.active)
-
-        for ws in root.findall("ss:Worksheet", namespaces=ns):
-            try:
-                ws_title = ws.attrib.get(
-                    "{urn:schemas-microsoft-com:office:spreadsheet}Name"
-                )
-                worksheet = workbook.create_sheet(title=ws_title)
-
-                for table in ws.findall("ss:Table", namespaces=ns):
-                    for row in table.findall("ss:Row", namespaces=ns):
-                        row_cells = []
-
-                        for cell in row.findall("ss:Cell", namespaces=ns):
-                            cell_data = cell.find("ss:Data", namespaces=ns)
-                            cell_value = cell_data.text if cell_data is not None else ""
-                            row_cells.append(cell_value)
-
-                        worksheet.append(row_cells)
-            except:
-                continue
-
-        if path:
-            path = path.split(".")[0]
-            workbook.save(f"{path}.xlsx")
-
-        return workbook, path
-
-    async def get_promises(session: aiohttp.ClientSession):
-        aladdin_info = blk_get_aladdian_info(tickers, cj)
-        tasks = []
-        for ticker in list(aladdin_info.keys()):
-            product_url = aladdin_info[ticker]["product_url"]
-            ajax = "1521942788811.ajax"
-            fund_name_edited = str(aladdin_info[ticker]["fund_name"]).replace(" ", "-")
-            url_queries = f"fileType=xls&fileName={fund_name_edited}_fund&dataType=fund"
-            download_url = f"https://www.ishares.com{product_url}/{ajax}?{url_queries}"
-
-            task = fetch(session, download_url, ticker)
-            tasks.append(task)
-
-        return await asyncio.gather(*tasks)
-
+    aladdin_info = await blk_get_aladdian_info_async(list(tickers), session, scheduler, cj)
+    tasks = []
+    for ticker in list(aladdin_info.keys()):
+        product_url = aladdin_info[ticker]["product_url"]
+        ajax = "1521942788811.ajax"
+        fund_name_edited = str(aladdin_info[ticker]["fund_name"]).replace(" ", "-")
+        url_queries = f"fileType=xls&fileName={fund_name_edited}_fund&dataType=fund"
+        download_url = f"https://www.ishares.com{product_url}/{ajax}?{url_queries}"
+        tasks.append(fetch(download_url, ticker))
+
+    return await asyncio.gather(*tasks)
+
+
+def blk_get_fund_data(
+    tickers: List[str],
+    raw_path: str = None,
+    cj: http.cookiejar = None,
+    scheduler: FetchScheduler = None,
+    make_xlsx=False,
+):
     async def run_fetch_all() -> List[Dict[str, Dict[str, pd.DataFrame]]]:
         async with aiohttp.ClientSession() as session:
-            all_data = await get_promises(session)
-            return all_data
+            return await blk_get_fund_data_async(
+                tickers,
+                raw_path,
+                session,
+                scheduler or FetchScheduler(),
+                cj,
+                make_xlsx,
+            )
 
     dfs = asyncio.run(run_fetch_all())
-    
+
     return dfs
 
 
 if __name__ == "__main__":
     tickers = ["CCRV", "COMT", "TLTW", "LQDW", "HYGW", "BRLN"]
-    dfs = blk_get_fund_data(tickers, r'C:\Users\chris\trade\curr_pos\blackrock\blk_funds_data')
+    dfs = blk_get_fund_data(tickers, r'C:\Users\chris\trade\curr_pos\blackrock\blk_funds_data', make_xlsx=True)
     print(dfs)
\ No newline at end of file
@@ -1,19 +1,20 @@
 import pandas as pd
-import requests
 import http
-import xml.etree.ElementTree as ET_xml
-from openpyxl import Workbook
 from typing import List 
 from datetime import datetime
-from blk import blk_get_headers
+from blackrock.blk import blk_get_headers
+from common.spreadsheetml import read_spreadsheetml
+from common.http_cache import cached_get, cached_post
+from common.symbology import get_symbology
 
 
 def blk_all_funds_info(raw_path: str, cj: http.cookiejar = None) -> pd.DataFrame:
     def get_aladdian_portfolio_ids() -> List[str]:
         path = "https://www.ishares.com/us/product-screener/product-screener-v3.1.jsn?dcrPath=/templatedata/config/product-screener-v3/data/en/us-ishares/ishares-product-screener-backend-config&siteEntryPassthrough=true"
         headers = blk_get_headers(path, cj)
-        res = requests.get(path, headers=headers)
+        res = cached_get(path, headers=headers)
         info_dict = res.json()
+        get_symbology().add_blackrock_screener(info_dict)
         return list(info_dict.keys())
 
     def get_raw_xls_etf_info() -> bytes:
@@ -23,39 +24,10 @@ def blk_all_funds_info(raw_path: str, cj: http.cookiejar = None) -> pd.DataFrame
             "productView": "etf",
             "portfolios": "-".join(str(x) for x in get_aladdian_portfolio_ids()),
         }
-        res = requests.post(path, data=payload, headers=headers, allow_redirects=True)
+        res = cached_post(path, data=payload, headers=headers, allow_redirects=True)
         return res.content
 
-    def xml_bytes_to_workbook(xml_bytes) -> Workbook:
-        ns = {"ss": "urn:schemas-microsoft-com:office:spreadsheet"}
-
-        xml_string = xml_bytes.decode("utf-8")
-        root = ET_xml.fromstring(xml_string)
-
-        workbook = Workbook()
-        workbook.remove(workbook.active)
-
-        for ws in root.findall("ss:Worksheet", namespaces=ns):
-            ws_title = ws.attrib.get(
-                "{urn:schemas-microsoft-com:office:spreadsheet}Name"
-            )
-            worksheet = workbook.create_sheet(title=ws_title)
-
-            for table in ws.findall("ss:Table", namespaces=ns):
-                for row in table.findall("ss:Row", namespaces=ns):
-                    row_cells = []
-
-                    for cell in row.findall("ss:Cell", namespaces=ns):
-                        cell_data = cell.find("ss:Data", namespaces=ns)
-                        cell_value = cell_data.text if cell_data is not None else ""
-                        row_cells.append(cell_value)
-
-                    worksheet.append(row_cells)
-
-        return workbook
-
-    wb = xml_bytes_to_workbook(get_raw_xls_etf_info())
-    df = pd.DataFrame(wb["etf"].values)
+    df = read_spreadsheetml(get_raw_xls_etf_info(), ["etf"], header=None)["etf"]
     df.drop(df.tail(3).index, inplace=True)
     df.drop(df.head(2).index, inplace=True)
 
@@ -122,6 +94,7 @@ def blk_all_funds_info(raw_path: str, cj: http.cookiejar = None) -> pd.DataFrame
     df = df.iloc[:, :-6]  # frick esg
     df.columns = cols
     df.drop_duplicates(subset=["ticker"], keep="first")
+    get_symbology().add_blackrock_funds(df)
 
     curr_date = datetime.today().strftime("%Y-%m-%d")
     path = f"{raw_path}/{curr_date}_blk_fund_info.xlsx"
@@ -1,6 +1,28 @@
 import numpy as np
+import pandas as pd
 from scipy.optimize import newton
 from datetime import datetime
+from dataclasses import dataclass
+from typing import Dict
+
+
+@dataclass
+class BondAnalytics:
+    ytm: float | np.ndarray
+    current_yield: float | np.ndarray
+    macaulay_duration: float | np.ndarray
+    modified_duration: float | np.ndarray
+    convexity: float | np.ndarray
+
+    # keyed by the holdings sheet column names
+    def to_columns(self) -> Dict[str, float | np.ndarray]:
+        return {
+            "YTM": self.ytm,
+            "currentYield": self.current_yield,
+            "macaulayDuration": self.macaulay_duration,
+            "modifiedDuration": self.modified_duration,
+            "convexity": self.convexity,
+        }
 
 
 class Bond:
@@ -76,9 +98,13 @@ class Bond:
         return sum(t * cf / ((1 + y) ** t) for t, cf in cash_flows) / P
 
     @staticmethod
-    def calc_modifed_duration(par, coupon_yield, market_value, T, n=1):
+    def calc_modifed_duration(par, coupon_yield, market_value, T, n=1, YTM=None):
         try:
-            ytm = Bond.calc_YTM(par, coupon_yield, market_value, T, n)
+            ytm = (
+                Bond.calc_YTM(par, coupon_yield, market_value, T, n)
+                if YTM is None
+                else YTM
+            )
             macaulay_duration = Bond.calc_macaulay_duration(
                 par, coupon_yield, market_value, T, ytm, n
             )
@@ -93,7 +119,7 @@ class Bond:
         return macaulay_dur / (1 + y / m)
 
     @staticmethod
-    def calc_convexity(par, coupon_yield, market_value, T, n=1):
+    def calc_convexity(par, coupon_yield, market_value, T, n=1, YTM=None):
         # try:
         #     C = par * coupon_yield / n
         #     ytm = Bond.calc_YTM(par, coupon_yield, market_value, T, n) / n
@@ -111,7 +137,9 @@ class Bond:
         #     return 'Error'
 
         try:
-            YTM = Bond.calc_YTM(par, coupon_yield, market_value, T, n) / n
+            if YTM is None:
+                YTM = Bond.calc_YTM(par, coupon_yield, market_value, T, n)
+            YTM = YTM / n
             coupon_payment = coupon_yield * par
             convexity = 0
             for t in range(1, int(T) + 1):
@@ -125,6 +153,34 @@ class Bond:
             print(e)
             return "Error"
 
+    # one YTM solve shared by every risk measure
+    @staticmethod
+    def calc_analytics(par, coupon_yield, market_value, T, n=1, YTM=None):
+        ytm = (
+            Bond.calc_YTM(par, coupon_yield, market_value, T, n) if YTM is None else YTM
+        )
+        current_yield = Bond.calc_current_yield(par, coupon_yield, market_value)
+        if ytm == "Error":
+            return BondAnalytics(ytm, current_yield, "Error", "Error", "Error")
+
+        macaulay_duration = Bond.calc_macaulay_duration(
+            par, coupon_yield, market_value, T, ytm, n
+        )
+        modified_duration = (
+            Bond.simple_modified_duration(macaulay_duration, ytm, n)
+            if macaulay_duration != "Error"
+            else "Error"
+        )
+        return BondAnalytics(
+            ytm=ytm,
+            current_yield=current_yield,
+            macaulay_duration=macaulay_duration,
+            modified_duration=modified_duration,
+            convexity=Bond.calc_convexity(
+                par, coupon_yield, market_value, T, n, YTM=ytm
+            ),
+        )
+
     @staticmethod
     def calc_remaining_time_to_maturity(T, current_period, n=1):
         return T - (current_period / n)
@@ -143,7 +199,7 @@ class Bond:
     def calc_clean_and_dirty_price(
         market_value, face_amount, coupon_yield, periods_since_last_payment, n=1
     ):
-        accrued_int = Bond.accrued_interest(
+        accrued_int = Bond.calc_accrued_interest(
             face_amount, coupon_yield, periods_since_last_payment, n
         )
         dirty_price = market_value
@@ -226,6 +282,162 @@ class ZeroCouponBond:
         return mac_dur, mod_dur
 
 
+# array versions of the Bond calcs - one call per holdings file instead of one per row
+# failed/non-converged solves come back as np.nan instead of "Error"
+class VectorizedBond:
+    @staticmethod
+    def _as_arrays(*args):
+        return np.broadcast_arrays(*[np.asarray(x, dtype=float) for x in args])
+
+    @staticmethod
+    def _price_and_slope(YTM, par, coupon_yield, T, n=1):
+        r = YTM / n
+        N = n * T
+        C = par * coupon_yield / n
+        growth = (1 + r) ** (-N)
+        annuity = (1 - growth) / r
+        price = C * annuity + par * growth
+
+        d_growth = -N * (1 + r) ** (-N - 1)
+        d_annuity = (-d_growth * r - (1 - growth)) / r**2
+        slope = (C * d_annuity + par * d_growth) / n
+
+        return price, slope
+
+    @staticmethod
+    def calc_YTM(par, coupon_yield, market_value, T, n=1, tol=1e-10, max_iter=100):
+        par, coupon_yield, market_value, T = VectorizedBond._as_arrays(
+            par, coupon_yield, market_value, T
+        )
+
+        with np.errstate(all="ignore"):
+            # coupon rate is the usual guess, zero coupons start from the zero yield
+            ytm = np.where(
+                coupon_yield > 0,
+                coupon_yield,
+                (par / market_value) ** (1 / T) - 1,
+            ).astype(float)
+            active = (
+                np.isfinite(ytm)
+                & np.isfinite(par)
+                & np.isfinite(market_value)
+                & (market_value > 0)
+                & (T > 0)
+            )
+            converged = np.zeros(ytm.shape, dtype=bool)
+
+            for _ in range(max_iter):
+                idx = np.flatnonzero(active)
+                if idx.size == 0:
+                    break
+
+                price, slope = VectorizedBond._price_and_slope(
+                    ytm[idx], par[idx], coupon_yield[idx], T[idx], n
+                )
+                step = (price - market_value[idx]) / slope
+                ytm[idx] = ytm[idx] - step
+
+                done = np.abs(step) < tol
+                failed = ~np.isfinite(ytm[idx])
+                converged[idx[done & ~failed]] = True
+                active[idx[done | failed]] = False
+
+        return np.where(converged, ytm, np.nan)
+
+    @staticmethod
+    def calc_current_yield(par, coupon_yield, market_value):
+        par, coupon_yield, market_value = VectorizedBond._as_arrays(
+            par, coupon_yield, market_value
+        )
+        with np.errstate(all="ignore"):
+            return coupon_yield * par / market_value
+
+    @staticmethod
+    def _coupon_periods(T):
+        # (holdings x periods) grid of whole coupon years, masked past each bond's maturity
+        whole_years = np.floor(np.nan_to_num(T, nan=0.0))
+        max_periods = int(max(whole_years.max(initial=0), 0))
+        t = np.arange(1, max_periods + 1, dtype=float)
+        return t, t[np.newaxis, :] <= whole_years[:, np.newaxis]
+
+    @staticmethod
+    def calc_macaulay_duration(par, coupon_yield, market_value, T, YTM, n=1):
+        par, coupon_yield, market_value, T, YTM = VectorizedBond._as_arrays(
+            par, coupon_yield, market_value, T, YTM
+        )
+        t, mask = VectorizedBond._coupon_periods(T.ravel())
+
+        with np.errstate(all="ignore"):
+            C = (par * coupon_yield / n).ravel()[:, np.newaxis]
+            y = YTM.ravel()[:, np.newaxis]
+            coupons = np.where(mask, C * t / (1 + y) ** t, 0).sum(axis=1)
+            numerator = coupons.reshape(T.shape) + par * T / (1 + YTM) ** T
+            return numerator / market_value
+
+    @staticmethod
+    def calc_modified_duration(macaulay_duration, YTM, n=1):
+        macaulay_duration, YTM = VectorizedBond._as_arrays(macaulay_duration, YTM)
+        return macaulay_duration / (1 + YTM / n)
+
+    @staticmethod
+    def calc_convexity(par, coupon_yield, T, YTM, n=1):
+        par, coupon_yield, T, YTM = VectorizedBond._as_arrays(
+            par, coupon_yield, T, YTM
+        )
+        t, mask = VectorizedBond._coupon_periods(T.ravel())
+
+        with np.errstate(all="ignore"):
+            y = YTM / n
+            coupon_payment = (coupon_yield * par).ravel()[:, np.newaxis]
+            y_col = y.ravel()[:, np.newaxis]
+            coupons = np.where(
+                mask, coupon_payment * t * (t + 1) / (1 + y_col) ** t, 0
+            ).sum(axis=1)
+            convexity = coupons.reshape(T.shape) + par * T * (T + 1) / (1 + y) ** T
+            return convexity / ((1 + y) ** 2 * par)
+
+    @staticmethod
+    def calc_time_to_maturity(date_strings, format="%m/%d/%Y"):
+        maturity_dates = pd.to_datetime(
+            pd.Series(date_strings), format=format, errors="coerce"
+        )
+        days_to_maturity = (maturity_dates - pd.Timestamp.now()).dt.days
+        return (days_to_maturity / 365.0).to_numpy(dtype=float)
+
+    # pass YTM to reuse an earlier solve, only missing (nan) yields get solved
+    @staticmethod
+    def calc_analytics(
+        par, coupon_yield, market_value, T, n=1, YTM=None
+    ) -> BondAnalytics:
+        if YTM is None:
+            ytm = VectorizedBond.calc_YTM(par, coupon_yield, market_value, T, n)
+        else:
+            par, coupon_yield, market_value, T, ytm = VectorizedBond._as_arrays(
+                par, coupon_yield, market_value, T, YTM
+            )
+            ytm = ytm.copy()
+            missing = np.isnan(ytm)
+            if missing.any():
+                ytm[missing] = VectorizedBond.calc_YTM(
+                    par[missing], coupon_yield[missing], market_value[missing], T[missing], n
+                )
+
+        macaulay_duration = VectorizedBond.calc_macaulay_duration(
+            par, coupon_yield, market_value, T, ytm, n
+        )
+        return BondAnalytics(
+            ytm=ytm,
+            current_yield=VectorizedBond.calc_current_yield(
+                par, coupon_yield, market_value
+            ),
+            macaulay_duration=macaulay_duration,
+            modified_duration=VectorizedBond.calc_modified_duration(
+                macaulay_duration, ytm, n
+            ),
+            convexity=VectorizedBond.calc_convexity(par, coupon_yield, T, ytm, n),
+        )
+
+
 """
 Munis: 
 Tax-Equivalent Yield - Adjusts the yield of a tax-free municipal bond to a taxable equivalent, considering the investor's tax bracket.
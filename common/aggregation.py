@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, List
+
+"""
+Fund level aggregation over the concatenated holdings of many funds
+
+one factorize of the fund key + one groupby sum gives every weighted metric for every fund,
+only the columns a metric actually reads get coerced to numbers (anything unparseable or missing counts as 0)
+"""
+
+
+def concat_fund_holdings(
+    holdings: Dict[str, pd.DataFrame], fund_col: str = "fund"
+) -> pd.DataFrame:
+    return pd.concat(
+        [df.assign(**{fund_col: fund}) for fund, df in holdings.items()],
+        ignore_index=True,
+    )
+
+
+def _numeric_columns(df: pd.DataFrame, cols: List[str]) -> np.ndarray:
+    # funds without a column (ex. no current yield on zero coupon funds) contribute 0
+    return np.column_stack(
+        [
+            pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=float)
+            if col in df
+            else np.zeros(len(df))
+            for col in cols
+        ]
+    ) if cols else np.empty((len(df), 0))
+
+
+def aggregate_fund_metrics(
+    holdings: pd.DataFrame,
+    weighted: Dict[str, str],
+    sums: Dict[str, str] = None,
+    fund_col: str = "fund",
+    weight_col: str = "percentWeight",
+    weight_scale: float = 100,
+    count_col: str = "Holdings Count",
+) -> pd.DataFrame:
+    """
+    weighted: output name -> column averaged by weight_col / weight_scale
+    sums: output name -> column summed as is
+    returns one row per fund (in order of first appearance)
+    """
+    sums = sums or {}
+    codes, funds = pd.factorize(holdings[fund_col])
+
+    weights = np.nan_to_num(_numeric_columns(holdings, [weight_col])[:, 0])
+    weighted_values = np.nan_to_num(_numeric_columns(holdings, list(weighted.values())))
+    summed_values = np.nan_to_num(_numeric_columns(holdings, list(sums.values())))
+
+    values = np.hstack(
+        [weighted_values * weights[:, np.newaxis] / weight_scale, summed_values]
+    )
+    totals = (
+        pd.DataFrame(values, columns=list(weighted) + list(sums))
+        .groupby(codes)
+        .sum()
+    )
+    totals[count_col] = np.bincount(codes, minlength=len(funds))
+    totals.index = funds
+    totals.index.name = fund_col
+
+    return totals
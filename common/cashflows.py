@@ -0,0 +1,269 @@
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass
+from datetime import date
+from scipy.sparse import csr_matrix
+from typing import Dict
+
+"""
+Cash flow matrix for a whole holdings table - holdings x payment dates, stored as CSR
+
+coupon schedules are rolled back from each maturity by 12/n months (end of month clipped), so the first period
+is a proper stub and accrued interest runs from the last coupon date before settlement.
+columns are the unique payment dates across the table, so fund level numbers are one sparse product:
+    fund flows = quantities @ flows, pv = fund flows @ discount factors
+"""
+
+DAY_COUNTS = ["30/360", "act/act"]
+
+
+def _add_months(dates: np.ndarray, months: np.ndarray) -> np.ndarray:
+    # roll datetime64[D] by whole months keeping the day of month where it exists
+    month_start = dates.astype("datetime64[M]")
+    day = (dates - month_start.astype("datetime64[D]")).astype(int)
+    target = month_start + months
+    month_len = (
+        (target + 1).astype("datetime64[D]") - target.astype("datetime64[D]")
+    ).astype(int)
+    return target.astype("datetime64[D]") + np.minimum(day, month_len - 1)
+
+
+def _days_30_360(start: np.ndarray, end: np.ndarray) -> np.ndarray:
+    def parts(x):
+        y = x.astype("datetime64[Y]").astype(int) + 1970
+        m = x.astype("datetime64[M]").astype(int) % 12 + 1
+        d = (x - x.astype("datetime64[M]").astype("datetime64[D]")).astype(int) + 1
+        return y, m, d
+
+    y1, m1, d1 = parts(start)
+    y2, m2, d2 = parts(end)
+    d1 = np.minimum(d1, 30)
+    d2 = np.where(d1 == 30, np.minimum(d2, 30), d2)
+    return 360 * (y2 - y1) + 30 * (m2 - m1) + (d2 - d1)
+
+
+@dataclass
+class CashFlowMatrix:
+    settle: np.datetime64
+    n: int
+    # holdings x pay_dates
+    flows: csr_matrix
+    pay_dates: np.ndarray
+    times: np.ndarray
+    accrued: np.ndarray
+
+    @property
+    def holdings(self) -> int:
+        return self.flows.shape[0]
+
+    def _row_ids(self) -> np.ndarray:
+        return np.repeat(np.arange(self.holdings), np.diff(self.flows.indptr))
+
+    def present_values(self, discount_factors: np.ndarray) -> np.ndarray:
+        # dirty pv per holding against one discount factor per payment date
+        return self.flows @ discount_factors
+
+    def _per_holding_sums(self, yields: np.ndarray, power: int) -> np.ndarray:
+        # sum_j F_ij * t_j^power * (1 + y_i/n)^(-n t_j) straight off the csr data
+        t = self.times[self.flows.indices]
+        y = yields[self._row_ids()]
+        values = self.flows.data * t**power * (1 + y / self.n) ** (-self.n * t)
+        return np.bincount(self._row_ids(), weights=values, minlength=self.holdings)
+
+    def yields(self, dirty_values, tol=1e-10, max_iter=100) -> np.ndarray:
+        """
+        yield to maturity of every holding from its dirty value - masked newton on the sparse flows
+        """
+        dirty_values = np.asarray(dirty_values, dtype=float)
+        with np.errstate(all="ignore"):
+            ytm = np.full(self.holdings, 0.05)
+            active = (
+                np.isfinite(dirty_values)
+                & (dirty_values > 0)
+                & (np.diff(self.flows.indptr) > 0)
+            )
+            converged = np.zeros(self.holdings, dtype=bool)
+            for _ in range(max_iter):
+                if not active.any():
+                    break
+
+                price = self._per_holding_sums(ytm, 0)
+                slope = -self._per_holding_sums(ytm, 1) / (1 + ytm / self.n)
+                step = np.where(active, (price - dirty_values) / slope, 0.0)
+                ytm = np.where(active, ytm - step, ytm)
+
+                done = np.abs(step) < tol
+                failed = ~np.isfinite(ytm)
+                converged |= active & done & ~failed
+                active &= ~(done | failed)
+
+        return np.where(converged, ytm, np.nan)
+
+    def durations(self, yields: np.ndarray) -> pd.DataFrame:
+        # macaulay, modified and convexity per holding at its own yield
+        with np.errstate(all="ignore"):
+            price = self._per_holding_sums(yields, 0)
+            macaulay = self._per_holding_sums(yields, 1) / price
+            convexity = (
+                self._per_holding_sums(yields, 2)
+                + self._per_holding_sums(yields, 1) / self.n
+            ) / (price * (1 + yields / self.n) ** 2)
+            return pd.DataFrame(
+                {
+                    "macaulayDuration": macaulay,
+                    "modifiedDuration": macaulay / (1 + yields / self.n),
+                    "convexity": convexity,
+                }
+            )
+
+    def fund_flows(self, quantities: np.ndarray) -> np.ndarray:
+        # one cash flow per payment date for the whole fund
+        return self.flows.T @ np.nan_to_num(np.asarray(quantities, dtype=float))
+
+    def fund_analytics(
+        self,
+        quantities: np.ndarray,
+        discount_factors: np.ndarray = None,
+        fund_value=None,
+    ) -> Dict[str, float]:
+        """
+        fund pv/duration/convexity off the aggregated flows - against curve discount factors when given,
+        otherwise at the fund yield (the single rate that reprices fund_value)
+        """
+        flows = self.fund_flows(quantities)
+        t = self.times
+
+        fund_yield = np.nan
+        if discount_factors is None:
+            fund_yield = self._fund_yield(flows, fund_value)
+            discount_factors = (1 + fund_yield / self.n) ** (-self.n * t)
+
+        pv = flows @ discount_factors
+        macaulay = (flows * t) @ discount_factors / pv
+        convexity = (flows * t**2) @ discount_factors / pv
+        modified = macaulay
+        # same discrete compounding as durations() at the fund yield, against a curve both are the
+        # continuous (n -> inf) limits of it
+        if np.isfinite(fund_yield):
+            base = 1 + fund_yield / self.n
+            modified = macaulay / base
+            convexity = (convexity + macaulay / self.n) / base**2
+        return {
+            "pv": pv,
+            "yield": fund_yield,
+            "macaulayDuration": macaulay,
+            "modifiedDuration": modified,
+            "convexity": convexity,
+        }
+
+    def _fund_yield(
+        self, flows: np.ndarray, fund_value, tol=1e-10, max_iter=100
+    ) -> float:
+        y = 0.05
+        for _ in range(max_iter):
+            discount = (1 + y / self.n) ** (-self.n * self.times)
+            price = flows @ discount
+            slope = -(flows * self.times) @ discount / (1 + y / self.n)
+            step = (price - fund_value) / slope
+            y -= step
+            if abs(step) < tol:
+                return y
+        return np.nan
+
+
+def build_cash_flow_matrix(
+    par,
+    coupon_yield,
+    maturities,
+    settle: date | str = None,
+    n=2,
+    day_count="30/360",
+) -> CashFlowMatrix:
+    """
+    par/coupon_yield (decimal)/maturities per holding - holdings without a maturity (cash, futures, swaps) get an empty row
+    """
+    if day_count not in DAY_COUNTS:
+        raise ValueError(f"Bad day count: {day_count}")
+
+    settle = np.datetime64(pd.Timestamp(settle or date.today()).date(), "D")
+    par = np.asarray(par, dtype=float)
+    coupon_yield = np.nan_to_num(np.asarray(coupon_yield, dtype=float))
+    maturities = pd.to_datetime(pd.Series(maturities), errors="coerce").to_numpy(
+        dtype="datetime64[D]"
+    )
+
+    step = 12 // n
+    valid = ~np.isnat(maturities) & (maturities > settle) & np.isfinite(par)
+    idx = np.flatnonzero(valid)
+
+    # coupons left per holding - whole periods between settle and maturity, +1 for the stub
+    months_left = (
+        maturities[idx].astype("datetime64[M]") - settle.astype("datetime64[M]")
+    ).astype(int)
+    periods = months_left // step + 2
+
+    rows = np.repeat(idx, periods)
+    k = np.arange(periods.sum()) - np.repeat(np.cumsum(periods) - periods, periods)
+    dates = _add_months(np.repeat(maturities[idx], periods), -k * step)
+    future = dates > settle
+
+    # last coupon on/before settle starts the accrual period
+    prev_coupon = np.full(len(par), np.datetime64("NaT"), dtype="datetime64[D]")
+    next_coupon = np.full(len(par), np.datetime64("NaT"), dtype="datetime64[D]")
+    past_rows, past_dates = rows[~future], dates[~future]
+    order = np.lexsort((-past_dates.astype(int), past_rows))
+    first = np.unique(past_rows[order], return_index=True)[1]
+    prev_coupon[past_rows[order][first]] = past_dates[order][first]
+    fut_rows, fut_dates = rows[future], dates[future]
+    order = np.lexsort((fut_dates.astype(int), fut_rows))
+    first = np.unique(fut_rows[order], return_index=True)[1]
+    next_coupon[fut_rows[order][first]] = fut_dates[order][first]
+
+    coupon = par * coupon_yield / n
+    accrued = np.zeros(len(par))
+    has_prev = ~np.isnat(prev_coupon)
+    if day_count == "30/360":
+        days = _days_30_360(prev_coupon[has_prev], np.full(has_prev.sum(), settle))
+        frac = days / (360 / n)
+    else:
+        frac = (settle - prev_coupon[has_prev]).astype(int) / (
+            next_coupon[has_prev] - prev_coupon[has_prev]
+        ).astype(int)
+    accrued[has_prev] = coupon[has_prev] * frac
+
+    rows, dates, k = rows[future], dates[future], k[future]
+    values = coupon[rows] + np.where(k == 0, par[rows], 0.0)
+    keep = values != 0
+
+    pay_dates, cols = np.unique(dates[keep], return_inverse=True)
+    flows = csr_matrix(
+        (values[keep], (rows[keep], cols.ravel())), shape=(len(par), len(pay_dates))
+    )
+
+    return CashFlowMatrix(
+        settle=settle,
+        n=n,
+        flows=flows,
+        pay_dates=pay_dates,
+        times=(pay_dates - settle).astype(int) / 365.25,
+        accrued=accrued,
+    )
+
+
+def holdings_cash_flow_matrix(
+    holdings_df: pd.DataFrame,
+    settle: date | str = None,
+    n=2,
+    maturity_format="%b %d, %Y",
+) -> CashFlowMatrix:
+    # ishares holdings sheet - flows per 1 unit of par so quantities are the Par Value column
+    maturities = pd.to_datetime(
+        holdings_df["Maturity"], format=maturity_format, errors="coerce"
+    )
+    return build_cash_flow_matrix(
+        np.ones(len(holdings_df)),
+        pd.to_numeric(holdings_df["Coupon (%)"], errors="coerce") / 100,
+        maturities,
+        settle,
+        n,
+    )
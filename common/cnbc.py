@@ -1,145 +1,454 @@
 import aiohttp
 import asyncio
+import numpy as np
+import os
 import pandas as pd
-import json
 import sys
-from datetime import datetime, timedelta
-from typing import Dict, List
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Tuple
 
+from common.scheduler import FetchScheduler
+from common.store import get_store_root, read_metadata, write_metadata
 
-def recent_spot_yields(
-    custom_minutes: List[int] = None, save_xlsx=False, override_default=False
-) -> Dict[str, Dict[str, str | int]]:
-    def sorted_time_series(time_series: List[Dict[str, str | int]]):
-        def parse_trade_time(entry):
-            if entry.get("tradeTimeinMills"):
-                return datetime.utcfromtimestamp(int(entry["tradeTimeinMills"]) / 1000)
-            else:
-                return datetime.strptime(entry["tradeTime"], "%Y%m%d%H%M%S")
-
-        for entry in time_series:
-            entry["parsedTradeTime"] = parse_trade_time(entry)
-        return sorted(time_series, key=lambda x: x["parsedTradeTime"], reverse=True)
-
-    def most_recent_by_n(
-        sorted_time_series: List[Dict[str, str | int]], n_minutes: int | float, mat: str
+"""
+Intraday treasury yields off cnbc's 1D chart bars
+
+a YieldPoller keeps one numpy ring buffer of (trade time ms, close) per maturity and only appends bars newer than
+what it already holds, lookbacks are a searchsorted on the time array. every poll publishes a snapshot
+    { "<minutes>m": [ { mat, tradeTime, close } per maturity ] }
+to subscribers - callbacks and/or asyncio queues
+"""
+
+CNBC_MATURITIES = ["US1Y", "US2Y", "US3Y", "US5Y", "US7Y", "US10Y", "US20Y", "US30Y"]
+DEFAULT_LOOKBACKS = [0.0, 5.0, 10.0, 15.0, 30.0, 60.0, 90.0, 120.0]
+
+
+def cnbc_chart_url(mat: str, time_range="1D") -> str:
+    return f"https://webql-redesign.cnbcfm.com/graphql?operationName=getQuoteChartData&variables=%7B%22symbol%22%3A%22{mat}%22%2C%22timeRange%22%3A%22{time_range}%22%7D&extensions=%7B%22persistedQuery%22%3A%7B%22version%22%3A1%2C%22sha256Hash%22%3A%2261b6376df0a948ce77f977c69531a4a8ed6788c5ebcdd5edd29dd878ce879c8d%22%7D%7D"
+
+
+def parse_price_bars(bars: List[Dict]) -> Tuple[np.ndarray, np.ndarray]:
+    # (trade time ms, close) sorted by time - closes come back as "4.123%"
+    def trade_time(bar) -> int:
+        if bar.get("tradeTimeinMills"):
+            return int(bar["tradeTimeinMills"])
+        return int(
+            pd.Timestamp(datetime.strptime(bar["tradeTime"], "%Y%m%d%H%M%S")).value
+            // 1_000_000
+        )
+
+    times = np.fromiter((trade_time(bar) for bar in bars), dtype=np.int64, count=len(bars))
+    closes = np.fromiter(
+        (float(str(bar["close"]).rstrip("%")) for bar in bars),
+        dtype=np.float64,
+        count=len(bars),
+    )
+    order = np.argsort(times, kind="stable")
+    return times[order], closes[order]
+
+
+class BarRingBuffer:
+    def __init__(self, capacity: int = 2048):
+        self.capacity = capacity
+        self._times = np.zeros(capacity, dtype=np.int64)
+        self._closes = np.zeros(capacity, dtype=np.float64)
+        self._start = 0
+        self.size = 0
+        # bars ever appended - absolute index i lives at i % capacity while i >= first_index
+        self.total = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def first_index(self) -> int:
+        return self.total - self.size
+
+    def time_at(self, i: int) -> int:
+        return int(self._times[i % self.capacity])
+
+    def close_at(self, i: int) -> float:
+        return float(self._closes[i % self.capacity])
+
+    @property
+    def last_time(self) -> int | None:
+        if not self.size:
+            return None
+        return int(self._times[(self._start + self.size - 1) % self.capacity])
+
+    def append(self, times: np.ndarray, closes: np.ndarray) -> int:
+        """
+        only bars after the last one held, oldest bars fall off once full - the last bar is still forming
+        until the next one shows up, so a new close for it overwrites the slot
+        returns bars appended + 1 if the last bar's close changed
+        """
+        updated = 0
+        if self.size:
+            last_time = self.last_time
+            forming = closes[times == last_time]
+            last = (self._start + self.size - 1) % self.capacity
+            if len(forming) and not np.isnan(forming[-1]) and forming[-1] != self._closes[last]:
+                self._closes[last] = forming[-1]
+                updated = 1
+            new = times > last_time
+            times, closes = times[new], closes[new]
+        times, closes = times[-self.capacity :], closes[-self.capacity :]
+
+        n = len(times)
+        if not n:
+            return updated
+        pos = (self._start + self.size + np.arange(n)) % self.capacity
+        self._times[pos] = times
+        self._closes[pos] = closes
+
+        overflow = max(self.size + n - self.capacity, 0)
+        self._start = (self._start + overflow) % self.capacity
+        self.size = min(self.size + n, self.capacity)
+        self.total += n
+        return n + updated
+
+    def view(self) -> Tuple[np.ndarray, np.ndarray]:
+        # time ordered copies
+        idx = (self._start + np.arange(self.size)) % self.capacity
+        return self._times[idx], self._closes[idx]
+
+    def lookback(self, minutes: List[float]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        bar nearest to (last bar - minutes) for each lookback
+        """
+        times, closes = self.view()
+        if not self.size:
+            return np.full(len(minutes), -1, dtype=np.int64), np.full(len(minutes), np.nan)
+
+        targets = times[-1] - (np.asarray(minutes, dtype=np.float64) * 60_000).astype(
+            np.int64
+        )
+        right = np.clip(np.searchsorted(times, targets), 0, self.size - 1)
+        left = np.clip(right - 1, 0, self.size - 1)
+        nearest = np.where(
+            np.abs(times[left] - targets) <= np.abs(times[right] - targets), left, right
+        )
+        return times[nearest], closes[nearest]
+
+
+def lookback_key(minutes: float) -> str:
+    return f"{float(minutes)}m"
+
+
+class YieldPoller:
+    def __init__(
+        self,
+        maturities: List[str] = CNBC_MATURITIES,
+        lookbacks: List[float] = DEFAULT_LOOKBACKS,
+        interval: float = 60,
+        capacity: int = 2048,
+        scheduler: FetchScheduler = None,
     ):
-        if n_minutes == 0:
-            most_recent_dict = sorted_time_series[0]
-            most_recent_dict["close"] = float(str(most_recent_dict["close"])[:-1])
-            most_recent_dict["mat"] = mat
-            return most_recent_dict
-
-        if n_minutes > 0:
-            most_recent_time = sorted_time_series[0]["parsedTradeTime"]
-            target_time = most_recent_time - timedelta(minutes=n_minutes)
-            most_recent_by_n_dict = min(
-                sorted_time_series,
-                key=lambda x: abs(x["parsedTradeTime"] - target_time),
-            )
-            most_recent_by_n_dict["mat"] = mat
-            return most_recent_by_n_dict
-        else:
-            most_recent_time = sorted_time_series[0]["parsedTradeTime"]
-            target_time = most_recent_time - timedelta(seconds=n_minutes)
-            most_recent_by_n_dict = min(
-                sorted_time_series,
-                key=lambda x: abs(x["parsedTradeTime"] - target_time),
-            )
-            most_recent_by_n_dict["mat"] = mat
-            return most_recent_by_n_dict
-
-    async def fetch(session, url, mat):
-        async with session.get(url) as response:
-            try:
-                if response.status != 200:
-                    raise Exception("Bad Status")
-                json = await response.json()
-                time_series_sorted = sorted_time_series(
-                    json["data"]["chartData"]["priceBars"]
-                )
+        self.maturities = maturities
+        self.lookbacks = lookbacks
+        self.interval = interval
+        self.scheduler = scheduler or FetchScheduler()
+        self.buffers = {mat: BarRingBuffer(capacity) for mat in maturities}
+        self._callbacks: List[Callable[[Dict], None]] = []
+        self._bar_listeners: List[Callable[[str, BarRingBuffer], None]] = []
+        self._queues: List[asyncio.Queue] = []
+        self.last_snapshot: Dict[str, List[Dict]] = {}
+
+    def subscribe(self, callback: Callable[[Dict], None] = None) -> asyncio.Queue | None:
+        # callbacks run inline after each poll, without one you get a queue of snapshots
+        if callback:
+            self._callbacks.append(callback)
+            return None
+        queue = asyncio.Queue()
+        self._queues.append(queue)
+        return queue
+
+    def add_bar_listener(self, listener: Callable[[str, "BarRingBuffer"], None]):
+        # called with (maturity, buffer) right after new bars land in a buffer or its last bar updates
+        self._bar_listeners.append(listener)
+
+    def unsubscribe(self, subscriber: Callable[[Dict], None] | asyncio.Queue):
+        if subscriber in self._callbacks:
+            self._callbacks.remove(subscriber)
+        if subscriber in self._queues:
+            self._queues.remove(subscriber)
 
-                most_recent = most_recent_by_n(time_series_sorted, 0, mat)
-                five_min = most_recent_by_n(time_series_sorted, 5, mat)
-                ten_min = most_recent_by_n(time_series_sorted, 10, mat)
-                fifteen_min = most_recent_by_n(time_series_sorted, 15, mat)
-                thirty_min = most_recent_by_n(time_series_sorted, 30, mat)
-                sixty_min = most_recent_by_n(time_series_sorted, 60, mat)
-                ninety_min = most_recent_by_n(time_series_sorted, 90, mat)
-                two_hour = most_recent_by_n(time_series_sorted, 120, mat)
-
-                base = {"maturity": mat}
-                if not override_default:
-                    base.update(
-                        {
-                            "0.0m": most_recent,
-                            "5.0m": five_min,
-                            "10.0m": ten_min,
-                            "15.0m": fifteen_min,
-                            "30.0m": thirty_min,
-                            "60.0m": sixty_min,
-                            "90.0m": ninety_min,
-                            "120.0m": two_hour,
-                        }
-                    )
-
-                if custom_minutes:
-                    custom_min_dict = {}
-                    for minute in custom_minutes:
-                        new_key = f"{minute}m"
-                        custom_min_dict[new_key] = most_recent_by_n(
-                            time_series_sorted, minute, mat
-                        )
-                    base.update(custom_min_dict)
-
-                return base
+    async def _fetch(self, session: aiohttp.ClientSession, mat: str) -> int:
+        try:
+            json = await self.scheduler.get_json(session, cnbc_chart_url(mat))
+            times, closes = parse_price_bars(json["data"]["chartData"]["priceBars"])
+            changed = self.buffers[mat].append(times, closes)
+            if changed:
+                for listener in self._bar_listeners:
+                    listener(mat, self.buffers[mat])
+            return changed
+        except Exception as e:
+            print(e)
+            return 0
 
+    def snapshot(self, lookbacks: List[float] = None) -> Dict[str, List[Dict]]:
+        lookbacks = self.lookbacks if lookbacks is None else lookbacks
+        snapshot = {lookback_key(minutes): [] for minutes in lookbacks}
+        for mat, buffer in self.buffers.items():
+            times, closes = buffer.lookback(lookbacks)
+            for minutes, trade_time, close in zip(lookbacks, times, closes):
+                snapshot[lookback_key(minutes)].append(
+                    {
+                        "mat": mat,
+                        "tradeTime": pd.Timestamp(trade_time, unit="ms")
+                        if trade_time >= 0
+                        else None,
+                        "close": close,
+                    }
+                )
+        return snapshot
+
+    def publish(self, snapshot: Dict[str, List[Dict]]):
+        self.last_snapshot = snapshot
+        for callback in self._callbacks:
+            try:
+                callback(snapshot)
             except Exception as e:
                 print(e)
-                return {}
+        for queue in self._queues:
+            queue.put_nowait(snapshot)
+
+    async def poll_once(self, session: aiohttp.ClientSession) -> Dict[str, List[Dict]]:
+        changed = await asyncio.gather(
+            *[self._fetch(session, mat) for mat in self.maturities]
+        )
+        snapshot = self.snapshot()
+        # nothing new - don't wake subscribers
+        if any(changed) or not self.last_snapshot:
+            self.publish(snapshot)
+        return snapshot
 
-    async def main(urls):
-        async with aiohttp.ClientSession() as session:
-            tasks = [fetch(session, url, mat) for url, mat in urls]
-            return await asyncio.gather(*tasks)
+    async def run(
+        self,
+        session: aiohttp.ClientSession = None,
+        stop: asyncio.Event = None,
+        max_polls: int = None,
+    ):
+        own_session = session is None
+        session = session or aiohttp.ClientSession()
+        polls = 0
+        try:
+            while not (stop and stop.is_set()):
+                await self.poll_once(session)
+                polls += 1
+                if max_polls and polls >= max_polls:
+                    break
+                if not stop:
+                    await asyncio.sleep(self.interval)
+                    continue
+                try:
+                    await asyncio.wait_for(stop.wait(), self.interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            if own_session:
+                await session.close()
 
-    mats = ["US1Y", "US2Y", "US3Y", "US5Y", "US7Y", "US10Y", "US20Y", "US30Y"]
-    recent_spot_keys = (
-        [f"{minute}m" for minute in custom_minutes] if custom_minutes else []
-    )
-    recent_spot_keys += (
-        ["0.0m", "5.0m", "10.0m", "15.0m", "30.0m", "60.0m", "90.0m", "120.0m"]
-        + recent_spot_keys
-        if not override_default
-        else recent_spot_keys
-    )
 
-    urls = [
-        (
-            f"https://webql-redesign.cnbcfm.com/graphql?operationName=getQuoteChartData&variables=%7B%22symbol%22%3A%22{mat}%22%2C%22timeRange%22%3A%221D%22%7D&extensions=%7B%22persistedQuery%22%3A%7B%22version%22%3A1%2C%22sha256Hash%22%3A%2261b6376df0a948ce77f977c69531a4a8ed6788c5ebcdd5edd29dd878ce879c8d%22%7D%7D",
-            mat,
+"""
+Rolling curve changes - yields, slopes and flies over every lookback, kept current bar by bar
+
+each (maturity, lookback) keeps a pointer to the last bar at or before (last bar - lookback), pointers only move
+forward so each new bar costs O(1) amortized per lookback. spreads/flies are fixed linear combinations of the
+maturities (rows x maturities weights), so their changes are one small matmul over the current levels
+
+state is a float64 memmap at store/cnbc/curve_changes.f8 for notebooks to read without fetching:
+    header: [version, updated at (ms), rows, cols] - version is odd while a write is in progress
+    body:   rows x cols - "level" (yields in %, spreads/flies in bps) + one change column (bps) per lookback
+row/column labels are in store/cnbc/_meta.json
+"""
+
+CNBC_SPREADS: Dict[str, Tuple[str, str]] = {
+    "2s10s": ("US10Y", "US2Y"),
+    "5s30s": ("US30Y", "US5Y"),
+}
+CNBC_FLIES: Dict[str, Tuple[str, str, str]] = {
+    "2s5s10s": ("US2Y", "US5Y", "US10Y"),
+    "5s10s30s": ("US5Y", "US10Y", "US30Y"),
+}
+CURVE_CHANGES_HEADER = 4
+
+
+def curve_changes_path(root: str = None) -> str:
+    return os.path.join(get_store_root(root), "cnbc", "curve_changes.f8")
+
+
+class CurveChangeEngine:
+    def __init__(
+        self,
+        maturities: List[str] = CNBC_MATURITIES,
+        lookbacks: List[float] = DEFAULT_LOOKBACKS,
+        spreads: Dict[str, Tuple[str, str]] = CNBC_SPREADS,
+        flies: Dict[str, Tuple[str, str, str]] = CNBC_FLIES,
+        root: str = None,
+    ):
+        self.maturities = maturities
+        self.lookbacks = np.asarray(lookbacks, dtype=np.float64)
+        self.rows = list(maturities) + list(spreads) + list(flies)
+        self.columns = ["level"] + [lookback_key(x) for x in lookbacks]
+
+        mat_idx = {mat: i for i, mat in enumerate(maturities)}
+        n = len(maturities)
+        self.weights = np.zeros((len(self.rows), n))
+        self.weights[:n] = np.eye(n)
+        self.scale = np.ones(len(self.rows))
+        for i, (long, short) in enumerate(spreads.values(), n):
+            self.weights[i, mat_idx[long]] += 1
+            self.weights[i, mat_idx[short]] -= 1
+            self.scale[i] = 100
+        for i, (short, belly, long) in enumerate(flies.values(), n + len(spreads)):
+            self.weights[i, mat_idx[belly]] += 2
+            self.weights[i, mat_idx[short]] -= 1
+            self.weights[i, mat_idx[long]] -= 1
+            self.scale[i] = 100
+
+        self.levels = np.full(n, np.nan)
+        self.lagged = np.full((n, len(self.lookbacks)), np.nan)
+        self._pointers = np.zeros((n, len(self.lookbacks)), dtype=np.int64)
+
+        self.root = root
+        path = curve_changes_path(root)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.state = np.memmap(
+            path,
+            dtype=np.float64,
+            mode="w+",
+            shape=(CURVE_CHANGES_HEADER + len(self.rows) * len(self.columns),),
         )
-        for mat in mats
-    ]
-    results = asyncio.run(main(urls))
-    recent_spot_yields_dict = {tick["maturity"]: tick for tick in results}
-    print(recent_spot_yields_dict)
+        self.state[:CURVE_CHANGES_HEADER] = [0, 0, len(self.rows), len(self.columns)]
+        self.state[CURVE_CHANGES_HEADER:] = np.nan
+
+        metadata = read_metadata("cnbc", root)
+        metadata["curve_changes"] = {"rows": self.rows, "columns": self.columns}
+        write_metadata("cnbc", metadata, root)
+
+    def attach(self, poller: YieldPoller) -> "CurveChangeEngine":
+        poller.add_bar_listener(self.on_bars)
+        return self
+
+    def on_bars(self, mat: str, buffer: BarRingBuffer):
+        i = self.maturities.index(mat)
+        last = buffer.total - 1
+        last_time = buffer.time_at(last)
+        self.levels[i] = buffer.close_at(last)
+
+        targets = last_time - (self.lookbacks * 60_000).astype(np.int64)
+        for j, target in enumerate(targets):
+            # advance to the last bar at/before the target, then take the nearer neighbour
+            p = max(self._pointers[i, j], buffer.first_index)
+            while p < last and buffer.time_at(p + 1) <= target:
+                p += 1
+            self._pointers[i, j] = p
+            nearest = p
+            if p < last and abs(buffer.time_at(p + 1) - target) < abs(
+                buffer.time_at(p) - target
+            ):
+                nearest = p + 1
+            self.lagged[i, j] = buffer.close_at(nearest)
 
-    structured_recent_spots = {
-        min_key: [recent_spot_yields_dict[mat][min_key] for mat in mats]
-        for min_key in recent_spot_keys
-    }
+        self.write_state(last_time)
+
+    def current(self) -> np.ndarray:
+        # rows x ["level", changes per lookback]
+        levels = self.weights @ self.levels * self.scale
+        changes = self.weights @ (self.levels[:, np.newaxis] - self.lagged) * 100
+        return np.column_stack([levels, changes])
+
+    def write_state(self, updated_at: int):
+        header = self.state[:CURVE_CHANGES_HEADER]
+        header[0] += 1
+        self.state[CURVE_CHANGES_HEADER:] = self.current().ravel()
+        header[1] = updated_at
+        header[0] += 1
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self.current(), index=self.rows, columns=self.columns)
+
+
+def read_curve_changes(root: str = None, retries: int = 100) -> pd.DataFrame:
+    """
+    current curve change state written by a running feed (run_curve_change_feed)
+    updated_at (utc) is in df.attrs
+    """
+    labels = read_metadata("cnbc", root).get("curve_changes")
+    path = curve_changes_path(root)
+    if not labels or not os.path.exists(path):
+        return pd.DataFrame()
+
+    state = np.memmap(path, dtype=np.float64, mode="r")
+    for _ in range(retries):
+        version = state[0]
+        body = np.array(state[CURVE_CHANGES_HEADER:])
+        updated_at = state[1]
+        # even and unchanged across the copy - not torn by a concurrent write
+        if version % 2 == 0 and state[0] == version:
+            break
+        time.sleep(0.001)
+
+    df = pd.DataFrame(
+        body.reshape(int(state[2]), int(state[3])),
+        index=labels["rows"],
+        columns=labels["columns"],
+    )
+    df.attrs["updated_at"] = pd.Timestamp(int(updated_at), unit="ms") if updated_at else None
+    return df
+
+
+def run_curve_change_feed(
+    lookbacks: List[float] = DEFAULT_LOOKBACKS,
+    interval: float = 60,
+    root: str = None,
+    scheduler: FetchScheduler = None,
+):
+    # long running - keeps store/cnbc/curve_changes.f8 current for read_curve_changes
+    poller = YieldPoller(lookbacks=lookbacks, interval=interval, scheduler=scheduler)
+    CurveChangeEngine(lookbacks=lookbacks, root=root).attach(poller)
+    asyncio.run(poller.run())
+
+
+def run_yield_poller(
+    callback: Callable[[Dict], None],
+    lookbacks: List[float] = DEFAULT_LOOKBACKS,
+    interval: float = 60,
+    max_polls: int = None,
+    scheduler: FetchScheduler = None,
+):
+    poller = YieldPoller(lookbacks=lookbacks, interval=interval, scheduler=scheduler)
+    poller.subscribe(callback)
+    asyncio.run(poller.run(max_polls=max_polls))
+
+
+def save_recent_spots_xlsx(
+    snapshot: Dict[str, List[Dict]],
+    path: str = r"C:\Users\chris\trade\curr_pos\rates\recent_spots.xlsx",
+):
+    with pd.ExcelWriter(path) as writer:
+        for minute, rows in snapshot.items():
+            pd.DataFrame(rows).to_excel(writer, sheet_name=f"{minute}", index=False)
+
+
+def recent_spot_yields(
+    custom_minutes: List[int] = None,
+    save_xlsx=False,
+    override_default=False,
+    scheduler: FetchScheduler = None,
+) -> Dict[str, List[Dict]]:
+    # one poll - for a live feed use YieldPoller/run_yield_poller
+    lookbacks = [] if override_default else list(DEFAULT_LOOKBACKS)
+    lookbacks += [float(x) for x in custom_minutes or []]
+
+    poller = YieldPoller(lookbacks=lookbacks, scheduler=scheduler)
+    asyncio.run(poller.run(max_polls=1))
+    structured_recent_spots = poller.last_snapshot
 
     if save_xlsx:
-        keys = list(structured_recent_spots.keys())
-        structured_recent_spots_dfs = {
-            min_key: pd.DataFrame(structured_recent_spots[min_key]) for min_key in keys
-        }
-        with pd.ExcelWriter(
-            r"C:\Users\chris\trade\curr_pos\rates\recent_spots.xlsx"
-        ) as writer:
-            for minute, df in structured_recent_spots_dfs.items():
-                df.to_excel(writer, sheet_name=f"{minute}", index=False)
+        save_recent_spots_xlsx(structured_recent_spots)
 
     return structured_recent_spots
 
@@ -147,9 +456,13 @@ def recent_spot_yields(
 if __name__ == "__main__":
     args = sys.argv
     args.pop(0)
+    # python common/cnbc.py feed 0 5 10 ... - keep the curve change memmap current
+    if args and args[0] == "feed":
+        run_curve_change_feed([float(arg) for arg in args[1:]] or DEFAULT_LOOKBACKS)
+        sys.exit(0)
+
     custom = [float(arg) for arg in args]
     structured_recent_spots = recent_spot_yields(
         custom, save_xlsx=True, override_default=True
     )
     print(f"Recent Spots Updated as of {datetime.now()}")
-    # print(json.dumps(structured_recent_spots, indent=4, sort_keys=True, default=str))
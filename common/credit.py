@@ -1,25 +1,34 @@
 import numpy as np
+import pandas as pd
 from scipy.optimize import newton
+from typing import Tuple
+
+from common.Bond import Bond, VectorizedBond
+from common.curves import ZeroCurves
 
-from calcs.utils import Bond
 
 class Credit(Bond):
     _benchmark_data = []
-    
+
     def __init__(self, benchmark_data):
         self._benchmark_data = benchmark_data
-    
+
     """
     Usage:
     Assume the bond has a face amount of $1,000, a coupon yield of 5%, a market value of $950, and a maturity of 10 years.
     Assume the annual spot rates for each year are given in the list spot_rates (e.g., [0.02, 0.025, 0.03, ..., 0.05]).
-    z_spread = Bond.calculate_z_spread(1000, 0.05, 950, 10, spot_rates)
-    """    
+    z_spread = Credit.calculate_z_spread(1000, 0.05, 950, 10, spot_rates)
+    """
+
+    @staticmethod
     def calculate_z_spread(face_amount, coupon_yield, market_value, T, spot_rates, n=1):
+        spot_rates = np.asarray(spot_rates, dtype=float)
+        t = np.arange(1, len(spot_rates) + 1)
+
         def present_value(z_spread):
-            discount_factors = [(1 + (spot_rate + z_spread) / n) ** (-n * t) for t, spot_rate in enumerate(spot_rates, 1)]
+            discount_factors = (1 + (spot_rates + z_spread) / n) ** (-n * t)
             coupon_payment = face_amount * coupon_yield / n
-            pv_coupon_payments = np.sum(coupon_payment * np.array(discount_factors))
+            pv_coupon_payments = np.sum(coupon_payment * discount_factors)
             pv_face_value = face_amount * discount_factors[-1]
             return pv_coupon_payments + pv_face_value - market_value
 
@@ -28,4 +37,116 @@ class Credit(Bond):
             return z_spread
         except Exception as e:
             print(f"Failed to converge. Error: {e}")
-            return None
\ No newline at end of file
+            return None
+
+    @staticmethod
+    def cash_flow_matrix(par, coupon_yield, T, n=2) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (holdings x periods) cash flows and their times, counted back from maturity so a partial first period
+        prices off the dirty market value - slots past a bond's first coupon are zero
+        """
+        par, coupon_yield, T = VectorizedBond._as_arrays(par, coupon_yield, T)
+        par, coupon_yield, T = par.ravel(), coupon_yield.ravel(), T.ravel()
+
+        periods = np.ceil(np.nan_to_num(T, nan=0.0) * n - 1e-9).clip(min=0)
+        k = np.arange(int(periods.max(initial=0)))
+        times = T[:, np.newaxis] - k[np.newaxis, :] / n
+        mask = k[np.newaxis, :] < periods[:, np.newaxis]
+
+        cash_flows = np.where(mask, (par * coupon_yield / n)[:, np.newaxis], 0.0)
+        if k.size:
+            cash_flows[:, 0] += np.where(periods > 0, par, 0.0)
+
+        return cash_flows, np.where(mask, times, 0.0)
+
+    @staticmethod
+    def calc_z_spreads(
+        par,
+        coupon_yield,
+        market_value,
+        T,
+        curve: ZeroCurves,
+        curve_date=None,
+        n=2,
+        tol=1e-10,
+        max_iter=50,
+    ) -> np.ndarray:
+        """
+        z-spread of every bond against one spot curve - masked newton, bonds drop out as they converge
+        curve_date defaults to the last fitted date
+        """
+        cash_flows, times = Credit.cash_flow_matrix(par, coupon_yield, T, n)
+        market_value = np.asarray(market_value, dtype=float).ravel()
+        if not cash_flows.size:
+            return np.full(market_value.shape, np.nan)
+
+        curve_date = curve.dates[-1] if curve_date is None else curve_date
+        active_cells = times > 0
+        spot = np.zeros(times.shape)
+        spot[active_cells] = curve.zero_rates(times[active_cells], [curve_date], n=n)[0]
+
+        with np.errstate(all="ignore"):
+            z = np.zeros(market_value.shape)
+            active = (
+                active_cells.any(axis=1)
+                & np.isfinite(cash_flows).all(axis=1)
+                & np.isfinite(market_value)
+                & (market_value > 0)
+            )
+            converged = np.zeros(z.shape, dtype=bool)
+
+            for _ in range(max_iter):
+                idx = np.flatnonzero(active)
+                if idx.size == 0:
+                    break
+
+                base = 1 + (spot[idx] + z[idx, np.newaxis]) / n
+                discount = np.where(active_cells[idx], base ** (-n * times[idx]), 0.0)
+                price = (cash_flows[idx] * discount).sum(axis=1)
+                slope = -(cash_flows[idx] * times[idx] * discount / base).sum(axis=1)
+
+                step = (price - market_value[idx]) / slope
+                z[idx] = z[idx] - step
+
+                done = np.abs(step) < tol
+                failed = ~np.isfinite(z[idx])
+                converged[idx[done & ~failed]] = True
+                active[idx[done | failed]] = False
+
+        return np.where(converged, z, np.nan)
+
+    @staticmethod
+    def calc_holdings_z_spreads(
+        holdings_df: pd.DataFrame,
+        curve: ZeroCurves,
+        curve_date=None,
+        n=2,
+        maturity_format="%b %d, %Y",
+    ) -> Tuple[pd.DataFrame, float]:
+        # ishares holdings sheet -> per holding Z-Spread column + market value weighted fund spread
+        # time to maturity runs from the curve date
+        df = holdings_df.copy()
+        curve_date = curve.dates[-1] if curve_date is None else curve_date
+        settle = pd.Timestamp(curve_date)
+        market_value = pd.to_numeric(df["Market Value"], errors="coerce").to_numpy(float)
+        maturities = pd.to_datetime(df["Maturity"], format=maturity_format, errors="coerce")
+        T = ((maturities - settle).dt.days / 365.0).to_numpy(dtype=float)
+        df["Z-Spread"] = Credit.calc_z_spreads(
+            pd.to_numeric(df["Par Value"], errors="coerce"),
+            pd.to_numeric(df["Coupon (%)"], errors="coerce") / 100,
+            market_value,
+            T,
+            curve,
+            curve_date,
+            n,
+        )
+
+        solved = np.isfinite(df["Z-Spread"].to_numpy()) & np.isfinite(market_value)
+        fund_z_spread = (
+            np.sum(df["Z-Spread"].to_numpy()[solved] * market_value[solved])
+            / np.sum(market_value[solved])
+            if solved.any()
+            else np.nan
+        )
+
+        return df, fund_z_spread
@@ -0,0 +1,186 @@
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass
+from datetime import date
+from scipy.interpolate import CubicSpline, PchipInterpolator, interp1d
+from typing import List
+
+from common.store import read_frame, write_frame
+from common.treasuries import ParCurvePanel, tenor_to_years
+
+"""
+Zero/forward curves bootstrapped from treasury par yields - every date at once on a dates x tenor grid
+
+1. par yields are interpolated onto the grid (bill pillars + semiannual 0.5y..30y) - linear, pchip (monotone cubic) or natural cubic
+2. bills are treated as zeros, coupon points are bootstrapped off par bonds: c/2 * sum(DF_1..DF_k) + DF_k = 1
+3. discount factors between grid points are log-linear (flat forwards), so any maturity can be queried in bulk
+
+fitted dates are cached in the store (treasury_zero_curves) and only new dates get bootstrapped
+"""
+
+INTERPOLATION_METHODS = ["linear", "pchip", "cubic"]
+BILL_PILLARS = np.array([1, 2, 3, 4]) / 12
+CURVE_GRID = np.concatenate([BILL_PILLARS, np.arange(1, 61) / 2])
+
+
+def interpolate_par_yields(
+    tenors: np.ndarray, values: np.ndarray, grid: np.ndarray, method="pchip"
+) -> np.ndarray:
+    if method not in INTERPOLATION_METHODS:
+        raise ValueError(f"Bad interpolation method: {method}")
+
+    out = np.full((values.shape[0], len(grid)), np.nan)
+    # tenors come and go over the years (2 Mo, 4 Mo, 20 Yr, 30 Yr) - fit each missing-tenor pattern as one block
+    mask = ~np.isnan(values)
+    patterns, inverse = np.unique(mask, axis=0, return_inverse=True)
+    for i, pattern in enumerate(patterns):
+        rows = inverse.ravel() == i
+        x = tenors[pattern]
+        y = values[rows][:, pattern]
+        if len(x) == 0:
+            continue
+        if len(x) == 1:
+            out[rows] = y[:, :1]
+            continue
+
+        # flat outside the quoted tenors
+        curr_grid = np.clip(grid, x[0], x[-1])
+        if method == "linear":
+            out[rows] = interp1d(x, y, axis=1)(curr_grid)
+        elif method == "pchip":
+            out[rows] = PchipInterpolator(x, y, axis=1)(curr_grid)
+        else:
+            out[rows] = CubicSpline(x, y, axis=1, bc_type="natural")(curr_grid)
+
+    return out
+
+
+def bootstrap_discount_factors(grid: np.ndarray, par: np.ndarray) -> np.ndarray:
+    # par as decimals, semiannual bond equivalent - grid points below 6m are zeros
+    dfs = np.empty_like(par)
+    bills = grid < 0.5
+    dfs[:, bills] = (1 + par[:, bills] / 2) ** (-2 * grid[bills])
+
+    coupon_sum = np.zeros(par.shape[0])
+    for k in np.flatnonzero(~bills):
+        coupon = par[:, k] / 2
+        dfs[:, k] = (1 - coupon * coupon_sum) / (1 + coupon)
+        coupon_sum += dfs[:, k]
+
+    return dfs
+
+
+@dataclass
+class ZeroCurves:
+    dates: np.ndarray
+    grid: np.ndarray
+    discount_factors: np.ndarray
+    method: str = "pchip"
+
+    def date_idx(self, dates: List[date | str] | None) -> np.ndarray:
+        if dates is None:
+            return np.arange(len(self.dates))
+        targets = np.array(pd.to_datetime(dates), dtype="datetime64[D]")
+        idx = np.searchsorted(self.dates, targets)
+        found = idx < len(self.dates)
+        found[found] = self.dates[idx[found]] == targets[found]
+        if not found.all():
+            raise KeyError(f"No curve for {list(targets[~found])}")
+        return idx
+
+    def discount(
+        self, t: np.ndarray | float, dates: List[date | str] = None
+    ) -> np.ndarray:
+        """
+        discount factors for maturities t (years) - dates x len(t), log-linear between grid points
+        """
+        t = np.atleast_1d(np.asarray(t, dtype=np.float64))
+        log_dfs = np.log(self.discount_factors[self.date_idx(dates)])
+        # anchor DF(0) = 1, flat forward past the last grid point
+        grid = np.concatenate([[0.0], self.grid])
+        log_dfs = np.hstack([np.zeros((log_dfs.shape[0], 1)), log_dfs])
+
+        idx = np.clip(np.searchsorted(grid, t, side="right") - 1, 0, len(grid) - 2)
+        w = (t - grid[idx]) / (grid[idx + 1] - grid[idx])
+        return np.exp(log_dfs[:, idx] * (1 - w) + log_dfs[:, idx + 1] * w)
+
+    def zero_rates(
+        self, t: np.ndarray | float = None, dates: List[date | str] = None, n=2
+    ) -> np.ndarray:
+        # n compounding periods per year, n=0 for continuous
+        t = self.grid if t is None else np.atleast_1d(np.asarray(t, dtype=np.float64))
+        dfs = self.discount(t, dates)
+        if n == 0:
+            return -np.log(dfs) / t
+        return n * (dfs ** (-1 / (n * t)) - 1)
+
+    def spot_rates(self, T: int, dates: List[date | str] = None) -> np.ndarray:
+        # annual spot rates for years 1..T - what Credit.calculate_z_spread takes
+        return self.zero_rates(np.arange(1, T + 1), dates, n=1)
+
+    def forward_rates(
+        self, t: np.ndarray | float = None, tau=0.5, dates: List[date | str] = None
+    ) -> np.ndarray:
+        # simple forward rate from t to t + tau
+        t = self.grid if t is None else np.atleast_1d(np.asarray(t, dtype=np.float64))
+        return (self.discount(t, dates) / self.discount(t + tau, dates) - 1) / tau
+
+    def to_frame(self, kind="zero") -> pd.DataFrame:
+        values = {
+            "zero": lambda: self.zero_rates(),
+            "forward": lambda: self.forward_rates(),
+            "discount": lambda: self.discount_factors,
+        }[kind]()
+        df = pd.DataFrame(values, columns=[f"{x:g}" for x in self.grid])
+        df.insert(0, "Date", pd.to_datetime(self.dates))
+        return df
+
+
+def curve_cache_key(method: str, real_par_yields=False) -> str:
+    return f"real_{method}" if real_par_yields else method
+
+
+def bootstrap_zero_curves(
+    panel: ParCurvePanel,
+    method="pchip",
+    real_par_yields=False,
+    grid: np.ndarray = CURVE_GRID,
+    use_cache=True,
+) -> ZeroCurves:
+    """
+    discount factors for every panel date - dates already fitted (same method/grid) come from the store
+    """
+    key = curve_cache_key(method, real_par_yields)
+    grid_cols = [f"{x:g}" for x in grid]
+
+    cached = read_frame("treasury_zero_curves", key) if use_cache else pd.DataFrame()
+    if not cached.empty and list(cached.columns[1:]) != grid_cols:
+        cached = pd.DataFrame()
+
+    cached_dates = (
+        cached["Date"].to_numpy(dtype="datetime64[D]")
+        if not cached.empty
+        else np.array([], dtype="datetime64[D]")
+    )
+    todo = ~np.isin(panel.dates, cached_dates)
+
+    tenors = np.array([tenor_to_years(x) for x in panel.tenors])
+    par = interpolate_par_yields(tenors, panel.values[todo] / 100, grid, method)
+    fitted = pd.DataFrame(bootstrap_discount_factors(grid, par), columns=grid_cols)
+    fitted.insert(0, "Date", pd.to_datetime(panel.dates[todo]))
+
+    if use_cache and todo.any():
+        if not cached.empty:
+            fitted = pd.concat([cached, fitted], ignore_index=True)
+        cached = fitted.sort_values("Date").reset_index(drop=True)
+        write_frame(cached, "treasury_zero_curves", key)
+    elif not use_cache:
+        cached = fitted
+
+    df = cached.set_index("Date").reindex(pd.to_datetime(panel.dates))
+    return ZeroCurves(
+        panel.dates,
+        np.asarray(grid, dtype=np.float64),
+        df.to_numpy(dtype=np.float64),
+        method,
+    )
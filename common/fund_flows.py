@@ -1,5 +1,6 @@
 import requests
 import pandas as pd
+import numpy as np
 from datetime import datetime, date
 import webbrowser
 import http
@@ -10,6 +11,9 @@ import aiohttp
 import asyncio
 from typing import List, Dict
 
+from common.store import write_frame, read_frame, has_frame
+from common.scheduler import FetchScheduler
+
 
 def fetch_new_bearer_token(
     cj: http.cookiejar = None, open_chrome=False
@@ -71,8 +75,20 @@ def fetch_new_bearer_token(
     return None
 
 
+def fund_flow_data_to_df(data: List[Dict[str, str]]) -> pd.DataFrame:
+    df = pd.DataFrame(data)
+    if "asOf" in df:
+        df["asOf"] = pd.to_datetime(df["asOf"])
+    return df
+
+
 def fetch_fund_flow_data(
-    ticker, bearerToken: str, date_from: date, date_to: date, raw_path: str
+    ticker,
+    bearerToken: str,
+    date_from: date,
+    date_to: date,
+    raw_path: str = None,
+    make_xlsx=False,
 ) -> pd.DataFrame:
     if not bearerToken:
         return None
@@ -107,10 +123,11 @@ def fetch_fund_flow_data(
 
     if res.status_code == 200:
         json = res.json()
-        wb_name = f"{raw_path}/{ticker}_fund_flow_data.xlsx"
         data = json["data"]["results"]["data"]
-        df = pd.DataFrame(data)
-        df.to_excel(wb_name, index=False)
+        df = fund_flow_data_to_df(data)
+        write_frame(df, "fund_flows", ticker)
+        if make_xlsx:
+            df.to_excel(f"{raw_path}/{ticker}_fund_flow_data.xlsx", index=False)
         return df
 
     print(f"Status Code: {res.status_code} - Fetch Fund Flows Data Failed")
@@ -146,67 +163,116 @@ def get_etf_headers(
     }
 
 
-def multi_fetch_fund_flow_data(
-    tickers: List[int],
+async def multi_fetch_fund_flow_data_async(
+    tickers: List[str],
     bearer_token: str,
     date_from: date,
     date_to: date,
-    raw_path: str,
+    session: aiohttp.ClientSession,
+    scheduler: FetchScheduler,
+    raw_path: str = None,
     cj: http.cookiejar = None,
+    make_xlsx=False,
 ) -> Dict[str, List[Dict[str, str]]]:
-    async def fetch(
-        session: aiohttp.ClientSession, url: str, curr_ticker: int
-    ) -> pd.DataFrame:
+    headers = get_etf_headers(bearer_token, cj)
+
+    async def fetch(url: str, curr_ticker: str) -> List[Dict[str, str]]:
         try:
-            headers = get_etf_headers(bearer_token, cj)
-            async with session.get(url, headers=headers) as response:
-                if response.status == 200:
-                    json = await response.json()
-                    wb_name = f"{raw_path}/{curr_ticker}_fund_flow_data.xlsx"
-                    data = json["data"]["results"]["data"]
-                    df = pd.DataFrame(data)
-                    df.to_excel(wb_name, index=False)
-                    return data
-                else:
-                    raise Exception(f"Bad Status: {response.status}")
+            json = await scheduler.get_json(session, url, headers=headers)
+            data = json["data"]["results"]["data"]
+            df = fund_flow_data_to_df(data)
+            write_frame(df, "fund_flows", curr_ticker)
+            if make_xlsx:
+                df.to_excel(
+                    f"{raw_path}/{curr_ticker}_fund_flow_data.xlsx",
+                    index=False,
+                )
+            return data
         except Exception as e:
-            print(e)
+            print(f"{curr_ticker}: {e}")
             return {}
 
-    async def get_promises(session: aiohttp.ClientSession):
-        tasks = []
-        for ticker in tickers:
-            date_from_str = date_from.strftime("%Y-%m-%d").replace("-", "")
-            date_to_str = date_to.strftime("%Y-%m-%d").replace("-", "")
-            curr_url = f"https://apiprod.etf.com/private/apps/fundflows/{ticker}/charts?startDate={date_from_str}&endDate={date_to_str}"
-            task = fetch(session, curr_url, ticker)
-            tasks.append(task)
+    date_from_str = date_from.strftime("%Y-%m-%d").replace("-", "")
+    date_to_str = date_to.strftime("%Y-%m-%d").replace("-", "")
+    tasks = []
+    for ticker in tickers:
+        curr_url = f"https://apiprod.etf.com/private/apps/fundflows/{ticker}/charts?startDate={date_from_str}&endDate={date_to_str}"
+        tasks.append(fetch(curr_url, ticker))
 
-        return await asyncio.gather(*tasks)
+    result = await asyncio.gather(*tasks)
+    return dict(zip(tickers, result))
 
-    async def run_fetch_all() -> List[pd.DataFrame]:
+
+def multi_fetch_fund_flow_data(
+    tickers: List[int],
+    bearer_token: str,
+    date_from: date,
+    date_to: date,
+    raw_path: str = None,
+    cj: http.cookiejar = None,
+    make_xlsx=False,
+    scheduler: FetchScheduler = None,
+) -> Dict[str, List[Dict[str, str]]]:
+    async def run_fetch_all() -> Dict[str, List[Dict[str, str]]]:
         async with aiohttp.ClientSession() as session:
-            all_data = await get_promises(session)
-            return all_data
+            return await multi_fetch_fund_flow_data_async(
+                tickers,
+                bearer_token,
+                date_from,
+                date_to,
+                session,
+                scheduler or FetchScheduler(),
+                raw_path,
+                cj,
+                make_xlsx,
+            )
 
-    result = asyncio.run(run_fetch_all())
+    return asyncio.run(run_fetch_all())
 
-    return dict(zip(tickers, result))
 
+"""
+creation/redemption engine - shares outstanding from one reported anchor and daily creation units (flow / nav)
+    after anchor:  S[i] = anchor_shares + sum(units[anchor + 1 : i + 1])
+    before anchor: S[i] = anchor_shares - sum(units[i : anchor])
+"""
 
-def get_fund_flow_file_path_by_ticker(
-    ticker: str, cj: http.cookiejar = None
-):
-    current_directory = os.getcwd()
-    path = f"{current_directory}/flows"
-    files = sorted(
-        os.listdir(path),
+
+def calc_estimated_shares_outstanding(
+    dates: pd.DatetimeIndex,
+    creation_units: np.ndarray,
+    anchor_date: date | str,
+    anchor_shares: float,
+) -> np.ndarray:
+    dates = pd.DatetimeIndex(dates)
+    units = np.asarray(creation_units, dtype=float)
+    anchor = pd.Timestamp(anchor_date)
+
+    order = np.argsort(dates.values, kind="stable")
+    sorted_dates = dates.values[order]
+    sorted_units = units[order]
+
+    after = sorted_dates > anchor.to_datetime64()
+    before = sorted_dates < anchor.to_datetime64()
+
+    sorted_shares = np.full(len(units), np.nan)
+    sorted_shares[~after & ~before] = anchor_shares
+    sorted_shares[after] = anchor_shares + np.cumsum(sorted_units[after])
+    sorted_shares[before] = (
+        anchor_shares - np.cumsum(sorted_units[before][::-1])[::-1]
     )
-    tickers_with_data = [x for x in files if x.split("_")[0].lower() == ticker.lower()]
+
+    shares = np.empty_like(sorted_shares)
+    shares[order] = sorted_shares
+    return shares
+
+
+def get_fund_flow_data_by_ticker(
+    ticker: str, cj: http.cookiejar = None
+) -> pd.DataFrame:
     date_from = datetime(2023, 1, 1)
     date_to = datetime.today()
 
-    if len(tickers_with_data) == 0:
+    if not has_frame("fund_flows", ticker):
         try:
             token = fetch_new_bearer_token(cj)
             bearer = token["fundApiKey"]
@@ -215,7 +281,6 @@ def get_fund_flow_file_path_by_ticker(
                 bearer,
                 date_from,
                 date_to,
-                path,
             )
         except Exception as e:
             bearer = "0QE2aa6trhK3hOmkf5zXwz6Riy7UWdk4V6HYw3UdZcRZV3myoV9MOfwNLL6FKHrpTN7IF7g12GSZ6r44jAfjte0B3APAaQdWRWZtW2qhYJrAXXwkpYJDFdkCng97prr7N4JAXkCI1zB7EiXrFEY8CIQclMLgQk2XHBZJiqJSIEgtWckHK3UPLfm12X9rhME9ac7gvcF3fWDo8A66X6RHXr3g9jzKeC62th75S1t6juvWjQYDCz65i7UlRfTVWDVV"
@@ -224,10 +289,9 @@ def get_fund_flow_file_path_by_ticker(
                 bearer,
                 date_from,
                 date_to,
-                path,
             )
 
-    return f"{path}/{ticker}_fund_flow_data.xlsx"
+    return read_frame("fund_flows", ticker)
 
 
 if __name__ == "__main__":
@@ -260,7 +324,9 @@ if __name__ == "__main__":
     vix_tickers = ["VXX", "UVXY", "SVXY", "VIXY", "SVOL"]
     
     all_tickers = long_bond_tickers + hy_tickers + senior_loan_tickers + jpy_tickers + sec_prods_tickers + energy_tickers + sp500_tickers + credit_tickers + vix_tickers
-    data = multi_fetch_fund_flow_data(all_tickers, bearer, date_from, date_to, raw_path)
+    data = multi_fetch_fund_flow_data(
+        all_tickers, bearer, date_from, date_to, raw_path, make_xlsx=True
+    )
 
     print(data)
 
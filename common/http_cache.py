@@ -0,0 +1,348 @@
+import os
+import re
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+import requests
+import aiohttp
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Tuple
+
+from common.store import get_store_root
+from common.scheduler import FetchScheduler, BadStatus
+
+"""
+Persistent HTTP cache for reference endpoints (fund lists, profiles, screeners, holdings)
+
+- fresh (younger than its endpoint ttl): served from disk, no request at all
+- stale: conditional GET with If-None-Match / If-Modified-Since, a 304 just re-stamps the entry
+- request fails but we have a copy: serve the stale copy instead of nothing
+- bodies live next to a sqlite index, least recently used entries get evicted past max_bytes
+"""
+
+HOUR = 60 * 60
+DAY = 24 * HOUR
+
+# first match wins - (url pattern, ttl in seconds)
+DEFAULT_TTLS: List[Tuple[str, int]] = [
+    (r"investor\.vanguard\.com/investment-products/list/funddetail", DAY),
+    (r"/profile$", 30 * DAY),
+    (r"outstanding-shares", 12 * HOUR),
+    (r"portfolio-holding", 6 * HOUR),
+    (r"analytics-and-volatility|risk-data", DAY),
+    (r"pricehistorysearch", HOUR),
+    (r"product-screener", DAY),
+    (r"ishares\.com/.*fileType=xls", HOUR),
+]
+
+
+@dataclass
+class CachedResponse:
+    status: int
+    content: bytes
+    headers: Dict[str, str] = field(default_factory=dict)
+    from_cache: bool = False
+
+    # same surface as requests.Response for the bits we use
+    @property
+    def status_code(self) -> int:
+        return self.status
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self) -> Any:
+        return json.loads(self.content)
+
+
+class HttpCache:
+    def __init__(
+        self,
+        dir: str = None,
+        ttls: List[Tuple[str, int]] = None,
+        default_ttl: int = 0,
+        max_bytes: int = 512 * 1024 * 1024,
+    ):
+        self.dir = dir if dir else os.path.join(get_store_root(), "_http_cache")
+        self.ttls = [(re.compile(pattern), ttl) for pattern, ttl in (ttls or DEFAULT_TTLS)]
+        self.default_ttl = default_ttl
+        self.max_bytes = max_bytes
+
+        os.makedirs(self.dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            os.path.join(self.dir, "index.sqlite"), check_same_thread=False
+        )
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                url TEXT,
+                status INTEGER,
+                headers TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL,
+                last_access REAL,
+                size INTEGER
+            )
+            """
+        )
+        self._db.commit()
+
+    def ttl_for(self, url: str) -> int:
+        for pattern, ttl in self.ttls:
+            if pattern.search(url):
+                return ttl
+        return self.default_ttl
+
+    @staticmethod
+    def cache_key(method: str, url: str, data: Dict = None) -> str:
+        body = json.dumps(data, sort_keys=True, default=str) if data else ""
+        return hashlib.sha1(f"{method.upper()} {url} {body}".encode()).hexdigest()
+
+    def _body_path(self, key: str) -> str:
+        return os.path.join(self.dir, f"{key}.bin")
+
+    def lookup(self, key: str) -> Dict | None:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT status, headers, etag, last_modified, fetched_at FROM entries WHERE key = ?",
+                (key,),
+            ).fetchone()
+        if not row or not os.path.exists(self._body_path(key)):
+            return None
+
+        status, headers, etag, last_modified, fetched_at = row
+        return {
+            "status": status,
+            "headers": json.loads(headers),
+            "etag": etag,
+            "last_modified": last_modified,
+            "fetched_at": fetched_at,
+        }
+
+    def is_fresh(self, entry: Dict, url: str) -> bool:
+        return time.time() - entry["fetched_at"] < self.ttl_for(url)
+
+    def conditional_headers(self, entry: Dict | None) -> Dict[str, str]:
+        headers = {}
+        if entry and entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def read(self, key: str, entry: Dict) -> CachedResponse | None:
+        # under the lock so _evict can't delete the body mid read - None if it's already gone
+        with self._lock:
+            try:
+                with open(self._body_path(key), "rb") as f:
+                    content = f.read()
+            except FileNotFoundError:
+                return None
+            self._db.execute(
+                "UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key)
+            )
+            self._db.commit()
+        return CachedResponse(entry["status"], content, entry["headers"], True)
+
+    def touch(self, key: str):
+        # 304 - body is still good, restart its ttl
+        with self._lock:
+            now = time.time()
+            self._db.execute(
+                "UPDATE entries SET fetched_at = ?, last_access = ? WHERE key = ?",
+                (now, now, key),
+            )
+            self._db.commit()
+
+    def put(
+        self, key: str, url: str, status: int, headers: Dict[str, str], content: bytes
+    ) -> CachedResponse:
+        kept_headers = {
+            name: value
+            for name, value in headers.items()
+            if name.lower() in ("content-type", "etag", "last-modified")
+        }
+        temp_path = f"{self._body_path(key)}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(content)
+        os.replace(temp_path, self._body_path(key))
+
+        lowered = {name.lower(): value for name, value in kept_headers.items()}
+        with self._lock:
+            now = time.time()
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    url,
+                    status,
+                    json.dumps(kept_headers),
+                    lowered.get("etag"),
+                    lowered.get("last-modified"),
+                    now,
+                    now,
+                    len(content),
+                ),
+            )
+            self._db.commit()
+            self._evict()
+
+        return CachedResponse(status, content, kept_headers, False)
+
+    def _evict(self):
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        for key, size in self._db.execute(
+            "SELECT key, size FROM entries ORDER BY last_access ASC"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            if os.path.exists(self._body_path(key)):
+                os.remove(self._body_path(key))
+            total -= size
+        self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            for (key,) in self._db.execute("SELECT key FROM entries").fetchall():
+                if os.path.exists(self._body_path(key)):
+                    os.remove(self._body_path(key))
+            self._db.execute("DELETE FROM entries")
+            self._db.commit()
+
+
+_caches: Dict[str, HttpCache] = {}
+
+
+def get_http_cache(dir: str = None) -> HttpCache:
+    # one cache per directory - the store root follows cwd
+    dir = dir if dir else os.path.join(get_store_root(), "_http_cache")
+    if dir not in _caches:
+        _caches[dir] = HttpCache(dir)
+    return _caches[dir]
+
+
+def cached_request(
+    method: str,
+    url: str,
+    headers: Dict[str, str] = None,
+    data: Dict = None,
+    cache: HttpCache = None,
+    **kwargs,
+) -> CachedResponse:
+    cache = cache if cache else get_http_cache()
+    key = cache.cache_key(method, url, data)
+    entry = cache.lookup(key)
+    if entry and cache.is_fresh(entry, url):
+        cached = cache.read(key, entry)
+        if cached:
+            return cached
+        # evicted between lookup and read
+        entry = None
+
+    try:
+        res = requests.request(
+            method,
+            url,
+            headers={**(headers or {}), **cache.conditional_headers(entry)},
+            data=data,
+            **kwargs,
+        )
+        if res.status_code == 304 and entry:
+            cache.touch(key)
+            cached = cache.read(key, entry)
+            if cached:
+                return cached
+            res = requests.request(method, url, headers=headers, data=data, **kwargs)
+        if res.status_code != 200:
+            stale = cache.read(key, entry) if entry else None
+            if stale:
+                print(f"Bad Status: {res.status_code} - serving stale cache for {url}")
+                return stale
+            return CachedResponse(res.status_code, res.content, dict(res.headers))
+        return cache.put(key, url, res.status_code, dict(res.headers), res.content)
+    except Exception as e:
+        stale = cache.read(key, entry) if entry else None
+        if stale:
+            print(f"{e} - serving stale cache for {url}")
+            return stale
+        raise
+
+
+def cached_get(url: str, headers: Dict[str, str] = None, **kwargs) -> CachedResponse:
+    return cached_request("GET", url, headers, **kwargs)
+
+
+def cached_post(
+    url: str, data: Dict = None, headers: Dict[str, str] = None, **kwargs
+) -> CachedResponse:
+    return cached_request("POST", url, headers, data, **kwargs)
+
+
+async def cached_fetch(
+    session: aiohttp.ClientSession,
+    scheduler: FetchScheduler,
+    url: str,
+    headers: Dict[str, str] = None,
+    cache: HttpCache = None,
+    validate: Callable[[CachedResponse], bool] = None,
+) -> CachedResponse:
+    """
+    validate: responses it rejects (ex. a 200 error/login page) are never cached or served from cache -
+    a rejected fetch raises (or falls back to a stale copy that passes)
+    """
+    cache = cache if cache else get_http_cache()
+    key = cache.cache_key("GET", url)
+
+    def valid(res: CachedResponse | None) -> bool:
+        return res is not None and (validate is None or validate(res))
+
+    entry = cache.lookup(key)
+    if entry and cache.is_fresh(entry, url):
+        cached = cache.read(key, entry)
+        if valid(cached):
+            return cached
+        # evicted between lookup and read, or a body validate rejects
+        entry = None
+
+    async def read(response: aiohttp.ClientResponse) -> Tuple[int, Dict, bytes]:
+        return response.status, dict(response.headers), await response.read()
+
+    async def request(conditional: Dict | None) -> Tuple[int, Dict, bytes]:
+        return await scheduler.request(
+            session,
+            "GET",
+            url,
+            read,
+            ok_statuses=(200, 304),
+            headers={**(headers or {}), **cache.conditional_headers(conditional)},
+        )
+
+    try:
+        status, res_headers, content = await request(entry)
+        if status == 304 and entry:
+            cached = cache.read(key, entry)
+            if valid(cached):
+                cache.touch(key)
+                return cached
+            status, res_headers, content = await request(None)
+        if status != 200:
+            raise BadStatus(status, url)
+        if not valid(CachedResponse(status, content, res_headers)):
+            raise Exception(f"Invalid response for {url}")
+        return cache.put(key, url, status, res_headers, content)
+    except Exception as e:
+        stale = cache.read(key, entry) if entry else None
+        if valid(stale):
+            print(f"{e} - serving stale cache for {url}")
+            return stale
+        raise
@@ -0,0 +1,207 @@
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from scipy.special import ndtr
+from typing import Dict
+
+from common.curves import ZeroCurves
+from common.options import OPTION_SIDES, snapshot_key
+from common.store import has_frame, read_frame, write_frame, read_metadata, write_metadata
+
+"""
+Black-Scholes implied vols + greeks for a whole columnar chain (see common/options.py) at once
+
+rates are the continuously compounded treasury zero rate at each contract's expiry (common/curves.py),
+carry is a flat dividend yield. iv is a masked newton/bisection hybrid - every contract keeps a [lo, hi] bracket,
+newton steps that leave the bracket (or stall on tiny vega) fall back to the midpoint
+
+greek units: vega per 1 vol point (0.01), theta per calendar day, delta/gamma per 1 unit of spot
+results are cached in the store as option_analytics/{ticker}/{snapshot}.parquet, with the inputs they were
+computed from alongside
+
+    _meta.json: { inputs: { ticker: { snapshot: { spot, curve_date, dividend_yield } } } }
+"""
+
+IV_LOWER = 1e-4
+IV_UPPER = 5.0
+ANALYTICS_COLUMNS = ["mid", "iv", "delta", "gamma", "vega", "theta"]
+
+
+def _d1_d2(S, K, T, r, q, sigma):
+    vol_sqrt_t = sigma * np.sqrt(T)
+    d1 = (np.log(S / K) + (r - q + 0.5 * sigma**2) * T) / vol_sqrt_t
+    return d1, d1 - vol_sqrt_t
+
+
+def bs_price(S, K, T, r, q, sigma, is_call) -> np.ndarray:
+    with np.errstate(all="ignore"):
+        d1, d2 = _d1_d2(S, K, T, r, q, sigma)
+        spot = S * np.exp(-q * T)
+        strike = K * np.exp(-r * T)
+        call = spot * ndtr(d1) - strike * ndtr(d2)
+        put = strike * ndtr(-d2) - spot * ndtr(-d1)
+        return np.where(is_call, call, put)
+
+
+def bs_vega(S, K, T, r, q, sigma) -> np.ndarray:
+    # per 1.0 of vol
+    with np.errstate(all="ignore"):
+        d1, _ = _d1_d2(S, K, T, r, q, sigma)
+        return S * np.exp(-q * T) * np.exp(-0.5 * d1**2) / np.sqrt(2 * np.pi) * np.sqrt(T)
+
+
+def implied_vols(
+    price, S, K, T, r, q, is_call, tol=1e-8, max_iter=100
+) -> np.ndarray:
+    """
+    nan for contracts priced outside the no-arbitrage bounds or that don't converge
+    """
+    price, S, K, T, r, q, is_call = np.broadcast_arrays(
+        *[np.asarray(x, dtype=np.float64) for x in [price, S, K, T, r, q]],
+        np.asarray(is_call, dtype=bool),
+    )
+    with np.errstate(all="ignore"):
+        spot = S * np.exp(-q * T)
+        strike = K * np.exp(-r * T)
+        lower = np.where(is_call, np.maximum(spot - strike, 0), np.maximum(strike - spot, 0))
+        upper = np.where(is_call, spot, strike)
+
+        active = (
+            np.isfinite(price)
+            & (T > 0)
+            & (K > 0)
+            & (S > 0)
+            & (price > lower)
+            & (price < upper)
+        )
+        lo = np.full(price.shape, IV_LOWER)
+        hi = np.full(price.shape, IV_UPPER)
+        sigma = np.full(price.shape, 0.3)
+        converged = np.zeros(price.shape, dtype=bool)
+
+        for _ in range(max_iter):
+            idx = np.flatnonzero(active)
+            if idx.size == 0:
+                break
+
+            args = (S[idx], K[idx], T[idx], r[idx], q[idx])
+            curr = sigma[idx]
+            diff = bs_price(*args, curr, is_call[idx]) - price[idx]
+            # price is increasing in vol - shrink the bracket around the root
+            hi[idx] = np.where(diff > 0, curr, hi[idx])
+            lo[idx] = np.where(diff <= 0, curr, lo[idx])
+
+            step = diff / bs_vega(*args, curr)
+            newton = curr - step
+            use_newton = np.isfinite(newton) & (newton > lo[idx]) & (newton < hi[idx])
+            sigma[idx] = np.where(use_newton, newton, 0.5 * (lo[idx] + hi[idx]))
+
+            # converged in vol, not price - far otm prices are ~0 at any vol
+            newton_done = use_newton & (np.abs(step) < tol)
+            collapsed = hi[idx] - lo[idx] < tol
+            # a bracket that collapsed onto an edge means the root is outside [IV_LOWER, IV_UPPER]
+            inside = (hi[idx] < IV_UPPER) & (lo[idx] > IV_LOWER)
+            done = newton_done | collapsed
+            converged[idx[newton_done | (collapsed & inside)]] = True
+            active[idx[done]] = False
+
+    return np.where(converged, sigma, np.nan)
+
+
+def bs_greeks(S, K, T, r, q, sigma, is_call) -> Dict[str, np.ndarray]:
+    with np.errstate(all="ignore"):
+        d1, d2 = _d1_d2(S, K, T, r, q, sigma)
+        carry = np.exp(-q * T)
+        discount = np.exp(-r * T)
+        pdf = np.exp(-0.5 * d1**2) / np.sqrt(2 * np.pi)
+        sign = np.where(is_call, 1.0, -1.0)
+
+        theta = (
+            -S * carry * pdf * sigma / (2 * np.sqrt(T))
+            - sign * r * K * discount * ndtr(sign * d2)
+            + sign * q * S * carry * ndtr(sign * d1)
+        )
+        return {
+            "delta": sign * carry * ndtr(sign * d1),
+            "gamma": carry * pdf / (S * sigma * np.sqrt(T)),
+            "vega": S * carry * pdf * np.sqrt(T) / 100,
+            "theta": theta / 365.25,
+        }
+
+
+def option_mid_prices(chain: pd.DataFrame, side: str) -> np.ndarray:
+    # bid/ask mid when both sides are quoted, otherwise the last trade
+    bid = chain[f"bid_{side}"].to_numpy(np.float64)
+    ask = chain[f"ask_{side}"].to_numpy(np.float64)
+    last = chain[f"lastPrice_{side}"].to_numpy(np.float64)
+    return np.where((bid > 0) & (ask > 0) & (ask >= bid), 0.5 * (bid + ask), last)
+
+
+def chain_analytics(
+    chain: pd.DataFrame,
+    spot: float,
+    curve: ZeroCurves,
+    as_of: datetime = None,
+    curve_date=None,
+    dividend_yield=0.0,
+) -> pd.DataFrame:
+    """
+    <field>_call / <field>_put analytics columns for every contract, same (expiration, strike) index as the chain
+    """
+    as_of = pd.Timestamp(as_of or datetime.now())
+    expirations = chain.index.get_level_values("expiration")
+    T = ((expirations - as_of) / pd.Timedelta(days=365.25)).to_numpy(np.float64)
+    K = chain.index.get_level_values("strike").to_numpy(np.float64)
+
+    curve_date = curve.dates[-1] if curve_date is None else curve_date
+    r = np.full(len(T), np.nan)
+    live = T > 0
+    if live.any():
+        r[live] = curve.zero_rates(T[live], [curve_date], n=0)[0]
+
+    # calls and puts stacked so one solve covers the whole chain
+    n = len(chain)
+    mid = np.concatenate([option_mid_prices(chain, side) for side in OPTION_SIDES])
+    is_call = np.repeat([True, False], n)
+    args = (spot, np.tile(K, 2), np.tile(T, 2), np.tile(r, 2), dividend_yield)
+
+    iv = implied_vols(mid, *args, is_call)
+    results = {"mid": mid, "iv": iv, **bs_greeks(*args, iv, is_call)}
+
+    out = {}
+    for i, side in enumerate(OPTION_SIDES):
+        for col in ANALYTICS_COLUMNS:
+            out[f"{col}_{side}"] = results[col][i * n : (i + 1) * n]
+    return pd.DataFrame(out, index=chain.index)
+
+
+def cached_chain_analytics(
+    ticker: str,
+    chain: pd.DataFrame,
+    spot: float,
+    curve: ZeroCurves,
+    as_of: datetime,
+    curve_date=None,
+    dividend_yield=0.0,
+    refresh=False,
+) -> pd.DataFrame:
+    # one partition per (ticker, snapshot time) - reused only while spot, curve date and carry match
+    key = snapshot_key(as_of)
+    curve_date = curve.dates[-1] if curve_date is None else curve_date
+    inputs = {
+        "spot": float(spot),
+        "curve_date": pd.Timestamp(curve_date).strftime("%Y-%m-%d"),
+        "dividend_yield": float(dividend_yield),
+    }
+
+    metadata = read_metadata("option_analytics")
+    cached = metadata.get("inputs", {}).get(ticker, {}).get(key)
+    if not refresh and cached == inputs and has_frame("option_analytics", ticker, key):
+        df = read_frame("option_analytics", ticker, key)
+        return df.set_index(["expiration", "strike"])
+
+    df = chain_analytics(chain, spot, curve, as_of, curve_date, dividend_yield)
+    write_frame(df.reset_index(), "option_analytics", ticker, key)
+    metadata.setdefault("inputs", {}).setdefault(ticker, {})[key] = inputs
+    write_metadata("option_analytics", metadata)
+    return df
@@ -0,0 +1,148 @@
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from typing import Dict, List
+
+from common.options import OPTION_SIDES, snapshot_key
+from common.store import read_frame, write_frame, read_metadata, write_metadata
+
+"""
+Append-only option chain snapshots - option_chains/{ticker}/{snapshot}.parquet (zstd)
+
+the first snapshot of a day (or after max_deltas deltas) is written in full, every other snapshot only stores the
+contracts that were added, changed or removed since the previous snapshot (flagged in a change column), so intraday
+polling costs storage proportional to what moved. snapshots are rebuilt by replaying deltas onto the last full one
+
+    _meta.json: { snapshots: { ticker: [ { key, kind: full | delta, rows } ] } }
+"""
+
+SNAPSHOT_SOURCE = "option_chains"
+CHAIN_INDEX = ["expiration", "strike"]
+# quotes, open interest and iv - a contract only counts as changed if one of these moved
+CHAIN_DIFF_FIELDS = [
+    "bid",
+    "ask",
+    "lastPrice",
+    "volume",
+    "openInterest",
+    "impliedVolatility",
+]
+CHAIN_DIFF_COLUMNS = [f"{field}_{side}" for side in OPTION_SIDES for field in CHAIN_DIFF_FIELDS]
+
+
+def diff_chains(
+    old: pd.DataFrame, new: pd.DataFrame, columns: List[str] = CHAIN_DIFF_COLUMNS
+) -> pd.DataFrame:
+    """
+    contracts added/changed (rows from new) or removed (rows from old) between two chains
+    a change column says which - nan on both sides counts as unchanged
+    """
+    if old.empty or new.empty:
+        return pd.concat([new.assign(change="added"), old.assign(change="removed")])
+
+    columns = [col for col in columns if col in new.columns or col in old.columns]
+    common = new.index.intersection(old.index)
+
+    a = old.loc[common].reindex(columns=columns).to_numpy(np.float64)
+    b = new.loc[common].reindex(columns=columns).to_numpy(np.float64)
+    moved = ((a != b) & ~(np.isnan(a) & np.isnan(b))).any(axis=1)
+
+    added = new.loc[new.index.difference(old.index)].assign(change="added")
+    changed = new.loc[common[moved]].assign(change="changed")
+    removed = old.loc[old.index.difference(new.index)].assign(change="removed")
+    return pd.concat([added, changed, removed]).sort_index()
+
+
+def apply_chain_diff(chain: pd.DataFrame, diff: pd.DataFrame) -> pd.DataFrame:
+    kept = chain.drop(diff.index, errors="ignore")
+    upserts = diff[diff["change"] != "removed"].drop(columns="change")
+    if upserts.empty:
+        return kept.sort_index()
+    if kept.empty:
+        return upserts.sort_index()
+    return pd.concat([kept, upserts]).sort_index()
+
+
+def _read_partition(ticker: str, key: str, root: str = None) -> pd.DataFrame:
+    df = read_frame(SNAPSHOT_SOURCE, ticker, key, root)
+    return df.set_index(CHAIN_INDEX) if not df.empty else df
+
+
+def list_chain_snapshots(ticker: str, root: str = None) -> List[Dict]:
+    metadata = read_metadata(SNAPSHOT_SOURCE, root)
+    return metadata.get("snapshots", {}).get(ticker, [])
+
+
+def read_chain_snapshot(
+    ticker: str, as_of: datetime | str = None, root: str = None
+) -> pd.DataFrame:
+    """
+    chain as of the last snapshot at or before as_of (latest if None)
+    """
+    snapshots = list_chain_snapshots(ticker, root)
+    if as_of is not None:
+        key = as_of if isinstance(as_of, str) else snapshot_key(as_of)
+        snapshots = [x for x in snapshots if x["key"] <= key]
+    if not snapshots:
+        return pd.DataFrame()
+
+    start = max(i for i, x in enumerate(snapshots) if x["kind"] == "full")
+    chain = _read_partition(ticker, snapshots[start]["key"], root)
+    for snapshot in snapshots[start + 1 :]:
+        chain = apply_chain_diff(chain, _read_partition(ticker, snapshot["key"], root))
+    return chain
+
+
+def write_chain_snapshot(
+    ticker: str,
+    chain: pd.DataFrame,
+    as_of: datetime = None,
+    max_deltas=100,
+    root: str = None,
+) -> Dict:
+    as_of = as_of or datetime.now()
+    key = snapshot_key(as_of)
+
+    metadata = read_metadata(SNAPSHOT_SOURCE, root)
+    snapshots: List[Dict] = metadata.setdefault("snapshots", {}).setdefault(ticker, [])
+    if snapshots and key <= snapshots[-1]["key"]:
+        raise ValueError(f"{ticker} snapshot {key} is not after {snapshots[-1]['key']}")
+
+    deltas = 0
+    for snapshot in reversed(snapshots):
+        if snapshot["kind"] == "full":
+            break
+        deltas += 1
+
+    # new day or too many deltas to replay - start over from a full chain
+    full = (
+        not snapshots
+        or snapshots[-1]["key"][:10] != key[:10]
+        or deltas >= max_deltas
+    )
+    if full:
+        df = chain
+    else:
+        df = diff_chains(read_chain_snapshot(ticker, root=root), chain)
+
+    write_frame(df.reset_index(), SNAPSHOT_SOURCE, ticker, key, root, compression="zstd")
+
+    snapshot = {"key": key, "kind": "full" if full else "delta", "rows": len(df)}
+    snapshots.append(snapshot)
+    write_metadata(SNAPSHOT_SOURCE, metadata, root)
+    return snapshot
+
+
+def diff_chain_snapshots(
+    ticker: str,
+    start: datetime | str,
+    end: datetime | str = None,
+    columns: List[str] = CHAIN_DIFF_COLUMNS,
+    root: str = None,
+) -> pd.DataFrame:
+    # contracts whose quotes/oi/iv changed between two snapshots (end defaults to the latest)
+    return diff_chains(
+        read_chain_snapshot(ticker, start, root),
+        read_chain_snapshot(ticker, end, root),
+        columns,
+    )
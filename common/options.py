@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+"""
+Columnar option chains - yahoo straddle json parsed straight into preallocated arrays
+
+    type Straddle = {
+        strike: { raw, fmt }
+        call: OptionInfo | None
+        put: OptionInfo | None
+    }
+
+formatted=true wraps numbers as { raw, fmt }, formatted=false sends them bare - both are read.
+one pass over every expiry's straddles fills struct-of-arrays columns (one array per field per side),
+the chain is a single frame indexed by (expiration, strike) with <field>_call / <field>_put columns
+"""
+
+# yahoo field -> dtype, float fields default to nan
+OPTION_FIELDS: Dict[str, type] = {
+    "bid": np.float64,
+    "ask": np.float64,
+    "lastPrice": np.float64,
+    "impliedVolatility": np.float64,
+    "openInterest": np.float64,
+    "volume": np.float64,
+    "change": np.float64,
+    "percentChange": np.float64,
+    "lastTradeDate": np.float64,
+    "inTheMoney": np.bool_,
+    "contractSymbol": object,
+}
+OPTION_SIDES = ["call", "put"]
+
+
+def snapshot_key(as_of: datetime) -> str:
+    # store partition name for an intraday snapshot - sorts in time order, no ":" so it's a valid windows path
+    return pd.Timestamp(as_of).strftime("%Y-%m-%dT%H%M%S")
+
+
+def _raw(value):
+    return value.get("raw") if isinstance(value, dict) else value
+
+
+def _empty_columns(n: int) -> Dict[str, np.ndarray]:
+    columns = {"strike": np.full(n, np.nan)}
+    for side in OPTION_SIDES:
+        for field, dtype in OPTION_FIELDS.items():
+            if dtype is np.float64:
+                columns[f"{field}_{side}"] = np.full(n, np.nan)
+            elif dtype is np.bool_:
+                columns[f"{field}_{side}"] = np.zeros(n, dtype=bool)
+            else:
+                columns[f"{field}_{side}"] = np.full(n, None, dtype=object)
+    return columns
+
+
+def parse_option_chain(
+    expiries: List[Tuple[int, List[Dict]]]
+) -> pd.DataFrame:
+    """
+    expiries: (expiration epoch, straddles) per expiry - returns the whole chain indexed by (expiration, strike)
+    """
+    n = sum(len(straddles) for _, straddles in expiries)
+    columns = _empty_columns(n)
+    expirations = np.empty(n, dtype=np.int64)
+
+    # resolve every output array once, the hot loop only does item assignment
+    strike_col = columns["strike"]
+    targets = [
+        (side, [(field, columns[f"{field}_{side}"]) for field in OPTION_FIELDS])
+        for side in OPTION_SIDES
+    ]
+
+    i = 0
+    for expiration, straddles in expiries:
+        start = i
+        for straddle in straddles:
+            strike = _raw(straddle.get("strike"))
+            for side, side_cols in targets:
+                option = straddle.get(side)
+                if not option:
+                    continue
+                if strike is None:
+                    strike = _raw(option.get("strike"))
+                for field, col in side_cols:
+                    value = option.get(field)
+                    if value is not None:
+                        col[i] = _raw(value)
+            if strike is not None:
+                strike_col[i] = strike
+            i += 1
+        expirations[start:i] = expiration
+
+    index = pd.MultiIndex.from_arrays(
+        [pd.to_datetime(expirations, unit="s"), strike_col],
+        names=["expiration", "strike"],
+    )
+    del columns["strike"]
+    return pd.DataFrame(columns, index=index).sort_index()
+
+
+def option_chain_expiry_frames(chain: pd.DataFrame) -> Dict[pd.Timestamp, pd.DataFrame]:
+    # one frame per expiry, strike as a column
+    return {
+        expiration: df.droplevel("expiration").reset_index()
+        for expiration, df in chain.groupby(level="expiration", sort=True)
+    }
@@ -0,0 +1,93 @@
+import asyncio
+import inspect
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List
+
+"""
+DAG refresh orchestrator - every stage runs on one event loop as soon as its deps land
+
+- async stages share whatever session/scheduler the caller closed over
+- sync stages (excel builders, blocking requests) run in a worker thread so they don't stall the loop
+- a failed stage is printed and its dependents are skipped, everything else keeps going
+"""
+
+
+@dataclass
+class Stage:
+    name: str
+    # fn(inputs) where inputs maps each dep name to its result
+    run: Callable[[Dict[str, Any]], Any]
+    deps: List[str] = field(default_factory=list)
+
+
+def check_stages(stages: List[Stage]):
+    names = [stage.name for stage in stages]
+    if len(names) != len(set(names)):
+        raise ValueError(f"Duplicate stage names: {names}")
+
+    deps = {stage.name: stage.deps for stage in stages}
+    for name, curr_deps in deps.items():
+        missing = [x for x in curr_deps if x not in deps]
+        if missing:
+            raise ValueError(f"{name} depends on unknown stages: {missing}")
+
+    # kahn's algo - anything left over sits on a cycle
+    in_degree = {name: len(curr_deps) for name, curr_deps in deps.items()}
+    ready = [name for name, degree in in_degree.items() if degree == 0]
+    visited = 0
+    while ready:
+        curr = ready.pop()
+        visited += 1
+        for name, curr_deps in deps.items():
+            if curr in curr_deps:
+                in_degree[name] -= 1
+                if in_degree[name] == 0:
+                    ready.append(name)
+
+    if visited != len(names):
+        raise ValueError(
+            f"Stage cycle: {[name for name, degree in in_degree.items() if degree > 0]}"
+        )
+
+
+async def run_pipeline(stages: List[Stage], verbose=True) -> Dict[str, Any]:
+    check_stages(stages)
+
+    results: Dict[str, Any] = {}
+    failed: set = set()
+    tasks: Dict[str, asyncio.Task] = {}
+    t0 = time.time()
+
+    async def run_stage(stage: Stage):
+        for dep in stage.deps:
+            await tasks[dep]
+
+        failed_deps = [x for x in stage.deps if x in failed]
+        if failed_deps:
+            print(f"{stage.name} skipped - failed deps: {failed_deps}")
+            failed.add(stage.name)
+            return
+
+        inputs = {dep: results[dep] for dep in stage.deps}
+        start = time.time()
+        try:
+            if inspect.iscoroutinefunction(stage.run):
+                results[stage.name] = await stage.run(inputs)
+            else:
+                results[stage.name] = await asyncio.to_thread(stage.run, inputs)
+        except Exception as e:
+            print(f"{stage.name} failed: {e}")
+            failed.add(stage.name)
+            return
+
+        if verbose:
+            print(
+                f"{stage.name} done in {time.time() - start:.2f} sec ({time.time() - t0:.2f} sec in)"
+            )
+
+    for stage in stages:
+        tasks[stage.name] = asyncio.create_task(run_stage(stage))
+    await asyncio.gather(*tasks.values())
+
+    return results
@@ -0,0 +1,225 @@
+import numpy as np
+import pandas as pd
+from datetime import date
+from scipy.sparse import csr_matrix
+from typing import Dict, List
+
+from common.cashflows import CashFlowMatrix, holdings_cash_flow_matrix
+from common.curves import ZeroCurves
+
+"""
+Key rate durations and rate scenarios for a whole holdings table
+
+a scenario is a zero rate shift (bps, continuously compounded) at each key tenor, spread onto every payment date
+with triangular key rate weights - so shift(t) = W(t) @ shocks and the weights sum to 1 (krds add up to duration).
+flows are discounted once off the curve (+ per holding spread) into a csr matrix D, after that every scenario is
+    pv = D @ exp(-shift * t)
+i.e. thousands of scenarios are one sparse x dense product (chunked over scenarios to bound memory)
+"""
+
+KEY_RATE_TENORS = np.array([0.25, 0.5, 1, 2, 3, 5, 7, 10, 20, 30], dtype=np.float64)
+
+
+def key_rate_weights(
+    times: np.ndarray, key_tenors: np.ndarray = KEY_RATE_TENORS
+) -> np.ndarray:
+    # payment times x key tenors, linear between neighbouring keys and flat past the ends
+    times = np.clip(np.asarray(times, dtype=np.float64), key_tenors[0], key_tenors[-1])
+    idx = np.clip(
+        np.searchsorted(key_tenors, times, side="right") - 1, 0, len(key_tenors) - 2
+    )
+    w = (times - key_tenors[idx]) / (key_tenors[idx + 1] - key_tenors[idx])
+
+    weights = np.zeros((len(times), len(key_tenors)))
+    rows = np.arange(len(times))
+    weights[rows, idx] = 1 - w
+    weights[rows, idx + 1] += w
+    return weights
+
+
+def parallel_shocks(bps: List[float]) -> Dict[str, np.ndarray]:
+    return {f"parallel {x:+g}bp": np.full(len(KEY_RATE_TENORS), float(x)) for x in bps}
+
+
+def twist_shocks(
+    bps: List[float], short_tenor=2, long_tenor=30
+) -> Dict[str, np.ndarray]:
+    """
+    short end moves -bps/2, long end +bps/2, linear in tenor in between (flat outside)
+    positive bps steepen, negative bps flatten
+    """
+    pos = np.clip(
+        (KEY_RATE_TENORS - short_tenor) / (long_tenor - short_tenor), 0, 1
+    )
+    shocks = {}
+    for x in bps:
+        kind = "steepener" if x > 0 else "flattener"
+        shocks[f"{kind} {short_tenor}s{long_tenor}s {abs(x):g}bp"] = x * (pos - 0.5)
+    return shocks
+
+
+def standard_scenarios(
+    parallel_bps: List[float] = [-100, -50, -25, 25, 50, 100],
+    twist_bps: List[float] = [-50, -25, 25, 50],
+) -> pd.DataFrame:
+    # scenario name x key tenor shocks in bps
+    shocks = {**parallel_shocks(parallel_bps), **twist_shocks(twist_bps)}
+    return pd.DataFrame.from_dict(
+        shocks, orient="index", columns=[f"{x:g}" for x in KEY_RATE_TENORS]
+    )
+
+
+class ScenarioEngine:
+    def __init__(
+        self,
+        cash_flows: CashFlowMatrix,
+        curve: ZeroCurves,
+        curve_date: date | str = None,
+        spreads: np.ndarray = None,
+        key_tenors: np.ndarray = KEY_RATE_TENORS,
+    ):
+        self.cash_flows = cash_flows
+        self.key_tenors = np.asarray(key_tenors, dtype=np.float64)
+        self.curve_date = curve.dates[-1] if curve_date is None else curve_date
+        self.base_discount = curve.discount(cash_flows.times, [self.curve_date])[0]
+        self.weights = key_rate_weights(cash_flows.times, self.key_tenors)
+        self.set_spreads(
+            np.zeros(cash_flows.holdings) if spreads is None else spreads
+        )
+
+    def set_spreads(self, spreads: np.ndarray):
+        # continuously compounded spread per holding over the curve
+        flows = self.cash_flows.flows
+        self.spreads = np.nan_to_num(np.asarray(spreads, dtype=np.float64))
+        t = self.cash_flows.times[flows.indices]
+        data = (
+            flows.data
+            * self.base_discount[flows.indices]
+            * np.exp(-self.spreads[self.cash_flows._row_ids()] * t)
+        )
+        self.discounted = csr_matrix((data, flows.indices, flows.indptr), flows.shape)
+
+    def calibrate_spreads(self, dirty_values, tol=1e-10, max_iter=50) -> np.ndarray:
+        """
+        spread per holding that reprices its dirty value - masked newton, unsolved holdings keep a 0 spread
+        """
+        flows = self.cash_flows.flows
+        rows = self.cash_flows._row_ids()
+        t = self.cash_flows.times[flows.indices]
+        base = flows.data * self.base_discount[flows.indices]
+        dirty_values = np.asarray(dirty_values, dtype=np.float64)
+
+        with np.errstate(all="ignore"):
+            s = np.zeros(self.cash_flows.holdings)
+            active = (
+                np.isfinite(dirty_values)
+                & (dirty_values > 0)
+                & (np.diff(flows.indptr) > 0)
+            )
+            converged = np.zeros(s.shape, dtype=bool)
+            for _ in range(max_iter):
+                if not active.any():
+                    break
+
+                values = base * np.exp(-s[rows] * t)
+                price = np.bincount(rows, weights=values, minlength=len(s))
+                slope = -np.bincount(rows, weights=values * t, minlength=len(s))
+                step = np.where(active, (price - dirty_values) / slope, 0.0)
+                s = np.where(active, s - step, s)
+
+                done = np.abs(step) < tol
+                failed = ~np.isfinite(s)
+                converged |= active & done & ~failed
+                active &= ~(done | failed)
+
+        s = np.where(converged, s, np.nan)
+        self.set_spreads(s)
+        return s
+
+    def shifts(self, shocks: np.ndarray) -> np.ndarray:
+        # scenarios x key tenors (bps) -> payment dates x scenarios (decimal)
+        return self.weights @ (np.atleast_2d(shocks).T / 1e4)
+
+    def reprice(self, shocks: np.ndarray, chunk_size=1024) -> np.ndarray:
+        """
+        holdings x scenarios dirty pv (per unit of the flows) for scenarios x key tenors shocks in bps
+        """
+        shocks = np.atleast_2d(np.asarray(shocks, dtype=np.float64))
+        t = self.cash_flows.times[:, np.newaxis]
+        pv = np.empty((self.cash_flows.holdings, shocks.shape[0]))
+        for start in range(0, shocks.shape[0], chunk_size):
+            chunk = slice(start, start + chunk_size)
+            pv[:, chunk] = self.discounted @ np.exp(-self.shifts(shocks[chunk]) * t)
+        return pv
+
+    def base_values(self) -> np.ndarray:
+        return np.asarray(self.discounted.sum(axis=1)).ravel()
+
+    def key_rate_durations(self, bump_bps=1.0) -> pd.DataFrame:
+        """
+        holdings x key tenors, central difference - all 2 x keys bumped curves repriced in one go
+        """
+        bumps = np.eye(len(self.key_tenors)) * bump_bps
+        pv = self.reprice(np.vstack([bumps, -bumps]))
+        up, down = np.split(pv, 2, axis=1)
+        with np.errstate(all="ignore"):
+            krd = (down - up) / (2 * bump_bps / 1e4 * self.base_values()[:, np.newaxis])
+        return pd.DataFrame(krd, columns=[f"{x:g}" for x in self.key_tenors])
+
+    def fund_key_rate_durations(self, quantities: np.ndarray, bump_bps=1.0) -> pd.Series:
+        # value weighted across holdings = krds of the aggregated fund flows
+        quantities = np.nan_to_num(np.asarray(quantities, dtype=np.float64))
+        values = quantities * self.base_values()
+        krd = self.key_rate_durations(bump_bps).fillna(0)
+        return pd.Series(values @ krd.to_numpy() / values.sum(), index=krd.columns)
+
+    def scenario_pnl(
+        self, scenarios: pd.DataFrame, quantities: np.ndarray, chunk_size=1024
+    ) -> pd.DataFrame:
+        """
+        scenarios: name x key tenor shocks in bps (see standard_scenarios)
+        returns base value, shocked value, pnl and pnl % per scenario for the whole fund
+        """
+        quantities = np.nan_to_num(np.asarray(quantities, dtype=np.float64))
+        base = quantities @ self.base_values()
+        shocked = quantities @ self.reprice(scenarios.to_numpy(np.float64), chunk_size)
+        return pd.DataFrame(
+            {
+                "Base Value": base,
+                "Scenario Value": shocked,
+                "PnL": shocked - base,
+                "PnL %": (shocked - base) / base,
+            },
+            index=scenarios.index,
+        )
+
+    def holdings_pnl(self, scenarios: pd.DataFrame, quantities: np.ndarray) -> pd.DataFrame:
+        # holdings x scenarios pnl
+        quantities = np.nan_to_num(np.asarray(quantities, dtype=np.float64))
+        pv = self.reprice(scenarios.to_numpy(np.float64))
+        pnl = (pv - self.base_values()[:, np.newaxis]) * quantities[:, np.newaxis]
+        return pd.DataFrame(pnl, columns=scenarios.index)
+
+
+def holdings_scenario_engine(
+    holdings_df: pd.DataFrame,
+    curve: ZeroCurves,
+    curve_date: date | str = None,
+    settle: date | str = None,
+    maturity_format="%b %d, %Y",
+) -> ScenarioEngine:
+    """
+    ishares holdings sheet -> engine calibrated so every holding reprices its market value (already dirty),
+    quantities to pass along are the Par Value column
+    """
+    cash_flows = holdings_cash_flow_matrix(
+        holdings_df, settle, maturity_format=maturity_format
+    )
+    engine = ScenarioEngine(cash_flows, curve, curve_date)
+    par_value = pd.to_numeric(holdings_df["Par Value"], errors="coerce").to_numpy(float)
+    market_value = pd.to_numeric(holdings_df["Market Value"], errors="coerce").to_numpy(
+        float
+    )
+    with np.errstate(all="ignore"):
+        engine.calibrate_spreads(market_value / par_value)
+    return engine
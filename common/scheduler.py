@@ -0,0 +1,167 @@
+import asyncio
+import aiohttp
+import random
+import time
+from dataclasses import dataclass
+from urllib.parse import urlparse
+from typing import Callable, Dict, Awaitable, Any, Tuple
+
+"""
+Bounded fetch scheduler shared by every multi-fetcher
+
+- per host semaphore caps in-flight requests
+- per host token bucket caps request rate (burst up to capacity)
+- 429/5xx/connection errors/timeouts retry with full jitter exponential backoff (Retry-After wins if longer)
+- anything else non 200 raises BadStatus right away
+"""
+
+
+class BadStatus(Exception):
+    def __init__(self, status: int, url: str = None):
+        super().__init__(f"Bad Status: {status}")
+        self.status = status
+        self.url = url
+
+
+class RetryableStatus(BadStatus):
+    def __init__(self, status: int, url: str = None, retry_after: float = None):
+        super().__init__(status, url)
+        self.retry_after = retry_after
+
+
+@dataclass
+class HostLimits:
+    max_concurrency: int = 8
+    rate: float = 8.0
+    burst: int = 8
+
+
+DEFAULT_HOST_LIMITS: Dict[str, HostLimits] = {
+    # throttles hard - 70 tickers at once comes back as empty payloads
+    "apiprod.etf.com": HostLimits(max_concurrency=4, rate=4.0, burst=4),
+    "www.etf.com": HostLimits(max_concurrency=2, rate=2.0, burst=2),
+    "query1.finance.yahoo.com": HostLimits(max_concurrency=8, rate=10.0, burst=10),
+    "query2.finance.yahoo.com": HostLimits(max_concurrency=8, rate=10.0, burst=10),
+    "investor.vanguard.com": HostLimits(max_concurrency=6, rate=6.0, burst=6),
+    "advisors.vanguard.com": HostLimits(max_concurrency=6, rate=6.0, burst=6),
+    "personal.vanguard.com": HostLimits(max_concurrency=6, rate=6.0, burst=6),
+    "www.ishares.com": HostLimits(max_concurrency=4, rate=4.0, burst=4),
+    "home.treasury.gov": HostLimits(max_concurrency=4, rate=4.0, burst=4),
+}
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class FetchScheduler:
+    def __init__(
+        self,
+        host_limits: Dict[str, HostLimits] = None,
+        default_limits: HostLimits = HostLimits(),
+        retries: int = 4,
+        backoff: float = 0.5,
+        max_backoff: float = 20.0,
+        timeout: float = 30.0,
+    ):
+        self.host_limits = {**DEFAULT_HOST_LIMITS, **(host_limits or {})}
+        self.default_limits = default_limits
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._buckets: Dict[str, TokenBucket] = {}
+
+    def _host(self, url: str):
+        host = urlparse(url).hostname or ""
+        if host not in self._semaphores:
+            limits = self.host_limits.get(host, self.default_limits)
+            self._semaphores[host] = asyncio.Semaphore(limits.max_concurrency)
+            self._buckets[host] = TokenBucket(limits.rate, limits.burst)
+        return self._semaphores[host], self._buckets[host]
+
+    # limits stay keyed on the real host - subclasses can point the request elsewhere (ex. a replay server)
+    def resolve_url(self, url: str) -> str:
+        return url
+
+    def _delay(self, attempt: int, retry_after: float = None) -> float:
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2**attempt))
+        return max(delay, retry_after) if retry_after else delay
+
+    async def request(
+        self,
+        session: aiohttp.ClientSession,
+        method: str,
+        url: str,
+        read: Callable[[aiohttp.ClientResponse], Awaitable[Any]],
+        ok_statuses: Tuple[int, ...] = (200, 201),
+        **kwargs,
+    ) -> Any:
+        semaphore, bucket = self._host(url)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+
+        for attempt in range(self.retries + 1):
+            retry_after = None
+            try:
+                async with semaphore:
+                    await bucket.acquire()
+                    async with session.request(
+                        method, self.resolve_url(url), timeout=timeout, **kwargs
+                    ) as response:
+                        if response.status == 429 or response.status >= 500:
+                            header = response.headers.get("Retry-After", "")
+                            raise RetryableStatus(
+                                response.status,
+                                url,
+                                float(header) if header.isdigit() else None,
+                            )
+                        if response.status not in ok_statuses:
+                            raise BadStatus(response.status, url)
+                        return await read(response)
+
+            except RetryableStatus as e:
+                if attempt == self.retries:
+                    raise
+                retry_after = e.retry_after
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if attempt == self.retries:
+                    raise
+
+            # back off outside the semaphore so other requests keep flowing
+            await asyncio.sleep(self._delay(attempt, retry_after))
+
+    async def get_json(self, session: aiohttp.ClientSession, url: str, **kwargs):
+        return await self.request(
+            session, "GET", url, lambda response: response.json(content_type=None), **kwargs
+        )
+
+    async def get_text(self, session: aiohttp.ClientSession, url: str, **kwargs) -> str:
+        return await self.request(
+            session, "GET", url, lambda response: response.text(), **kwargs
+        )
+
+    async def get_bytes(
+        self, session: aiohttp.ClientSession, url: str, **kwargs
+    ) -> bytes:
+        return await self.request(
+            session, "GET", url, lambda response: response.read(), **kwargs
+        )
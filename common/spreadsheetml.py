@@ -0,0 +1,126 @@
+import io
+import codecs
+import pandas as pd
+import lxml.etree as ET_lxml
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Tuple
+
+"""
+Streaming reader for SpreadsheetML 2003 (what iShares serves as .xls)
+
+iterparse walks the file once, rows are typed as they close and then cleared from the tree
+so memory stays at one row + the output frames - no DOM, no openpyxl Workbook, no xlsx round trip
+"""
+
+SS_NS = "urn:schemas-microsoft-com:office:spreadsheet"
+WORKSHEET_TAG = f"{{{SS_NS}}}Worksheet"
+ROW_TAG = f"{{{SS_NS}}}Row"
+CELL_TAG = f"{{{SS_NS}}}Cell"
+DATA_TAG = f"{{{SS_NS}}}Data"
+NAME_ATTR = f"{{{SS_NS}}}Name"
+TYPE_ATTR = f"{{{SS_NS}}}Type"
+
+
+def typed_cell_value(data: ET_lxml._Element | None) -> Any:
+    if data is None:
+        return None
+
+    # rich text cells nest html:Font runs under Data
+    text = data.text if len(data) == 0 else "".join(data.itertext())
+    if not text:
+        return None
+
+    data_type = data.get(TYPE_ATTR)
+    try:
+        if data_type == "Number":
+            return float(text)
+        if data_type == "DateTime":
+            return datetime.fromisoformat(text)
+        if data_type == "Boolean":
+            return text.strip() == "1"
+    except ValueError:
+        pass
+
+    return text
+
+
+def _as_stream(source: bytes | str | io.IOBase) -> io.IOBase:
+    if isinstance(source, bytes):
+        # https://en.wikipedia.org/wiki/Byte_order_mark
+        return io.BytesIO(source.replace(codecs.BOM_UTF8, b""))
+    return source
+
+
+def iter_spreadsheetml_rows(
+    source: bytes | str | io.IOBase, sheets: List[str] = None, typed=True
+) -> Iterator[Tuple[str, List[Any]]]:
+    curr_sheet = None
+    context = ET_lxml.iterparse(
+        _as_stream(source),
+        events=("start", "end"),
+        tag=(WORKSHEET_TAG, ROW_TAG),
+        recover=True,
+        huge_tree=True,
+    )
+
+    for event, el in context:
+        if el.tag == WORKSHEET_TAG:
+            if event == "start":
+                curr_sheet = el.get(NAME_ATTR)
+            else:
+                el.clear()
+            continue
+
+        if event != "end":
+            continue
+
+        if sheets is None or curr_sheet in sheets:
+            row = []
+            for cell in el.iterchildren(CELL_TAG):
+                data = cell.find(DATA_TAG)
+                if typed:
+                    row.append(typed_cell_value(data))
+                else:
+                    row.append("".join(data.itertext()) if data is not None else "")
+            yield curr_sheet, row
+
+        # drop the row and anything before it so the tree never grows
+        el.clear()
+        while el.getprevious() is not None:
+            del el.getparent()[0]
+
+
+def read_spreadsheetml(
+    source: bytes | str | io.IOBase,
+    sheets: List[str] = None,
+    header: int | Dict[str, int] | None = 0,
+) -> Dict[str, pd.DataFrame]:
+    rows: Dict[str, List[List[Any]]] = {}
+    for sheet, row in iter_spreadsheetml_rows(source, sheets):
+        rows.setdefault(sheet, []).append(row)
+
+    # requested sheets with no rows still come back, just empty
+    dfs: Dict[str, pd.DataFrame] = {sheet: pd.DataFrame() for sheet in sheets or []}
+    for sheet, curr_rows in rows.items():
+        curr_header = header.get(sheet, 0) if isinstance(header, dict) else header
+        if curr_header is None or curr_header >= len(curr_rows):
+            dfs[sheet] = pd.DataFrame(curr_rows)
+            continue
+
+        cols = curr_rows[curr_header]
+        body = curr_rows[curr_header + 1 :]
+        width = max([len(cols)] + [len(x) for x in body])
+        cols = cols + [None] * (width - len(cols))
+        # blank/duplicate header cells get positional names like read_excel's Unnamed: i
+        seen = set()
+        names = []
+        for i, col in enumerate(cols):
+            name = str(col) if col is not None else f"Unnamed: {i}"
+            if name in seen:
+                name = f"{name}.{i}"
+            seen.add(name)
+            names.append(name)
+
+        dfs[sheet] = pd.DataFrame(body, columns=names)
+
+    return dfs
@@ -0,0 +1,185 @@
+import os
+import json
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from datetime import date, datetime
+from typing import Dict, List
+
+"""
+Local columnar data store - every fetcher writes here and every builder reads from here
+
+layout: {root}/{source}/{ticker}/{as_of}.parquet
+    - time series (prices, flows, nav) live in a single "latest" partition per ticker
+    - snapshots (holdings) get one partition per as-of date
+    - small json metadata (high-water marks, cached ids) lives in {root}/{source}/_meta.json
+
+excel is only an export - see export_excel
+"""
+
+LATEST = "latest"
+
+
+def get_store_root(root: str = None) -> str:
+    return root if root else f"{os.getcwd()}/store"
+
+
+def _as_of_key(as_of: date | datetime | str | None) -> str:
+    if as_of is None:
+        return LATEST
+    if isinstance(as_of, (date, datetime)):
+        return as_of.strftime("%Y-%m-%d")
+    return str(as_of)
+
+
+def get_store_path(
+    source: str, ticker: str, as_of: date | str = None, root: str = None
+) -> str:
+    return os.path.join(
+        get_store_root(root), source, ticker, f"{_as_of_key(as_of)}.parquet"
+    )
+
+
+def _coerce_object_columns(df: pd.DataFrame) -> pd.DataFrame:
+    # parquet needs one type per column - mixed object columns (ex. floats + "DNE") go to str
+    for col in df.columns[df.dtypes == object]:
+        values = df[col].dropna()
+        if values.map(type).nunique() > 1:
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    return df
+
+
+def write_frame(
+    df: pd.DataFrame,
+    source: str,
+    ticker: str,
+    as_of: date | str = None,
+    root: str = None,
+    compression: str = "snappy",
+) -> str:
+    path = get_store_path(source, ticker, as_of, root)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    df = _coerce_object_columns(df.copy())
+    df.columns = [str(col) for col in df.columns]
+    # write then rename so readers never see a half written partition
+    temp_path = f"{path}.tmp"
+    df.to_parquet(temp_path, compression=compression)
+    os.replace(temp_path, path)
+
+    return path
+
+
+def list_as_of_dates(source: str, ticker: str, root: str = None) -> List[str]:
+    dir = os.path.join(get_store_root(root), source, ticker)
+    if not os.path.isdir(dir):
+        return []
+
+    return sorted(
+        x.split(".")[0]
+        for x in os.listdir(dir)
+        if x.endswith(".parquet") and x.split(".")[0] != LATEST
+    )
+
+
+def has_frame(
+    source: str, ticker: str, as_of: date | str = None, root: str = None
+) -> bool:
+    if as_of is None and list_as_of_dates(source, ticker, root):
+        return True
+    return os.path.exists(get_store_path(source, ticker, as_of, root))
+
+
+def _read_path(
+    source: str, ticker: str, as_of: date | str = None, root: str = None
+) -> str:
+    path = get_store_path(source, ticker, as_of, root)
+
+    # no as-of given and no time series partition - fall back to most recent snapshot
+    if as_of is None and not os.path.exists(path):
+        as_of_dates = list_as_of_dates(source, ticker, root)
+        if as_of_dates:
+            path = get_store_path(source, ticker, as_of_dates[-1], root)
+
+    return path
+
+
+def read_frame(
+    source: str,
+    ticker: str,
+    as_of: date | str = None,
+    root: str = None,
+    columns: List[str] = None,
+) -> pd.DataFrame:
+    path = _read_path(source, ticker, as_of, root)
+    if not os.path.exists(path):
+        return pd.DataFrame()
+
+    return pd.read_parquet(path, columns=columns)
+
+
+def read_frames(
+    source: str,
+    tickers: List[str],
+    as_of: date | str = None,
+    root: str = None,
+    columns: List[str] = None,
+) -> pd.DataFrame:
+    # one frame across partitions - memory mapped + concatenated as arrow chunks, partitions are never rewritten
+    # each ticker resolves its partition the same way read_frame does
+    tables = []
+    for ticker in tickers:
+        path = _read_path(source, ticker, as_of, root)
+        if os.path.exists(path):
+            tables.append(pq.read_table(path, columns=columns, memory_map=True))
+
+    if not tables:
+        return pd.DataFrame()
+
+    # columns added/dropped between partitions (ex. a new tenor) come back as nulls
+    return pa.concat_tables(tables, promote_options="permissive").to_pandas()
+
+
+def list_tickers(source: str, root: str = None) -> List[str]:
+    dir = os.path.join(get_store_root(root), source)
+    if not os.path.isdir(dir):
+        return []
+
+    return sorted(x for x in os.listdir(dir) if os.path.isdir(os.path.join(dir, x)))
+
+
+def read_metadata(source: str, root: str = None) -> Dict:
+    path = os.path.join(get_store_root(root), source, "_meta.json")
+    if not os.path.exists(path):
+        return {}
+
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def write_metadata(source: str, metadata: Dict, root: str = None) -> str:
+    path = os.path.join(get_store_root(root), source, "_meta.json")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(metadata, f, indent=4, sort_keys=True, default=str)
+    os.replace(temp_path, path)
+
+    return path
+
+
+def export_excel(
+    source: str,
+    tickers: List[str],
+    path: str,
+    as_of: date | str = None,
+    root: str = None,
+    index=False,
+) -> str:
+    with pd.ExcelWriter(path) as writer:
+        for ticker in tickers:
+            df = read_frame(source, ticker, as_of, root)
+            df.to_excel(writer, sheet_name=ticker[:31], index=index)
+
+    return path
@@ -0,0 +1,169 @@
+import threading
+import pandas as pd
+from typing import Dict, List
+
+from common.store import get_store_root, read_frame, write_frame
+
+"""
+Ticker symbology index - vanguard fund ids, aladdin ids/product urls and cusip/sedol/isin xrefs
+
+seeded in bulk from the all-funds listings (vg_all_funds_data, blk_all_funds_info, the ishares screener)
+and persisted to the store as symbology/index, so resolving a ticker is a dict lookup instead of a request
+"""
+
+SYMBOLOGY_COLUMNS = [
+    "ticker",
+    "issuer",
+    "name",
+    "vg_fund_id",
+    "aladdin_id",
+    "product_url",
+    "fund_name",
+    "cusip",
+    "sedol",
+    "isin",
+]
+XREF_COLUMNS = ["cusip", "sedol", "isin"]
+
+
+def _is_missing(value) -> bool:
+    return value is None or value == "DNE" or value == "" or pd.isna(value)
+
+
+class SymbologyIndex:
+    def __init__(self, root: str = None):
+        self.root = root
+        self._lock = threading.RLock()
+        self._by_ticker: Dict[str, Dict] = {}
+        self._by_xref: Dict[str, str] = {}
+        self._dirty = False
+
+        df = read_frame("symbology", "index", root=root)
+        for record in df.to_dict("records"):
+            self._merge(record)
+        self._dirty = False
+
+    def __len__(self) -> int:
+        return len(self._by_ticker)
+
+    def __contains__(self, ticker: str) -> bool:
+        return str(ticker).upper() in self._by_ticker
+
+    def _merge(self, record: Dict):
+        ticker = record.get("ticker")
+        if _is_missing(ticker):
+            return
+
+        ticker = str(ticker).strip().upper()
+        curr = self._by_ticker.setdefault(ticker, {"ticker": ticker})
+        for col in SYMBOLOGY_COLUMNS[1:]:
+            value = record.get(col)
+            if _is_missing(value):
+                continue
+            value = str(value).strip()
+            if curr.get(col) != value:
+                curr[col] = value
+                self._dirty = True
+
+        for col in XREF_COLUMNS:
+            if col in curr:
+                self._by_xref[curr[col].upper()] = ticker
+
+    def update(self, records: List[Dict]):
+        with self._lock:
+            for record in records:
+                self._merge(record)
+
+    def get(self, ticker: str) -> Dict | None:
+        return self._by_ticker.get(str(ticker).upper())
+
+    def lookup(self, ticker: str, field: str) -> str | None:
+        record = self.get(ticker)
+        return record.get(field) if record else None
+
+    def vg_fund_id(self, ticker: str) -> int | None:
+        # stored as text like every other field, vanguard's api hands back (and callers expect) an int
+        fund_id = self.lookup(ticker, "vg_fund_id")
+        return int(float(fund_id)) if fund_id else None
+
+    def aladdin_info(self, ticker: str) -> Dict | None:
+        record = self.get(ticker)
+        if not record or "aladdin_id" not in record or "product_url" not in record:
+            return None
+        return {
+            "aladdian_id": record["aladdin_id"],
+            "product_url": record["product_url"],
+            "fund_name": record.get("fund_name", record.get("name")),
+        }
+
+    def ticker_for(self, identifier: str) -> str | None:
+        # cusip, sedol or isin -> ticker
+        return self._by_xref.get(str(identifier).strip().upper())
+
+    def to_frame(self) -> pd.DataFrame:
+        with self._lock:
+            return pd.DataFrame(
+                list(self._by_ticker.values()), columns=SYMBOLOGY_COLUMNS
+            )
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            write_frame(self.to_frame(), "symbology", "index", root=self.root)
+            self._dirty = False
+
+    def add_vanguard_funds(self, df: pd.DataFrame):
+        # vg_all_funds_data filtered frame
+        self.update(
+            {
+                "ticker": row.get("ticker"),
+                "issuer": "vanguard",
+                "name": row.get("name"),
+                "vg_fund_id": row.get("fund_id"),
+                "cusip": row.get("cusip"),
+            }
+            for row in df.to_dict("records")
+        )
+        self.save()
+
+    def add_blackrock_screener(self, screener: Dict[str, Dict]):
+        # product screener json: aladdin portfolio id -> fund
+        self.update(
+            {
+                "ticker": fund.get("localExchangeTicker"),
+                "issuer": "blackrock",
+                "aladdin_id": aladdin_id,
+                "product_url": fund.get("productPageUrl"),
+                "fund_name": fund.get("fundName"),
+            }
+            for aladdin_id, fund in screener.items()
+            if isinstance(fund, dict)
+        )
+        self.save()
+
+    def add_blackrock_funds(self, df: pd.DataFrame):
+        # blk_all_funds_info frame
+        self.update(
+            {
+                "ticker": row.get("ticker"),
+                "issuer": "blackrock",
+                "name": row.get("name"),
+                "cusip": row.get("cusip"),
+                "sedol": row.get("sedol"),
+                "isin": row.get("isin"),
+            }
+            for row in df.to_dict("records")
+        )
+        self.save()
+
+
+_indexes: Dict[str, SymbologyIndex] = {}
+
+
+def get_symbology(root: str = None) -> SymbologyIndex:
+    # loaded once per store root, the store root follows cwd
+    key = get_store_root(root)
+    if key not in _indexes:
+        _indexes[key] = SymbologyIndex(root)
+    return _indexes[key]
@@ -1,5 +1,6 @@
 import os
 import time
+import numpy as np
 import pandas as pd
 from datetime import datetime
 from selenium import webdriver
@@ -9,11 +10,23 @@ from webdriver_manager.chrome import ChromeDriverManager
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import WebDriverException
-from typing import List, Union, Dict
+from typing import List, Union, Dict, Tuple
 from multiprocessing import Process
 import http
 import aiohttp
 import asyncio
+import io
+from dataclasses import dataclass
+
+from common.scheduler import FetchScheduler
+from common.store import (
+    write_frame,
+    read_frames,
+    has_frame,
+    list_tickers,
+    read_metadata,
+    write_metadata,
+)
 
 
 def latest_download_file(path) -> str:
@@ -83,6 +96,10 @@ def download_daily_treasury_par_yield_curve_rates(
     return df_temp if df_temp else pd.DataFrame
 
 
+def treasury_source(real_par_yields=False) -> str:
+    return "treasury_real_par_yields" if real_par_yields else "treasury_par_yields"
+
+
 def get_treasurygov_header(year: int, cj: http.cookiejar = None) -> Dict[str, str]:
     cookie_str = ""
     if cj:
@@ -121,12 +138,25 @@ def get_treasurygov_header(year: int, cj: http.cookiejar = None) -> Dict[str, st
     return headers
 
 
-def multi_download_year_treasury_par_yield_curve_rate(
-    years: List[int], raw_path: str, real_par_yields=False, cj: http.cookiejar = None
+async def multi_download_year_treasury_par_yield_curve_rate_async(
+    years: List[int],
+    raw_path: str,
+    session: aiohttp.ClientSession,
+    scheduler: FetchScheduler,
+    real_par_yields=False,
+    cj: http.cookiejar = None,
+    refetch_closed_years=False,
 ) -> pd.DataFrame:
-    async def fetch(
-        session: aiohttp.ClientSession, url: str, curr_year: int
-    ) -> pd.DataFrame:
+    """
+    years are partitions in the store - a year fetched after it ended never changes so it is never fetched again,
+    only the current year (and closed years we only have a partial copy of) go over the wire
+    """
+    source = treasury_source(real_par_yields)
+    metadata = read_metadata(source)
+    closed_years: List[str] = metadata.get("closed_years", [])
+    current_year = datetime.today().year
+
+    async def fetch(url: str, curr_year: int) -> pd.DataFrame:
         try:
             headers = get_treasurygov_header(curr_year, cj)
             curr_file_name = (
@@ -134,75 +164,81 @@ def multi_download_year_treasury_par_yield_curve_rate(
                 if not real_par_yields
                 else f"{curr_year}_daily_real_treasury_rates"
             )
-            full_file_path = os.path.join(raw_path, "temp", f"{curr_file_name}.csv")
-            async with session.get(url, headers=headers) as response:
-                if response.status == 200:
-                    with open(full_file_path, "wb") as f:
-                        chunk_size = 8192
-                        while True:
-                            chunk = await response.content.read(chunk_size)
-                            if not chunk:
-                                break
-                            f.write(chunk)
-
-                    renamed = await convert_csv_to_excel(full_file_path)
-                    return pd.read_excel(renamed)
-                else:
-                    raise Exception(f"Bad Status: {response.status}")
+            bytes = await scheduler.get_bytes(session, url, headers=headers)
+
+            df_temp = pd.read_csv(io.BytesIO(bytes))
+            df_temp["Date"] = pd.to_datetime(df_temp["Date"])
+            df_temp["Date"] = df_temp["Date"].dt.strftime("%Y-%m-%d")
+            write_frame(df_temp, source, str(curr_year))
+            if int(curr_year) < current_year and str(curr_year) not in closed_years:
+                closed_years.append(str(curr_year))
+            if raw_path:
+                df_temp.to_excel(
+                    os.path.join(raw_path, f"{curr_file_name}.xlsx"), index=False
+                )
+            return df_temp
         except Exception as e:
-            print(e)
+            print(f"{curr_year}: {e}")
             return pd.DataFrame()
 
-    async def convert_csv_to_excel(full_file_path: str or None) -> str:
-        if not full_file_path:
-            return
-
-        copy = full_file_path
-        rdir_path = copy.split("\\")
-        rdir_path.remove("temp")
-        renamed = str.join("\\", rdir_path)
-        renamed = f"{renamed.split('.')[0]}.xlsx"
-
-        df_temp = pd.read_csv(full_file_path)
-        df_temp["Date"] = pd.to_datetime(df_temp["Date"])
-        df_temp["Date"] = df_temp["Date"].dt.strftime("%Y-%m-%d")
-        df_temp.to_excel(f"{renamed.split('.')[0]}.xlsx", index=False)
-        os.remove(full_file_path)
-
-        return renamed
-
-    async def get_promises(session: aiohttp.ClientSession):
-        tasks = []
-        for year in years:
-            curr_url = (
-                f"https://home.treasury.gov/resource-center/data-chart-center/interest-rates/daily-treasury-rates.csv/{year}/all?type=daily_treasury_yield_curve&amp;field_tdr_date_value={year}&amp;page&amp;_format=csv"
-                if not real_par_yields
-                else f"https://home.treasury.gov/resource-center/data-chart-center/interest-rates/daily-treasury-rates.csv/{year}/all?type=daily_treasury_real_yield_curve&field_tdr_date_value={year}&amp;page&amp;_format=csv"
-            )
-            task = fetch(session, curr_url, year)
-            tasks.append(task)
+    tasks = []
+    for year in years:
+        if (
+            str(year) in closed_years
+            and has_frame(source, str(year))
+            and not refetch_closed_years
+        ):
+            continue
+
+        curr_url = (
+            f"https://home.treasury.gov/resource-center/data-chart-center/interest-rates/daily-treasury-rates.csv/{year}/all?type=daily_treasury_yield_curve&amp;field_tdr_date_value={year}&amp;page&amp;_format=csv"
+            if not real_par_yields
+            else f"https://home.treasury.gov/resource-center/data-chart-center/interest-rates/daily-treasury-rates.csv/{year}/all?type=daily_treasury_real_yield_curve&field_tdr_date_value={year}&amp;page&amp;_format=csv"
+        )
+        tasks.append(fetch(curr_url, year))
+
+    await asyncio.gather(*tasks)
+
+    metadata["closed_years"] = sorted(closed_years)
+    write_metadata(source, metadata)
+
+    return read_par_yields(years, real_par_yields)
+
+
+def read_par_yields(
+    years: List[int | str] = None, real_par_yields=False
+) -> pd.DataFrame:
+    # range query over the year partitions, newest year first like the old combined workbook
+    source = treasury_source(real_par_yields)
+    years = [str(x) for x in years] if years else list_tickers(source)
+    df = read_frames(source, sorted(years, reverse=True))
+    if not df.empty:
+        df = df[["Date"] + [col for col in df.columns if col != "Date"]]
+
+    return df
 
-        return await asyncio.gather(*tasks)
 
-    async def run_fetch_all() -> List[pd.DataFrame]:
+def multi_download_year_treasury_par_yield_curve_rate(
+    years: List[int],
+    raw_path: str,
+    real_par_yields=False,
+    cj: http.cookiejar = None,
+    scheduler: FetchScheduler = None,
+    refetch_closed_years=False,
+) -> pd.DataFrame:
+    async def run_fetch_all() -> pd.DataFrame:
         async with aiohttp.ClientSession() as session:
-            all_data = await get_promises(session)
-            return all_data
-
-    os.mkdir(f"{raw_path}/temp")
-    dfs = asyncio.run(run_fetch_all())
-    os.rmdir(f"{raw_path}/temp")
-
-    yield_df = pd.concat(dfs, ignore_index=True)
-    years_str = str.join("_", [str(x) for x in years])
-    yield_df.to_excel(
-        os.path.join(raw_path, f"{years_str}_daily_treasury_rates.xlsx")
-        if not real_par_yields
-        else os.path.join(raw_path, f"{years_str}_daily_real_treasury_rates.xlsx"),
-        index=False,
-    )
+            return await multi_download_year_treasury_par_yield_curve_rate_async(
+                years,
+                raw_path,
+                session,
+                scheduler or FetchScheduler(),
+                real_par_yields,
+                cj,
+                refetch_closed_years,
+            )
 
-    return yield_df
+    return asyncio.run(run_fetch_all())
 
 
 # defaults to fetching 2s10s and 5s30s
@@ -299,22 +335,164 @@ def run_in_parallel(*fns):
         p.join()
 
 
+# name -> (long leg, short leg)
+DEFAULT_SPREADS: Dict[str, Tuple[str, str]] = {
+    "3ms10s": ("10 Yr", "3 Mo"),
+    "2s5s": ("5 Yr", "2 Yr"),
+    "2s10s": ("10 Yr", "2 Yr"),
+    "5s30s": ("30 Yr", "5 Yr"),
+    "2s30s": ("30 Yr", "2 Yr"),
+}
+
+# name -> (short wing, belly, long wing)
+DEFAULT_FLIES: Dict[str, Tuple[str, str, str]] = {
+    "2s5s10s": ("2 Yr", "5 Yr", "10 Yr"),
+    "5s10s30s": ("5 Yr", "10 Yr", "30 Yr"),
+}
+
+
+# real yield curve columns are upper case and start at 5 years
+DEFAULT_REAL_SPREADS: Dict[str, Tuple[str, str]] = {
+    "5s10s": ("10 YR", "5 YR"),
+    "10s30s": ("30 YR", "10 YR"),
+    "5s30s": ("30 YR", "5 YR"),
+}
+
+DEFAULT_REAL_FLIES: Dict[str, Tuple[str, str, str]] = {
+    "5s10s30s": ("5 YR", "10 YR", "30 YR"),
+}
+
+
+def tenor_to_years(tenor: str) -> float:
+    # "3 Mo", "1.5 Month", "10 Yr"
+    value, unit = str(tenor).split(" ", 1)
+    return float(value) / 12 if unit.lower().startswith("mo") else float(value)
+
+
+@dataclass
+class ParCurvePanel:
+    """
+    dates x tenors float64 panel of par yields - spreads/flies index columns instead of re-reading workbooks
+    """
+
+    dates: np.ndarray
+    tenors: List[str]
+    values: np.ndarray
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "ParCurvePanel":
+        df = df.copy()
+        df["Date"] = pd.to_datetime(df["Date"])
+        df = df.drop_duplicates(subset="Date", keep="last").sort_values("Date")
+
+        tenors = sorted(
+            [col for col in df.columns if col != "Date"], key=tenor_to_years
+        )
+        return cls(
+            df["Date"].to_numpy(dtype="datetime64[D]"),
+            tenors,
+            df[tenors].to_numpy(dtype=np.float64),
+        )
+
+    def tenor_idx(self, tenors: List[str]) -> np.ndarray:
+        missing = [x for x in tenors if x not in self.tenors]
+        if missing:
+            raise ValueError(f"Bad Mat Col Name: {missing}")
+        lookup = {tenor: i for i, tenor in enumerate(self.tenors)}
+        return np.array([lookup[x] for x in tenors], dtype=np.intp)
+
+    def spreads(self, pairs: Dict[str, Tuple[str, str]]) -> np.ndarray:
+        if not pairs:
+            return np.empty((len(self.dates), 0))
+        long_legs, short_legs = zip(*pairs.values())
+        return (
+            self.values[:, self.tenor_idx(list(long_legs))]
+            - self.values[:, self.tenor_idx(list(short_legs))]
+        )
+
+    def butterflies(self, flies: Dict[str, Tuple[str, str, str]]) -> np.ndarray:
+        if not flies:
+            return np.empty((len(self.dates), 0))
+        short_wings, bellies, long_wings = zip(*flies.values())
+        return (
+            2 * self.values[:, self.tenor_idx(list(bellies))]
+            - self.values[:, self.tenor_idx(list(short_wings))]
+            - self.values[:, self.tenor_idx(list(long_wings))]
+        )
+
+    def to_frame(self) -> pd.DataFrame:
+        df = pd.DataFrame(self.values, columns=self.tenors)
+        df.insert(0, "Date", pd.to_datetime(self.dates))
+        return df
+
+
+def load_par_curve_panel(
+    years: List[int | str] = None, real_par_yields=False, raw_path: str = None
+) -> ParCurvePanel:
+    # per year partitions from the store, falling back to the per year xlsx downloads in raw_path
+    source = treasury_source(real_par_yields)
+    years = [str(x) for x in years] if years else list_tickers(source)
+
+    dfs = [read_par_yields(years, real_par_yields)]
+    for year in years:
+        if has_frame(source, year) or not raw_path:
+            continue
+        file_name = (
+            f"{year}_daily_treasury_rates.xlsx"
+            if not real_par_yields
+            else f"{year}_daily_real_treasury_rates.xlsx"
+        )
+        if os.path.exists(os.path.join(raw_path, file_name)):
+            dfs.append(pd.read_excel(os.path.join(raw_path, file_name)))
+
+    dfs = [df for df in dfs if not df.empty]
+    if not dfs:
+        return ParCurvePanel(np.array([], dtype="datetime64[D]"), [], np.empty((0, 0)))
+
+    return ParCurvePanel.from_frame(pd.concat(dfs, ignore_index=True))
+
+
+def calc_curve_spreads(
+    panel: ParCurvePanel,
+    spreads: Dict[str, Tuple[str, str]] = None,
+    flies: Dict[str, Tuple[str, str, str]] = None,
+    out_path: str = None,
+    real_par_yields=False,
+) -> pd.DataFrame:
+    # nominal and real spreads live side by side as treasury_spreads/par and treasury_spreads/real
+    if spreads is None:
+        spreads = DEFAULT_REAL_SPREADS if real_par_yields else DEFAULT_SPREADS
+    if flies is None:
+        flies = DEFAULT_REAL_FLIES if real_par_yields else DEFAULT_FLIES
+
+    df = pd.DataFrame(
+        np.hstack([panel.spreads(spreads), panel.butterflies(flies)]),
+        columns=list(spreads) + list(flies),
+    )
+    df.insert(0, "Date", pd.to_datetime(panel.dates))
+
+    write_frame(df, "treasury_spreads", "real" if real_par_yields else "par")
+    if out_path:
+        df.to_excel(out_path, index=False)
+
+    return df
+
+
 def calc_spreads(in_path: str, mat1: str, mat2: str, out_path: str) -> pd.DataFrame:
-    df = pd.read_excel(in_path, parse_dates=["Date"])
-    df = df.sort_values("Date")
-
-    if mat1 in df and mat2 in df:
-        df = df[["Date", mat1, mat2]]
-        df["spread"] = df.apply(lambda x: (x[mat1] - x[mat2]), axis=1)
-        spread = df[["Date", "spread"]]
-        spread.to_excel(out_path, index=False)
-        return spread
-    else:
-        print("Bad Mat Col Name")
+    panel = ParCurvePanel.from_frame(pd.read_excel(in_path, parse_dates=["Date"]))
+    try:
+        spread = pd.DataFrame(
+            {
+                "Date": pd.to_datetime(panel.dates),
+                "spread": panel.spreads({"spread": (mat1, mat2)})[:, 0],
+            }
+        )
+    except ValueError as e:
+        print(e)
         return pd.DataFrame()
 
-
-# def
+    spread.to_excel(out_path, index=False)
+    return spread
 
 
 if __name__ == "__main__":
@@ -327,7 +505,6 @@ if __name__ == "__main__":
     # print(df_treasuries)
 
     years = ["2023", "2022", "2021", "2020", "2019"]
-    years_str = "_".join(years) if len(years) > 1 else years[0]
 
     df_treasuries = multi_download_year_treasury_par_yield_curve_rate(
         years, r"C:\Users\chris\trade\curr_pos\treasuries"
@@ -340,29 +517,12 @@ if __name__ == "__main__":
     print(df_real_treasuries)
 
 
-    in_path = rf"C:\Users\chris\trade\curr_pos\treasuries\{years_str}_daily_treasury_rates.xlsx"
-
-    out_path_3ms10s = (
-        r"C:\Users\chris\trade\curr_pos\treasuries\3ms10s_data_calced.xlsx"
+    panel = load_par_curve_panel(years, raw_path=r"C:\Users\chris\trade\curr_pos\treasuries")
+    spreads_df = calc_curve_spreads(
+        panel,
+        out_path=r"C:\Users\chris\trade\curr_pos\treasuries\curve_spreads_calced.xlsx",
     )
-    threems_10s_calced_df = calc_spreads(in_path, "10 Yr", "3 Mo", out_path_3ms10s)
-    print(threems_10s_calced_df)
-
-    out_path_2s5s = r"C:\Users\chris\trade\curr_pos\treasuries\2s5s_data_calced.xlsx"
-    twos_fives_calced_df = calc_spreads(in_path, "5 Yr", "2 Yr", out_path_2s5s)
-    print(twos_fives_calced_df)
-
-    out_path_2s10s = r"C:\Users\chris\trade\curr_pos\treasuries\2s10s_data_calced.xlsx"
-    twos_tens_calced_df = calc_spreads(in_path, "10 Yr", "2 Yr", out_path_2s10s)
-    print(twos_tens_calced_df)
-
-    out_path_5s30s = r"C:\Users\chris\trade\curr_pos\treasuries\5s30s_data_calced.xlsx"
-    fives_thirties_calced_df = calc_spreads(in_path, "30 Yr", "5 Yr", out_path_5s30s)
-    print(fives_thirties_calced_df)
-
-    out_path_2s30s = r"C:\Users\chris\trade\curr_pos\treasuries\2s30s_data_calced.xlsx"
-    twos_thirties_calced_df = calc_spreads(in_path, "30 Yr", "2 Yr", out_path_2s30s)
-    print(twos_thirties_calced_df)
+    print(spreads_df)
 
     # spread_urls = {
     #     "https://fred.stlouisfed.org/series/T10Y2Y": "2s10s_data.xlsx",
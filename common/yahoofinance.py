@@ -7,9 +7,21 @@ import webbrowser
 import os
 import browser_cookie3
 import time
-from datetime import date, datetime
+import io
+from datetime import date, datetime, timedelta
 from typing import Tuple, List, Dict
 
+from common.options import parse_option_chain, option_chain_expiry_frames
+from common.option_snapshots import write_chain_snapshot
+from common.scheduler import FetchScheduler, BadStatus
+from common.store import (
+    write_frame,
+    read_frame,
+    has_frame,
+    read_metadata,
+    write_metadata,
+)
+
 
 def is_downloadable(url):
     h = requests.head(url, allow_redirects=True)
@@ -69,51 +81,146 @@ def get_yahoofinance_download_auth(
     return headers
 
 
+"""
+Shared Yahoo client - one pooled aiohttp session and one crumb handshake per cookie jar
+crumbs are cached at the class level (with a ttl) so every entry point/event loop reuses them
+and a 401 forces a single refresh + retry
+"""
+
+
+class YahooFinanceClient:
+    CRUMB_URL = "https://query2.finance.yahoo.com/v1/test/getcrumb"
+    CRUMB_TTL = 60 * 60
+
+    # cookie str -> (crumb, fetched at)
+    _crumb_cache: Dict[str, Tuple[str, float]] = {}
+
+    def __init__(
+        self,
+        cj: http.cookiejar = None,
+        session: aiohttp.ClientSession = None,
+        crumb_ttl: int = CRUMB_TTL,
+        scheduler: FetchScheduler = None,
+    ):
+        self.cj = cj
+        self.crumb_ttl = crumb_ttl
+        self.scheduler = scheduler
+        self.headers = get_yahoofinance_download_auth("", cj)
+        # pseudo headers only made sense per request
+        for key in ["authority", "method", "path", "scheme"]:
+            self.headers.pop(key, None)
+
+        self._session = session
+        self._owns_session = session is None
+        self._crumb_lock: asyncio.Lock = None
+
+    async def __aenter__(self):
+        if not self._session:
+            self._session = aiohttp.ClientSession()
+        if not self.scheduler:
+            self.scheduler = FetchScheduler()
+        self._crumb_lock = asyncio.Lock()
+        return self
+
+    async def __aexit__(self, *args):
+        if self._owns_session and self._session:
+            await self._session.close()
+            self._session = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        return self._session
+
+    def _cache_key(self) -> str:
+        return self.headers.get("Cookie", "")
+
+    # stale is a crumb that just got a 401 - never hand it back out
+    async def get_crumb(self, stale: str = None) -> str:
+        key = self._cache_key()
+
+        def cached_crumb() -> str | None:
+            cached = YahooFinanceClient._crumb_cache.get(key)
+            if (
+                cached
+                and cached[0] != stale
+                and time.time() - cached[1] < self.crumb_ttl
+            ):
+                return cached[0]
+            return None
+
+        crumb = cached_crumb()
+        if crumb:
+            return crumb
+
+        async with self._crumb_lock:
+            # another task may have refreshed while we waited
+            crumb = cached_crumb()
+            if crumb:
+                return crumb
+
+            try:
+                crumb = await self.scheduler.get_text(
+                    self._session, YahooFinanceClient.CRUMB_URL, headers=self.headers
+                )
+            except BadStatus as e:
+                raise Exception(f"Bad Status: {e.status} - Crumb Fetch Failed")
+
+            YahooFinanceClient._crumb_cache[key] = (crumb, time.time())
+            return crumb
+
+    async def _get(self, url: str, read):
+        crumb = await self.get_crumb()
+        sep = "&" if "?" in url else "?"
+        try:
+            return await self.scheduler.request(
+                self._session, "GET", f"{url}{sep}crumb={crumb}", read, headers=self.headers
+            )
+        except BadStatus as e:
+            if e.status != 401:
+                raise
+        crumb = await self.get_crumb(stale=crumb)
+        return await self.scheduler.request(
+            self._session, "GET", f"{url}{sep}crumb={crumb}", read, headers=self.headers
+        )
+
+    async def get_json(self, url: str) -> Dict:
+        return await self._get(url, lambda response: response.json())
+
+    async def get_bytes(self, url: str) -> bytes:
+        return await self._get(url, lambda response: response.read())
+
+
 def download_historical_data_yahoofinance(
     ticker: str,
     from_date: date,
     to_date: date,
-    raw_path: str,
+    raw_path: str = None,
     cj: http.cookiejar = None,
     open_chrome=False,
+    make_xlsx=False,
 ):
-    from_sec = round(from_date.timestamp())
-    to_sec = round(to_date.timestamp())
-    base_url = f"https://query1.finance.yahoo.com/v7/finance/download/{ticker}?period1={from_sec}&period2={to_sec}&interval=1d&events=history&includeAdjustedClose=true"
-
-    webbrowser.open(base_url) if open_chrome else None
-    _, crumb = get_yahoofinance_download_auth("/v1/test/getcrumb", cj, True)
-    headers = get_yahoofinance_download_auth(
-        f"/v7/finance/download/{ticker}?period1={from_sec}&amp;period2={to_sec}&amp;interval=1d&amp;events=history&amp;includeAdjustedClose=true&crumb={crumb}&formatted=false&region=US&lang=en-US",
+    return multi_download_historical_data_yahoofinance(
+        [ticker],
+        from_date,
+        to_date,
+        raw_path,
         cj,
-    )
-    os.system("taskkill /im chrome.exe /f") if open_chrome else None
+        open_chrome=open_chrome,
+        make_xlsx=make_xlsx,
+    )[ticker]
 
-    res_url = f"{base_url}&crumb={crumb}&formatted=false&region=US&lang=en-US"
-    response = requests.get(res_url, headers=headers, allow_redirects=True)
-    full_file_path = os.path.join(raw_path, f"{ticker}_yahoofin_historical_data.csv")
-    if response.status_code == 200:
-        with open(full_file_path, mode="wb") as file:
-            chunk_size = 10 * 1024
-            for chunk in response.iter_content(chunk_size=chunk_size):
-                file.write(chunk)
 
-        df = pd.read_csv(full_file_path)
-        df.to_excel(f"{full_file_path.split('.')[0]}.xlsx", index=False)
-        os.remove(full_file_path)
-
-        return df
-
-
-def multi_download_historical_data_yahoofinance(
+async def multi_download_historical_data_yahoofinance_async(
     tickers: List[str],
     from_date: date,
     to_date: date,
-    raw_path: str,
-    cj: http.cookiejar = None,
+    client: YahooFinanceClient,
+    raw_path: str = None,
     max_date=False,
     big_wb=False,
     open_chrome=False,
+    make_xlsx=False,
+    incremental=False,
 ) -> Dict[str, pd.DataFrame]:
     from_sec = round(from_date.timestamp())
     to_sec = (
@@ -122,83 +229,117 @@ def multi_download_historical_data_yahoofinance(
         else round(datetime.today().timestamp())
     )
 
+    # first trade dates never change, high-water marks are the last stored bar per ticker
+    metadata = read_metadata("yahoofinance")
+    first_trade_dates: Dict[str, int] = metadata.get("first_trade_dates", {})
+    high_water_marks: Dict[str, str] = metadata.get("high_water_marks", {})
+
+    def get_high_water_mark(ticker: str) -> datetime | None:
+        if not has_frame("yahoofinance", ticker):
+            return None
+        if ticker in high_water_marks:
+            return datetime.strptime(high_water_marks[ticker], "%Y-%m-%d")
+        stored = read_frame("yahoofinance", ticker, columns=["Date"])
+        if stored.empty:
+            return None
+        return pd.to_datetime(stored["Date"]).max().to_pydatetime()
+
+    def read_stored(ticker: str) -> pd.DataFrame:
+        df = read_frame("yahoofinance", ticker)
+        if not df.empty:
+            df["Date"] = pd.to_datetime(df["Date"])
+        return df
+
+    def merge_with_stored(ticker: str, df: pd.DataFrame) -> pd.DataFrame:
+        stored = read_stored(ticker)
+        if stored.empty:
+            return df
+        merged = pd.concat([stored, df], ignore_index=True)
+        merged = merged.drop_duplicates(subset="Date", keep="last")
+        return merged.sort_values("Date").reset_index(drop=True)
+
     async def fetch(
-        session: aiohttp.ClientSession, url: str, curr_ticker: str, crumb: str
+        client: YahooFinanceClient, url: str, curr_ticker: str
     ) -> pd.DataFrame:
         try:
             webbrowser.open(url) if open_chrome else None
-            headers = get_yahoofinance_download_auth(
-                f"/v7/finance/download/{curr_ticker}?period1={from_sec}&amp;period2={to_sec}&amp;interval=1d&amp;events=history&amp;includeAdjustedClose=true&crumb={crumb}&formatted=false&region=US&lang=en-US",
-                cj,
-            )
             os.system("taskkill /im chrome.exe /f") if open_chrome else None
 
-            full_file_path = os.path.join(
-                raw_path, f"{curr_ticker}_yahoofin_historical_data.csv"
+            res_url = f"{url}&formatted=false&region=US&lang=en-US"
+            df = pd.read_csv(
+                io.BytesIO(await client.get_bytes(res_url)), parse_dates=["Date"]
             )
-            res_url = f"{url}&crumb={crumb}&formatted=false&region=US&lang=en-US"
-            async with session.get(res_url, headers=headers) as response:
-                if response.status == 200:
-                    with open(full_file_path, "wb") as f:
-                        chunk_size = 10 * 1024
-                        while True:
-                            chunk = await response.content.read(chunk_size)
-                            if not chunk:
-                                break
-                            f.write(chunk)
-
-                    renamed = await convert_csv_to_excel(full_file_path)
-                    return pd.read_excel(renamed)
-                else:
-                    raise Exception(f"Bad Status: {response.status}")
+            if incremental:
+                df = merge_with_stored(curr_ticker, df)
+            write_frame(df, "yahoofinance", curr_ticker)
+            if not df.empty:
+                high_water_marks[curr_ticker] = df["Date"].max().strftime("%Y-%m-%d")
+            return df
         except Exception as e:
             print(e)
-            return pd.DataFrame()
+            return read_stored(curr_ticker) if incremental else pd.DataFrame()
 
-    async def convert_csv_to_excel(full_file_path: str or None) -> str:
-        if not full_file_path:
-            return
+    async def fetch_first_trade_date(
+        client: YahooFinanceClient, ticker: str
+    ) -> int | None:
+        try:
+            first_trade_date_url = f"https://query2.finance.yahoo.com/v8/finance/chart/{ticker}?formatted=true&lang=en-US&region=US&includeAdjustedClose=true&corsDomain=finance.yahoo.com"
+            json = await client.get_json(first_trade_date_url)
+            return round(json["chart"]["result"][0]["meta"]["firstTradeDate"])
+        except Exception as e:
+            print("First Trade Date Error", e)
+            return None
 
-        df = pd.read_csv(full_file_path)
-        df.to_excel(f"{full_file_path.split('.')[0]}.xlsx", index=False)
-        os.remove(full_file_path)
+    async def up_to_date(ticker: str) -> pd.DataFrame:
+        return read_stored(ticker)
 
-        return f"{full_file_path.split('.')[0]}.xlsx"
+    async def get_promises(client: YahooFinanceClient):
+        if max_date:
+            missing = [x for x in tickers if x not in first_trade_dates]
+            fetched = await asyncio.gather(
+                *[fetch_first_trade_date(client, x) for x in missing]
+            )
+            for ticker, first_trade_date in zip(missing, fetched):
+                if first_trade_date is not None:
+                    first_trade_dates[ticker] = first_trade_date
 
-    async def get_promises(session: aiohttp.ClientSession):
         tasks = []
-        _, crumb = get_yahoofinance_download_auth("/v1/test/getcrumb", cj, True)
         for ticker in tickers:
-            if max_date:
-                try:
-                    headers = get_yahoofinance_download_auth(
-                        f"v8/finance/chart/{ticker}?formatted=true&crumb={crumb}&lang=en-US&region=US&includeAdjustedClose=true&corsDomain=finance.yahoo.com",
-                        cj,
+            curr_from_sec = (
+                first_trade_dates.get(ticker, from_sec) if max_date else from_sec
+            )
+
+            if incremental:
+                high_water_mark = get_high_water_mark(ticker)
+                if high_water_mark:
+                    next_bar_sec = round(
+                        (high_water_mark + timedelta(days=1)).timestamp()
                     )
-                    first_trade_date_url = f"https://query2.finance.yahoo.com/v8/finance/chart/{ticker}?formatted=true&crumb={crumb}&lang=en-US&region=US&includeAdjustedClose=true&corsDomain=finance.yahoo.com"
-                    first_trade_date = requests.get(
-                        first_trade_date_url, headers=headers
-                    ).json()["chart"]["result"][0]["meta"]["firstTradeDate"]
-                    from_sec = round(first_trade_date)
-                except Exception as e:
-                    print("First Trade Date Error", e)
-
-            curr_url = f"https://query1.finance.yahoo.com/v7/finance/download/{ticker}?period1={from_sec}&period2={to_sec}&interval=1d&events=history&includeAdjustedClose=true"
-            task = fetch(session, curr_url, ticker, crumb)
+                    if next_bar_sec > to_sec:
+                        tasks.append(up_to_date(ticker))
+                        continue
+                    curr_from_sec = max(curr_from_sec, next_bar_sec)
+
+            curr_url = f"https://query1.finance.yahoo.com/v7/finance/download/{ticker}?period1={curr_from_sec}&period2={to_sec}&interval=1d&events=history&includeAdjustedClose=true"
+            task = fetch(client, curr_url, ticker)
             tasks.append(task)
 
         return await asyncio.gather(*tasks)
 
-    async def run_fetch_all() -> List[pd.DataFrame]:
-        async with aiohttp.ClientSession() as session:
-            all_data = await get_promises(session)
-            return all_data
-
-    os.mkdir(f"{raw_path}/temp")
-    dfs = asyncio.run(run_fetch_all())
-    os.rmdir(f"{raw_path}/temp")
+    dfs = await get_promises(client)
     os.system("taskkill /im chrome.exe /f") if open_chrome else None
 
+    metadata["first_trade_dates"] = first_trade_dates
+    metadata["high_water_marks"] = high_water_marks
+    write_metadata("yahoofinance", metadata)
+
+    if make_xlsx:
+        for ticker, df in zip(tickers, dfs):
+            df.to_excel(
+                os.path.join(raw_path, f"{ticker}_yahoofin_historical_data.xlsx"),
+                index=False,
+            )
+
     if big_wb:
         tickers_str = str.join("_", [str(x) for x in tickers])
         wb_file_name = f"{raw_path}\{tickers_str}_yahoofin_historical_data.xlsx"
@@ -213,249 +354,132 @@ def multi_download_historical_data_yahoofinance(
     return dict(zip(tickers, dfs))
 
 
-def get_yahoofinance_data_file_path_by_ticker(ticker: str, cj: http.cookiejar = None):
-    dir = f"{os.path.abspath('')}/yahoofinance"
-    files = sorted(
-        os.listdir(dir),
-    )
-    tickers_with_data = [x for x in files if x.split("_")[0].lower() == ticker.lower()]
-
-    if len(tickers_with_data) == 0:
-        from_date = datetime.datetime(2023, 1, 1)
-        to_date = datetime.datetime.today()
-        download_historical_data_yahoofinance(ticker, from_date, to_date, dir, cj)
+def multi_download_historical_data_yahoofinance(
+    tickers: List[str],
+    from_date: date,
+    to_date: date,
+    raw_path: str = None,
+    cj: http.cookiejar = None,
+    max_date=False,
+    big_wb=False,
+    open_chrome=False,
+    make_xlsx=False,
+    incremental=False,
+    scheduler: FetchScheduler = None,
+) -> Dict[str, pd.DataFrame]:
+    async def run_fetch_all() -> Dict[str, pd.DataFrame]:
+        async with YahooFinanceClient(cj, scheduler=scheduler) as client:
+            return await multi_download_historical_data_yahoofinance_async(
+                tickers,
+                from_date,
+                to_date,
+                client,
+                raw_path,
+                max_date,
+                big_wb,
+                open_chrome,
+                make_xlsx,
+                incremental,
+            )
 
-    return f"{dir}/{ticker}_yahoofin_historical_data.xlsx"
+    return asyncio.run(run_fetch_all())
 
 
-def get_option_expiration_dates_yahoofinance(
+def get_yahoofinance_data_by_ticker(
     ticker: str, cj: http.cookiejar = None
+) -> pd.DataFrame:
+    if not has_frame("yahoofinance", ticker):
+        from_date = datetime(2023, 1, 1)
+        to_date = datetime.today()
+        download_historical_data_yahoofinance(ticker, from_date, to_date, cj=cj)
+
+    df = read_frame("yahoofinance", ticker)
+    if not df.empty:
+        df["Date"] = pd.to_datetime(df["Date"])
+    return df
+
+
+async def fetch_option_expiration_dates_yahoofinance(
+    client: YahooFinanceClient, ticker: str
 ) -> List[int]:
-    _, crumb = get_yahoofinance_download_auth("/v1/test/getcrumb", cj, True)
-    headers = get_yahoofinance_download_auth(
-        f"/v7/finance/options/{ticker}?formatted=true&crumb={crumb}&lang=en-US&region=US&date=1&straddle=true&corsDomain=finance.yahoo.com",
-        cj,
-    )
-    url = f"https://query2.finance.yahoo.com/v7/finance/options/{ticker}?formatted=true&crumb=wZdpBzDeWLv&lang=en-US&region=US&date=1&straddle=true&corsDomain=finance.yahoo.com"
+    url = f"https://query2.finance.yahoo.com/v7/finance/options/{ticker}?formatted=true&lang=en-US&region=US&date=1&straddle=true&corsDomain=finance.yahoo.com"
 
     try:
-        res = requests.get(url, headers=headers)
-        json = res.json()
+        json = await client.get_json(url)
         return json["optionChain"]["result"][0]["expirationDates"]
     except Exception as e:
         print(e)
         return []
 
 
-def safe_get(dct, *keys):
-    for key in keys:
-        try:
-            dct = dct[key]
-        except KeyError:
-            return None
-    return dct
-
-
-def empty_option_data_yahoofinance() -> dict[str, None]:
-    return {
-        "percentChange": None,
-        "openInterest": None,
-        "strike": None,
-        "change": None,
-        "inTheMoney": None,
-        "impliedVolatility": None,
-        "volume": None,
-        "ask": None,
-        "contractSymbol": None,
-        "lastTradeDate": None,
-        "expiration": None,
-        "currency": None,
-        "contractSize": None,
-        "bid": None,
-        "lastPrice": None,
-    }
+def get_option_expiration_dates_yahoofinance(
+    ticker: str, cj: http.cookiejar = None
+) -> List[int]:
+    async def run() -> List[int]:
+        async with YahooFinanceClient(cj) as client:
+            return await fetch_option_expiration_dates_yahoofinance(client, ticker)
 
+    return asyncio.run(run())
 
-def get_options_chain_yahoofinance(
-    ticker: str,
-    raw_path: str,
-    cj: http.cookiejar = None,
-    big_wb=False,
-) -> Dict[date, pd.DataFrame]:
-    async def fetch(
-        session: aiohttp.ClientSession, url: str, ex_date: int, crumb: str
-    ) -> pd.DataFrame:
-        try:
-            headers = get_yahoofinance_download_auth(
-                f"/v7/finance/options/{ticker}?formatted=true&crumb={crumb}&lang=en-US&region=US&date={ex_date}&straddle=true&corsDomain=finance.yahoo.com",
-                cj,
-            )
-            async with session.get(url, headers=headers) as response:
-                if response.status == 200:
-                    # straddle schema
-                    """
-                    type Straddle = {
-                        stike: Option
-                    }
-                    type Option = {
-                        call: OptionInfo
-                        puts OptionInfo
-                    }
-                    type OptionInfo = {
-                        "openInterest": int
-                        "strike": int
-                        "change": int
-                        "inTheMoney": bool
-                        "impliedVolatility": int
-                        "volume": int
-                        "ask": int
-                        "contractSymbol": str
-                        "lastTradeDate": int
-                        "expiration": int
-                        "currency": int
-                        "contractSize": int
-                        "bid": int
-                        "lastPrice": int
-                    }
-                    """
-                    json = await response.json()
-                    data = json["optionChain"]["result"][0]["options"][0]["straddles"]
-
-                    straddle = {}
-                    for option in data:
-                        strike_price = option["strike"]["raw"]
-
-                        call_raw = safe_get(option, "call")
-                        call_raw_dict = call_raw.items() if call_raw else None
-                        call = (
-                            {
-                                key: value.get("raw", value)
-                                if isinstance(value, dict)
-                                else value
-                                for key, value in call_raw_dict
-                                if call_raw_dict
-                            }
-                            if call_raw_dict
-                            else empty_option_data_yahoofinance()
-                        )
-
-                        put_raw = safe_get(option, "put")
-                        put_raw_dict = put_raw.items() if put_raw else None
-                        put = (
-                            {
-                                key: value.get("raw", value)
-                                if isinstance(value, dict)
-                                else value
-                                for key, value in put_raw_dict
-                                if put_raw_dict
-                            }
-                            if put_raw_dict
-                            else empty_option_data_yahoofinance()
-                        )
-
-                        straddle[strike_price] = {
-                            "call": call,
-                            "put": put,
-                        }
-
-                    return straddle, ex_date
-
-                else:
-                    raise Exception(f"Bad Status: {response.status}")
 
+async def fetch_options_chain_yahoofinance(
+    client: YahooFinanceClient, ticker: str
+) -> pd.DataFrame:
+    async def fetch(exp_date: int) -> Tuple[int, List[Dict]]:
+        url = f"https://query2.finance.yahoo.com/v7/finance/options/{ticker}?formatted=false&lang=en-US&region=US&date={exp_date}&straddle=true&corsDomain=finance.yahoo.com"
+        try:
+            json = await client.get_json(url)
+            return exp_date, json["optionChain"]["result"][0]["options"][0]["straddles"]
         except Exception as e:
             print(e)
-            return {}
+            return exp_date, []
 
-    async def get_promises(session: aiohttp.ClientSession):
-        # Option Chain Schema
-        """
-        type OptionChain = {
-            date (int epoch): Straddle
-        }
-        """
-        _, crumb = get_yahoofinance_download_auth("/v1/test/getcrumb", cj, True)
-        exp_dates = get_option_expiration_dates_yahoofinance(ticker, cj)
-        tasks = []
-        for exp_date in exp_dates:
-            curr_url = f"https://query2.finance.yahoo.com/v7/finance/options/{ticker}?formatted=true&crumb={crumb}&lang=en-US&region=US&date={exp_date}&straddle=true&corsDomain=finance.yahoo.com"
-            task = fetch(session, curr_url, exp_date, crumb)
-            tasks.append(task)
+    exp_dates = await fetch_option_expiration_dates_yahoofinance(client, ticker)
+    expiries = await asyncio.gather(*[fetch(exp_date) for exp_date in exp_dates])
+    return parse_option_chain(expiries)
 
-        return await asyncio.gather(*tasks)
 
+def get_options_chain_yahoofinance(
+    ticker: str,
+    raw_path: str = None,
+    cj: http.cookiejar = None,
+    big_wb=False,
+    scheduler: FetchScheduler = None,
+    store_snapshot=True,
+) -> pd.DataFrame:
     """
-    return List[Tuple(OptionChain, ExpDate)]
+    whole chain as one frame indexed by (expiration, strike) - see common/options.py
+    store_snapshot appends it to the option_chains snapshot store (common/option_snapshots.py),
+    raw_path writes a sheet per expiry (+ an "all" sheet with big_wb)
     """
 
-    async def run_fetch_all():
-        async with aiohttp.ClientSession() as session:
-            all_data = await get_promises(session)
-            return all_data
+    async def run_fetch_all() -> pd.DataFrame:
+        async with YahooFinanceClient(cj, scheduler=scheduler) as client:
+            return await fetch_options_chain_yahoofinance(client, ticker)
 
-    results = asyncio.run(run_fetch_all())
-    dfs = {}
-    for_big_wb = []
-
-    try:
-        for options_data, exp_date in results:
-            strike_prices = list(options_data.keys())
-            temp = []
-            for strike in strike_prices:
-                call_raw_dict = options_data[strike]["call"]
-                put_raw_dict = options_data[strike]["put"]
-
-                call_dict = {
-                    f"{key}_call": value
-                    for key, value in call_raw_dict.items()
-                    if key != "strike"
-                }
-                put_dict = {
-                    f"{key}_put": value
-                    for key, value in put_raw_dict.items()
-                    if key != "strike"
-                }
-                curr_strike_straddle_dict = {**call_dict, **put_dict}
-                curr_strike_straddle_dict["strike"] = (
-                    call_raw_dict["strike"]
-                    if call_raw_dict["strike"]
-                    else put_raw_dict["strike"]
-                )
+    as_of = datetime.now()
+    chain = asyncio.run(run_fetch_all())
 
-                print(curr_strike_straddle_dict)
-                temp.append(curr_strike_straddle_dict)
+    if store_snapshot and not chain.empty:
+        try:
+            write_chain_snapshot(ticker, chain, as_of)
+        except Exception as e:
+            print(e)
 
+    if raw_path:
+        try:
+            with pd.ExcelWriter(raw_path, engine="openpyxl") as writer:
+                pd.DataFrame().to_excel(writer, index=False)
+                for exp_date, df in option_chain_expiry_frames(chain).items():
+                    df.to_excel(
+                        writer, sheet_name=exp_date.strftime("%m-%d-%Y"), index=False
+                    )
                 if big_wb:
-                    copy_curr_strike_straddle_dict = curr_strike_straddle_dict.copy()
-                    copy_curr_strike_straddle_dict["expirationDate"] = exp_date
-                    for_big_wb.append(copy_curr_strike_straddle_dict)
-
-            curr_exp_straddle_df = pd.DataFrame(temp)
-            curr_exp_straddle_df.set_index("strike")
-            dfs[exp_date] = curr_exp_straddle_df
-
-        with pd.ExcelWriter(raw_path, engine="openpyxl") as writer:
-            pd.DataFrame().to_excel(writer, index=False)
-            for exp_date, df in dfs.items():
-                cols = list(df.columns)
-                last_price_index = cols.index("lastPrice_call")
-                cols.remove("strike")
-                cols.insert(last_price_index + 1, "strike")
-                df = df[cols]
-                df.to_excel(
-                    writer,
-                    sheet_name=f"{datetime.fromtimestamp(exp_date).strftime('%m-%d-%Y')}",
-                    index=False,
-                )
-
-            if big_wb:
-                big_df = pd.DataFrame(for_big_wb)
-                big_df.to_excel(writer, sheet_name="all", index=False)
-
-    except Exception as e:
-        print(e)
+                    chain.reset_index().to_excel(writer, sheet_name="all", index=False)
+        except Exception as e:
+            print(e)
 
-    return dfs
+    return chain
 
 
 def get_futures_chain(
@@ -1,25 +1,38 @@
 import time
 import os
 import http
-from typing import List
-import lxml.etree as ET_lxml
-import codecs
+import aiohttp
+import asyncio
+from typing import List, Dict
 import pandas as pd
 from multiprocessing import Process
 from datetime import date, datetime
-from openpyxl import Workbook
 
 from vanguard.vg import vg_build_summary_book
-from vanguard.vg_fund import vg_get_historical_nav_prices
-from vanguard.vg_holdings import vg_parallel_get_portfolio_data_api, ETFInfo, Asset
+from vanguard.vg_fund import vg_get_historical_nav_prices_async
+from vanguard.vg_holdings import (
+    vg_parallel_get_portfolio_data_api_async,
+    ETFInfo,
+    Asset,
+)
 from vanguard.vg_summary import vg_all_funds_data
 
 from blackrock.blk import blk_summary_book
-from blackrock.blk_fund import blk_get_fund_data
-
-from common.fund_flows import multi_fetch_fund_flow_data, fetch_new_bearer_token
-from common.yahoofinance import multi_download_historical_data_yahoofinance
-from common.treasuries import multi_download_year_treasury_par_yield_curve_rate
+from blackrock.blk_fund import blk_get_fund_data_async
+
+from common.fund_flows import (
+    multi_fetch_fund_flow_data,
+    multi_fetch_fund_flow_data_async,
+    fetch_new_bearer_token,
+)
+from common.yahoofinance import (
+    YahooFinanceClient,
+    multi_download_historical_data_yahoofinance_async,
+)
+from common.treasuries import multi_download_year_treasury_par_yield_curve_rate_async
+from common.scheduler import FetchScheduler
+from common.pipeline import Stage, run_pipeline
+from common.spreadsheetml import read_spreadsheetml
 
 
 def run_in_parallel(*fns):
@@ -32,6 +45,15 @@ def run_in_parallel(*fns):
         p.join()
 
 
+def get_fund_flow_bearer_token(cj: http.cookiejar = None) -> str:
+    try:
+        token = fetch_new_bearer_token(cj)
+        return token["fundApiKey"]
+    except Exception as e:
+        print(f"Fund Flow bearer token requeat failed: {str(e)}")
+        return "0QE2aa6trhK3hOmkf5zXwz6Riy7UWdk4V6HYw3UdZcRZV3myoV9MOfwNLL6FKHrpTN7IF7g12GSZ6r44jAfjte0B3APAaQdWRWZtW2qhYJrAXXwkpYJDFdkCng97prr7N4JAXkCI1zB7EiXrFEY8CIQclMLgQk2XHBZJiqJSIEgtWckHK3UPLfm12X9rhME9ac7gvcF3fWDo8A66X6RHXr3g9jzKeC62th75S1t6juvWjQYDCz65i7UlRfTVWDVV"
+
+
 def fund_flow_wrapper(
     tickers: List[str],
     from_date: date,
@@ -39,190 +61,226 @@ def fund_flow_wrapper(
     raw_path: str,
     cj: http.cookiejar = None,
 ):
-    try:
-        token = fetch_new_bearer_token(cj)
-        bearer = token["fundApiKey"]
-    except Exception as e:
-        bearer = "0QE2aa6trhK3hOmkf5zXwz6Riy7UWdk4V6HYw3UdZcRZV3myoV9MOfwNLL6FKHrpTN7IF7g12GSZ6r44jAfjte0B3APAaQdWRWZtW2qhYJrAXXwkpYJDFdkCng97prr7N4JAXkCI1zB7EiXrFEY8CIQclMLgQk2XHBZJiqJSIEgtWckHK3UPLfm12X9rhME9ac7gvcF3fWDo8A66X6RHXr3g9jzKeC62th75S1t6juvWjQYDCz65i7UlRfTVWDVV"
-        print(f"Fund Flow bearer token requeat failed: {str(e)}")
-
+    bearer = get_fund_flow_bearer_token(cj)
     data = multi_fetch_fund_flow_data(tickers, bearer, from_date, to_date, raw_path)
     return data
 
 
-def vg_data_refresh(
+def common_refresh_stages(
     tickers: List[str],
     from_date: date,
     to_date: date,
+    session: aiohttp.ClientSession,
+    scheduler: FetchScheduler,
+    client: YahooFinanceClient,
     cj: http.cookiejar = None,
     run_treasuries=True,
-):
+) -> List[Stage]:
     current_directory = os.getcwd()
 
-    df_yf_dict = multi_download_historical_data_yahoofinance(
-        tickers,
-        from_date,
-        to_date,
-        f"{current_directory}/yahoofinance",
-        cj,
-    )
+    async def yahoo_finance(_):
+        return await multi_download_historical_data_yahoofinance_async(
+            tickers,
+            from_date,
+            to_date,
+            client,
+            f"{current_directory}/yahoofinance",
+            incremental=True,
+        )
 
-    df_ff_dict = fund_flow_wrapper(
-        tickers,
-        from_date,
-        to_date,
-        f"{current_directory}/flows",
-        cj,
-    )
+    async def fund_flow(_):
+        bearer = await asyncio.to_thread(get_fund_flow_bearer_token, cj)
+        return await multi_fetch_fund_flow_data_async(
+            tickers,
+            bearer,
+            from_date,
+            to_date,
+            session,
+            scheduler,
+            f"{current_directory}/flows",
+            cj,
+        )
 
-    if run_treasuries:
+    async def treasuries(_):
         years = (
             [from_date.year, to_date.year]
             if from_date.year != to_date.year
             else [from_date.year]
         )
-        df_treasuries = multi_download_year_treasury_par_yield_curve_rate(
-            years, f"{current_directory}/treasuries", cj
+        return await multi_download_year_treasury_par_yield_curve_rate_async(
+            years, f"{current_directory}/treasuries", session, scheduler, cj=cj
         )
 
-    df_vg_holdings_dict = vg_parallel_get_portfolio_data_api(
-        [ETFInfo(t, Asset.fixed_income) for t in tickers],
-        cj,
-        f"{current_directory}/vanguard/vg_funds_holdings_clean_data",
-    )
+    stages = [Stage("yahoo_finance", yahoo_finance), Stage("fund_flow", fund_flow)]
+    if run_treasuries:
+        stages.append(Stage("treasuries", treasuries))
 
-    df_nav_dict = vg_get_historical_nav_prices(
-        tickers, f"{current_directory}/vanguard/vg_nav_data", cj
-    )
+    return stages
 
-    for ticker, flow in df_ff_dict.items():
-        print("Fund Flow Data Date: ", ticker, flow.pop())
 
-    return {
-        "yahoo_finance": df_yf_dict,
-        "fund_flow": df_ff_dict,
-        "treasuries": df_treasuries if run_treasuries else pd.DataFrame(),
-        "vg_holdings": df_vg_holdings_dict,
-        "vg_nav": df_nav_dict,
-    }
+def run_refresh(
+    build_stages, cj: http.cookiejar = None, scheduler: FetchScheduler = None
+) -> Dict[str, pd.DataFrame | Dict]:
+    # one loop, one connection pool, one scheduler for every source
+    async def run():
+        curr_scheduler = scheduler or FetchScheduler()
+        async with aiohttp.ClientSession() as session:
+            async with YahooFinanceClient(
+                cj, session=session, scheduler=curr_scheduler
+            ) as client:
+                return await run_pipeline(
+                    build_stages(session, curr_scheduler, client)
+                )
 
+    results = asyncio.run(run())
 
-def blk_data_refresh(
+    for ticker, flow in results.get("fund_flow", {}).items():
+        if flow:
+            print("Fund Flow Data Date: ", ticker, flow[-1])
+
+    return results
+
+
+def vg_data_refresh(
     tickers: List[str],
     from_date: date,
     to_date: date,
     cj: http.cookiejar = None,
     run_treasuries=True,
+    summary_book_path: str = None,
+    scheduler: FetchScheduler = None,
 ):
     current_directory = os.getcwd()
 
-    df_yf_dict = multi_download_historical_data_yahoofinance(
-        tickers,
-        from_date,
-        to_date,
-        f"{current_directory}/yahoofinance",
-        cj,
-    )
+    def build_stages(session, scheduler, client) -> List[Stage]:
+        async def vg_holdings(_):
+            return await vg_parallel_get_portfolio_data_api_async(
+                [ETFInfo(t, Asset.fixed_income) for t in tickers],
+                cj,
+                session,
+                scheduler,
+                f"{current_directory}/vanguard/vg_funds_holdings_clean_data",
+            )
 
-    df_ff_dict = fund_flow_wrapper(
-        tickers,
-        from_date,
-        to_date,
-        f"{current_directory}/flows",
-        cj,
-    )
+        async def vg_nav(_):
+            return await vg_get_historical_nav_prices_async(
+                tickers,
+                session,
+                scheduler,
+                f"{current_directory}/vanguard/vg_nav_data",
+                cj=cj,
+            )
 
-    if run_treasuries:
-        years = (
-            [from_date.year, to_date.year]
-            if from_date.year != to_date.year
-            else [from_date.year]
-        )
-        df_treasuries = multi_download_year_treasury_par_yield_curve_rate(
-            years, f"{current_directory}/treasuries", cj
+        stages = common_refresh_stages(
+            tickers, from_date, to_date, session, scheduler, client, cj, run_treasuries
         )
+        stages += [Stage("vg_holdings", vg_holdings), Stage("vg_nav", vg_nav)]
 
-    df_fund_data = blk_get_fund_data(
-        tickers, f"{current_directory}/blackrock/blk_funds_data"
-    )
+        # summary book only needs its own inputs - doesn't wait on treasuries
+        if summary_book_path:
+            stages += [
+                Stage("vg_funds", lambda _: vg_all_funds_data()),
+                Stage(
+                    "vg_summary_book",
+                    lambda _: vg_build_summary_book(tickers, summary_book_path),
+                    ["yahoo_finance", "fund_flow", "vg_holdings", "vg_nav", "vg_funds"],
+                ),
+            ]
+
+        return stages
 
-    for ticker, flow in df_ff_dict.items():
-        print("Fund Flow Data Date: ", ticker, flow.pop())
+    results = run_refresh(build_stages, cj, scheduler)
 
     return {
-        "yahoo_finance": df_yf_dict,
-        "fund_flow": df_ff_dict,
-        "treasuries": df_treasuries if run_treasuries else pd.DataFrame(),
-        "blk_fund_data": df_fund_data,
+        "yahoo_finance": results.get("yahoo_finance", {}),
+        "fund_flow": results.get("fund_flow", {}),
+        "treasuries": results.get("treasuries", pd.DataFrame()),
+        "vg_holdings": results.get("vg_holdings", {}),
+        "vg_nav": results.get("vg_nav", {}),
     }
 
 
-def fix_blk_excel_workbooks(old_path: str, new_path: str) -> Workbook:
-    in_file = open(old_path, "rb")
-    data = in_file.read()
-    in_file.close()
-    bytes = data.replace(codecs.BOM_UTF8, b"")
+def blk_data_refresh(
+    tickers: List[str],
+    from_date: date,
+    to_date: date,
+    cj: http.cookiejar = None,
+    run_treasuries=True,
+    build_summary_book=False,
+    scheduler: FetchScheduler = None,
+):
+    current_directory = os.getcwd()
+
+    def build_stages(session, scheduler, client) -> List[Stage]:
+        async def blk_fund_data(_):
+            return await blk_get_fund_data_async(
+                tickers,
+                f"{current_directory}/blackrock/blk_funds_data",
+                session,
+                scheduler,
+                cj,
+            )
 
-    ns = {"ss": "urn:schemas-microsoft-com:office:spreadsheet"}
+        stages = common_refresh_stages(
+            tickers, from_date, to_date, session, scheduler, client, cj, run_treasuries
+        )
+        stages.append(Stage("blk_fund_data", blk_fund_data))
+
+        if build_summary_book:
+            stages.append(
+                Stage(
+                    "blk_summary_book",
+                    lambda _: blk_summary_book(tickers),
+                    ["yahoo_finance", "fund_flow", "blk_fund_data"],
+                )
+            )
 
-    xml_string = bytes.decode("utf-8")
-    parser = ET_lxml.XMLParser(recover=True)
-    root = ET_lxml.ElementTree(ET_lxml.fromstring(xml_string, parser=parser))
+        return stages
 
-    workbook = Workbook()
-    workbook.remove(workbook.active)
+    results = run_refresh(build_stages, cj, scheduler)
 
-    for ws in root.findall("ss:Worksheet", namespaces=ns):
-        try:
-            ws_title = ws.attrib.get(
-                "{urn:schemas-microsoft-com:office:spreadsheet}Name"
-            )
-            worksheet = workbook.create_sheet(title=ws_title)
+    return {
+        "yahoo_finance": results.get("yahoo_finance", {}),
+        "fund_flow": results.get("fund_flow", {}),
+        "treasuries": results.get("treasuries", pd.DataFrame()),
+        "blk_fund_data": results.get("blk_fund_data", []),
+        "blk_summary_book": results.get("blk_summary_book", {}),
+    }
 
-            for table in ws.findall("ss:Table", namespaces=ns):
-                for row in table.findall("ss:Row", namespaces=ns):
-                    row_cells = []
 
-                    for cell in row.findall("ss:Cell", namespaces=ns):
-                        cell_data = cell.find("ss:Data", namespaces=ns)
-                        cell_value = cell_data.text if cell_data is not None else ""
-                        row_cells.append(cell_value)
+def fix_blk_excel_workbooks(old_path: str, new_path: str) -> Dict[str, pd.DataFrame]:
+    with open(old_path, "rb") as f:
+        dfs = read_spreadsheetml(f.read(), header=None)
 
-                    worksheet.append(row_cells)
-        except:
-            continue
+    with pd.ExcelWriter(new_path) as writer:
+        for sheet, df in dfs.items():
+            df.to_excel(writer, sheet_name=sheet, index=False, header=False)
 
-    workbook.save(new_path)
-    return workbook
+    return dfs
 
 
 if __name__ == "__main__":
     t0 = time.time()
 
-    df = vg_all_funds_data(r'C:\Users\chris\trade\curr_pos\vanguard\vg_funds_info')
-    print(df)
-
     from_date = datetime(2023, 1, 1)
     to_date = datetime.today()
     tickers = ["VGLT", "VGIT", "VGSH", "EDV"]
-    dict = vg_data_refresh(tickers, from_date, to_date)
-    print(dict)
-
-    vg_build_summary_book(
+    dict = vg_data_refresh(
         tickers,
-        r"C:\Users\chris\trade\curr_pos\vanguard\vg_summary_book\vg_summary_book.xlsx",
-        r"C:\Users\chris\trade\curr_pos\vanguard\vg_funds_info\2023-11-14_vg_fund_info.xlsx",
+        from_date,
+        to_date,
+        summary_book_path=r"C:\Users\chris\trade\curr_pos\vanguard\vg_summary_book\vg_summary_book.xlsx",
     )
+    print(dict)
 
     from_date = datetime(2023, 1, 1)
     to_date = datetime.today()
     tickers = ["CLOA", "BRLN"]
-    dict = blk_data_refresh(tickers, from_date, to_date, run_treasuries=False)
+    dict = blk_data_refresh(
+        tickers, from_date, to_date, run_treasuries=False, build_summary_book=True
+    )
     print(dict)
 
-    df = blk_summary_book(["BRLN"])
-    print(df)
-
     # old_path = r'C:\Users\chris\trade\curr_pos\blackrock\blk_funds_data\iShares-iBoxx--High-Yield-Corporate-Bond-ETF_fund.xls'
     # new_path = (
     #     r"C:\Users\chris\trade\curr_pos\blackrock\blk_funds_data/HGY_blk_fund.xlsx"
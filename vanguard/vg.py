@@ -1,14 +1,11 @@
 import http
-import re
-import os
-import datetime
 import pandas as pd
 
-from typing import List, Dict
+from typing import List, Dict, Tuple
 
-from common.Bond import Bond, ZeroCouponBond
-from common.fund_flows import get_fund_flow_file_path_by_ticker
-from common.yahoofinance import get_yahoofinance_data_file_path_by_ticker
+from common.Bond import ZeroCouponBond, VectorizedBond
+from common.store import read_frame, has_frame
+from common.aggregation import aggregate_fund_metrics, concat_fund_holdings
 
 from vanguard.vg_fund import vg_daily_data
 from vanguard.vg_holdings import (
@@ -18,15 +15,8 @@ from vanguard.vg_holdings import (
 )
 
 
-def get_holding_file_path_by_ticker(ticker: str, cj: http.cookiejar = None) -> str:
-    files = sorted(
-        os.listdir(
-            f"{os.path.dirname(os.path.realpath(__file__))}/vg_funds_holdings_clean_data"
-        ),
-    )
-    holdings = [x for x in files if x.split("_")[1].lower() == ticker.lower()]
-
-    if len(holdings) == 0:
+def get_holdings_by_ticker(ticker: str, cj: http.cookiejar = None) -> pd.DataFrame:
+    if not has_frame("vanguard_holdings", ticker):
         print(
             "RUNNING DATA FETCHER - WHAT ASSET CLASS IS THIS? Fixed Income: 1 or Equity: 2"
         )
@@ -38,206 +28,96 @@ def get_holding_file_path_by_ticker(ticker: str, cj: http.cookiejar = None) -> s
             ticker=ticker,
             asset_class=Asset.fixed_income if int(user_input) == 1 else Asset.equity,
         )
-        vg_single_get_portfolio_data_api(
-            option,
-            cj,
-            f"{os.path.dirname(os.path.realpath(__file__))}/vg_funds_holdings_clean_data",
-        )
-        holdings = [x for x in files if x.find(ticker) != 1]
-
-    def date_from_filename(filename):
-        try:
-            date_str = re.search(r"\d{2}-\d{2}-\d{4}", filename).group(0)
-            return datetime.datetime.strptime(date_str, "%m-%d-%Y")
-        except Exception as e:
-            print("Error in date in filename search")
-            print(e)
-            date_str = datetime.datetime.today().strftime("%m-%d-%Y")
-            return datetime.datetime.strptime(date_str, "%m-%d-%Y")
-
-    file_name = sorted(holdings, key=date_from_filename).pop()
-    return f"{os.path.dirname(os.path.realpath(__file__))}/vg_funds_holdings_clean_data/{file_name}"
-
-
-def replace_non_integers_with_zero(df):
-    for col in df.columns:
-        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype(float)
-    return df
+        vg_single_get_portfolio_data_api(option, cj)
+
+    # most recent as-of date
+    return read_frame("vanguard_holdings", ticker)
+
+
+# summary sheet name -> holdings column, averaged by percentWeight
+VG_WEIGHTED_METRICS = {
+    "Weighted Avg Maturity": "maturityDate",
+    "Weighted Avg Coupon": "couponRate",
+    "Weighted Avg YTM": "YTM",
+    "Weighted Avg Current Yield": "currentYield",
+    "Weighted Avg Mac Duration": "macaulayDuration",
+    "Weighted Avg Mod Duration": "modifiedDuration",
+    "Weighted Avg Convexity": "convexity",
+}
+VG_SUMMED_METRICS = {
+    "Face Amount": "faceAmount",
+    "Total Market Value": "marketValue",
+}
+
+
+def vg_holdings_summary(holdings: Dict[str, pd.DataFrame]) -> pd.DataFrame:
+    # every fund in one pass - one row per ticker, funds without holdings get zeros
+    return aggregate_fund_metrics(
+        concat_fund_holdings(holdings, "ticker"),
+        VG_WEIGHTED_METRICS,
+        VG_SUMMED_METRICS,
+        fund_col="ticker",
+    ).reindex(list(holdings), fill_value=0)
 
 
 def vg_holdings_summary_sheet(df: pd.DataFrame, ticker: str) -> Dict[str, int]:
-    copy = df.copy()
-    copy = replace_non_integers_with_zero(copy)
-    
-    print(copy)
-
-    temp_df = pd.DataFrame()
-    
-    temp_df["Weighted Maturity"] = copy.apply(
-        lambda row: row["percentWeight"] * row["maturityDate"],
-        axis=1,
-    )
-    temp_df["Weighted Coupon"] = copy.apply(
-        lambda row: row["percentWeight"] * row["couponRate"],
-        axis=1,
-    )
-    temp_df["Weighted YTM"] = copy.apply(
-        lambda row: row["percentWeight"] * row["YTM"],
-        axis=1,
-    )
-
-    if ticker != "EDV":
-        temp_df["Weighted Current Yield"] = copy.apply(
-            lambda row: row["percentWeight"] * row["currentYield"],
-            axis=1,
-        )
-    else:
-        temp_df["Weighted Current Yield"] = copy.apply(
-            lambda row: 0 * 0,
-            axis=1,
-        )
-
-    temp_df["Weighted Mac Duration"] = copy.apply(
-        lambda row: row["percentWeight"] * row["macaulayDuration"],
-        axis=1,
-    )
-    temp_df["Weighted Mod Duration"] = copy.apply(
-        lambda row: row["percentWeight"] * row["modifiedDuration"],
-        axis=1,
-    )
-    temp_df["Weighted Convexity"] = copy.apply(
-        lambda row: row["percentWeight"] * row["convexity"],
-        axis=1,
-    )
-    
-    print(temp_df)
-    
-    summary_dict = {}
-    summary_dict["Weighted Avg Maturity"] = temp_df["Weighted Maturity"].sum() / 100
-    summary_dict["Weighted Avg Coupon"] = temp_df["Weighted Coupon"].sum() / 100
-    summary_dict["Weighted Avg YTM"] = temp_df["Weighted YTM"].sum() / 100
-    summary_dict["Weighted Avg Current Yield"] = (
-        temp_df["Weighted Current Yield"].sum() / 100
-    )
-    summary_dict["Weighted Avg Mac Duration"] = (
-        temp_df["Weighted Mac Duration"].sum() / 100
-    )
-    summary_dict["Weighted Avg Mod Duration"] = (
-        temp_df["Weighted Mod Duration"].sum() / 100
-    )
-    summary_dict["Weighted Avg Convexity"] = temp_df["Weighted Convexity"].sum() / 100
-    summary_dict["Face Amount"] = df["faceAmount"].sum()
-    summary_dict["Total Market Value"] = df["marketValue"].sum()
-    summary_dict["Holdings Count"] = df.shape[0]
-
-    return summary_dict
+    return vg_holdings_summary({ticker: df}).loc[ticker].to_dict()
 
 
 def vg_build_summary_book(
     tickers: List[str],
     full_summary_book_path: str,
     all_fund_path: str = None,
+    shares_outstanding: Dict[str, Tuple[str, int]] = None,
 ):
-    # if not all_fund_path:
-    #     pass
-
     # this changes every month-ish
-    all_funds_summary_df = pd.read_excel(all_fund_path)
+    all_funds_summary_df = (
+        pd.read_excel(all_fund_path)
+        if all_fund_path
+        else read_frame("vanguard_funds", "filtered")
+    )
     all_funds_summary_dict = all_funds_summary_df.to_dict(orient="records")
 
-    ticker_file_paths = [get_holding_file_path_by_ticker(x) for x in tickers]
     ticker_holding_dfs = {
-        tickers[i]: [pd.read_excel(x), pd.DataFrame()]
-        for i, x in enumerate(ticker_file_paths)
+        ticker: [get_holdings_by_ticker(ticker), pd.DataFrame()] for ticker in tickers
     }
 
     for ticker in ticker_holding_dfs.keys():
         df = ticker_holding_dfs[ticker][0]
-        df["couponRate"] = df["couponRate"].apply(lambda x: x / 100)
-        df["maturityDate"] = df["maturityDate"].apply(Bond.calc_time_to_maturity)
+        df["couponRate"] = df["couponRate"] / 100
+        df["maturityDate"] = VectorizedBond.calc_time_to_maturity(df["maturityDate"])
 
         if ticker == "EDV":
-            df["YTM"] = df.apply(
-                lambda row: ZeroCouponBond.calc_YTM(
-                    row["faceAmount"], row["marketValue"], row["maturityDate"]
-                ),
-                axis=1,
+            df["YTM"] = ZeroCouponBond.calc_YTM(
+                df["faceAmount"], df["marketValue"], df["maturityDate"]
             )
-            df["macaulayDuration"] = df.apply(
-                lambda row: ZeroCouponBond.calc_macaulay_duration(row["maturityDate"]),
-                axis=1,
+            df["macaulayDuration"] = ZeroCouponBond.calc_macaulay_duration(
+                df["maturityDate"]
             )
-            df["modifiedDuration"] = df.apply(
-                lambda row: ZeroCouponBond.calc_modified_duration(
-                    row["maturityDate"], row["YTM"]
-                ),
-                axis=1,
+            df["modifiedDuration"] = ZeroCouponBond.calc_modified_duration(
+                df["maturityDate"], df["YTM"]
             )
-            df["convexity"] = df.apply(
-                lambda row: ZeroCouponBond.calc_convexity(
-                    row["maturityDate"], row["YTM"]
-                ),
-                axis=1,
+            df["convexity"] = ZeroCouponBond.calc_convexity(
+                df["maturityDate"], df["YTM"]
             )
-            df["marketPrice"] = df.apply(
-                lambda row: ZeroCouponBond.calc_market_price(
-                    row["faceAmount"], row["YTM"], row["maturityDate"]
-                ),
-                axis=1,
+            df["marketPrice"] = ZeroCouponBond.calc_market_price(
+                df["faceAmount"], df["YTM"], df["maturityDate"]
             )
         else:
-            df["YTM"] = df.apply(
-                lambda row: Bond.calc_YTM(
-                    row["faceAmount"],
-                    row["couponRate"],
-                    row["marketValue"],
-                    row["maturityDate"],
-                    n=1,
-                ),
-                axis=1,
-            )
-            df["currentYield"] = df.apply(
-                lambda row: Bond.calc_current_yield(
-                    row["faceAmount"], row["couponRate"], row["marketValue"]
-                ),
-                axis=1,
-            )
-            df["macaulayDuration"] = df.apply(
-                lambda row: Bond.calc_macaulay_duration(
-                    row["faceAmount"],
-                    row["couponRate"],
-                    row["marketValue"],
-                    row["maturityDate"],
-                    row["YTM"],
-                    n=1,
-                ),
-                axis=1,
-            )
-            df["modifiedDuration"] = df.apply(
-                lambda row: Bond.calc_modifed_duration(
-                    row["faceAmount"],
-                    row["couponRate"],
-                    row["marketValue"],
-                    row["maturityDate"],
-                    n=1,
-                ),
-                axis=1,
-            )
-            df["convexity"] = df.apply(
-                lambda row: Bond.calc_convexity(
-                    row["faceAmount"],
-                    row["couponRate"],
-                    row["marketValue"],
-                    row["maturityDate"],
-                    n=1,
-                ),
-                axis=1,
+            analytics = VectorizedBond.calc_analytics(
+                df["faceAmount"].to_numpy(dtype=float),
+                df["couponRate"].to_numpy(dtype=float),
+                df["marketValue"].to_numpy(dtype=float),
+                df["maturityDate"].to_numpy(dtype=float),
+                n=1,
             )
+            for col, values in analytics.to_columns().items():
+                df[col] = values
 
-        fund_data_path = get_yahoofinance_data_file_path_by_ticker(ticker)
-        fund_flow_path = get_fund_flow_file_path_by_ticker(ticker)
+        # ticker -> (starting date, shares) skips the outstanding shares lookup
+        starting_date, curr_shares = (shares_outstanding or {}).get(ticker, (None, None))
         ticker_holding_dfs[ticker][1] = vg_daily_data(
-            ticker, fund_data_path, fund_flow_path
+            ticker, starting_date=starting_date, shares_outstanding=curr_shares
         )
 
     holdings_dict = [x for x in all_funds_summary_dict if x["ticker"] in tickers]
@@ -251,13 +131,13 @@ def vg_build_summary_book(
         pd.DataFrame().to_excel(writer, index=False)
         # summary_df.to_excel(writer, sheet_name="summary", index=False)
 
-        temp_dict = {}
         for ticker, dfs in ticker_holding_dfs.items():
-            temp_dict[ticker] = vg_holdings_summary_sheet(dfs[0], ticker)
             dfs[0].to_excel(writer, sheet_name=f"{ticker}_holdings", index=False)
             dfs[1].to_excel(writer, sheet_name=f"{ticker}_daily")
 
-        df_holding_summary = pd.DataFrame.from_dict(temp_dict, orient="index")
+        df_holding_summary = vg_holdings_summary(
+            {ticker: dfs[0] for ticker, dfs in ticker_holding_dfs.items()}
+        )
         df_holding_summary = df_holding_summary.T
         df_holding_summary.index = df_holding_summary.index.set_names(["ticker"])
         df_holding_summary = df_holding_summary.reset_index().rename(
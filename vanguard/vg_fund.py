@@ -1,4 +1,3 @@
-import requests
 import pandas as pd
 import http
 import aiohttp
@@ -6,12 +5,28 @@ import asyncio
 import webbrowser
 import os
 import urllib.parse
-import bs4
+import lxml.html
 import numpy as np
 import time
 from datetime import datetime, timedelta, date
 from typing import List, Dict, Tuple
 
+from common.store import (
+    write_frame,
+    read_frame,
+    has_frame,
+    read_metadata,
+    write_metadata,
+)
+from common.scheduler import FetchScheduler
+from common.http_cache import cached_get, cached_fetch
+from common.symbology import get_symbology
+from common.fund_flows import (
+    get_fund_flow_data_by_ticker,
+    calc_estimated_shares_outstanding,
+)
+from common.yahoofinance import get_yahoofinance_data_by_ticker
+
 
 def vg_get_headers(
     auth: str, path: str, referer: str, cj: http.cookiejar = None, open_chrome=False
@@ -57,6 +72,11 @@ def vg_get_headers(
 
 
 def vg_ticker_to_ticker_id(ticker: str, cj: http.cookiejar = None) -> int | None:
+    symbology = get_symbology()
+    fund_id = symbology.vg_fund_id(ticker)
+    if fund_id:
+        return fund_id
+
     try:
         url = f"https://investor.vanguard.com/investment-products/etfs/profile/api/{ticker}/profile"
         headers = vg_get_headers(
@@ -65,15 +85,21 @@ def vg_ticker_to_ticker_id(ticker: str, cj: http.cookiejar = None) -> int | None
             url,
             cj,
         )
-        res = requests.get(url, headers=headers)
-        json = res.json()
-        return json["fundProfile"]["fundId"]
+        res = cached_get(url, headers=headers)
+        fund_id = res.json()["fundProfile"]["fundId"]
+        symbology.update([{"ticker": ticker, "issuer": "vanguard", "vg_fund_id": fund_id}])
+        symbology.save()
+        return fund_id
     except Exception as e:
         print(e)
         return None
 
 
-def vg_multi_vol_analytics(ticker: str, cj: http.cookiejar = None):
+def vg_multi_vol_analytics(
+    ticker: str, cj: http.cookiejar = None, scheduler: FetchScheduler = None
+):
+    scheduler = scheduler or FetchScheduler()
+
     async def vg_fetch_vol(
         session: aiohttp.ClientSession, fund_id: int
     ) -> Dict[str, int]:
@@ -84,9 +110,9 @@ def vg_multi_vol_analytics(ticker: str, cj: http.cookiejar = None):
             url,
             cj,
         )
-        async with session.get(url, headers=headers) as res:
-            json = await res.json()
-            return {key: json[key]["value"] for key in json}
+        res = await cached_fetch(session, scheduler, url, headers=headers)
+        json = res.json()
+        return {key: json[key]["value"] for key in json}
 
     async def vg_fetch_risk(session: aiohttp.ClientSession, fund_id: int):
         url = f"https://advisors.vanguard.com/web/ecs/fpp-fas-product-details/risk-data/{fund_id}"
@@ -96,8 +122,8 @@ def vg_multi_vol_analytics(ticker: str, cj: http.cookiejar = None):
             url,
             cj,
         )
-        async with session.get(url, headers=headers) as res:
-            return await res.json()
+        res = await cached_fetch(session, scheduler, url, headers=headers)
+        return res.json()
 
     async def get_promises(session: aiohttp.ClientSession, fund_id: int):
         tasks = [vg_fetch_vol(session, fund_id), vg_fetch_risk(session, fund_id)]
@@ -116,12 +142,13 @@ def vg_multi_vol_analytics(ticker: str, cj: http.cookiejar = None):
     return copy
 
 
-def vg_multi_ticker_to_ticker_id(
-    tickers: List[str], cj: http.cookiejar = None
+async def vg_multi_ticker_to_ticker_id_async(
+    tickers: List[str],
+    session: aiohttp.ClientSession,
+    scheduler: FetchScheduler,
+    cj: http.cookiejar = None,
 ) -> Dict[str, int]:
-    async def fetch(
-        session: aiohttp.ClientSession, url: str, ticker: int
-    ) -> pd.DataFrame:
+    async def fetch(url: str, ticker: str) -> int:
         try:
             headers = vg_get_headers(
                 "investor.vanguard.com",
@@ -129,34 +156,44 @@ def vg_multi_ticker_to_ticker_id(
                 url,
                 cj,
             )
-            async with session.get(url, headers=headers) as response:
-                if response.status == 200:
-                    res = requests.get(url, headers=headers)
-                    json = res.json()
-                    return json["fundProfile"]["fundId"]
-                else:
-                    raise Exception(f"Bad Status: {response.status}")
+            res = await cached_fetch(session, scheduler, url, headers=headers)
+            return res.json()["fundProfile"]["fundId"]
         except Exception as e:
             print(e)
             return -1
 
-    async def get_promises(session: aiohttp.ClientSession):
-        tasks = []
-        for ticker in tickers:
-            curr_url = f"https://investor.vanguard.com/investment-products/etfs/profile/api/{ticker}/profile"
-            task = fetch(session, curr_url, ticker)
-            tasks.append(task)
+    # only tickers the symbology index hasn't seen go over the wire
+    symbology = get_symbology()
+    fund_ids = {ticker: symbology.vg_fund_id(ticker) for ticker in tickers}
+    misses = [ticker for ticker, fund_id in fund_ids.items() if not fund_id]
 
-        return await asyncio.gather(*tasks)
+    tasks = []
+    for ticker in misses:
+        curr_url = f"https://investor.vanguard.com/investment-products/etfs/profile/api/{ticker}/profile"
+        tasks.append(fetch(curr_url, ticker))
 
-    async def run_fetch_all() -> List[pd.DataFrame]:
-        async with aiohttp.ClientSession() as session:
-            all_data = await get_promises(session)
-            return all_data
+    result = await asyncio.gather(*tasks)
+    fund_ids.update(zip(misses, result))
+    symbology.update(
+        {"ticker": ticker, "issuer": "vanguard", "vg_fund_id": fund_id}
+        for ticker, fund_id in zip(misses, result)
+        if fund_id != -1
+    )
+    symbology.save()
 
-    result = asyncio.run(run_fetch_all())
+    return fund_ids
 
-    return dict(zip(tickers, result))
+
+def vg_multi_ticker_to_ticker_id(
+    tickers: List[str], cj: http.cookiejar = None, scheduler: FetchScheduler = None
+) -> Dict[str, int]:
+    async def run_fetch_all() -> Dict[str, int]:
+        async with aiohttp.ClientSession() as session:
+            return await vg_multi_ticker_to_ticker_id_async(
+                tickers, session, scheduler or FetchScheduler(), cj
+            )
+
+    return asyncio.run(run_fetch_all())
 
 
 def vg_get_pcf(
@@ -174,7 +211,7 @@ def vg_get_pcf(
             url,
             cj,
         )
-        res = requests.get(url, headers=headers)
+        res = cached_get(url, headers=headers)
         holdings = res.json()["holding"]
         df = pd.DataFrame(holdings)
         if raw_path:
@@ -204,7 +241,34 @@ def vg_get_etf_inception_date(
             url,
             cj,
         )
-        res = requests.get(url, headers=headers)
+        res = cached_get(url, headers=headers)
+        json = res.json()
+        inception_date = datetime.strptime(
+            str(json["fundProfile"]["inceptionDate"]).split("T")[0], "%Y-%m-%d"
+        )
+        return inception_date.strftime("%m-%d-%Y")
+
+    except Exception as e:
+        print(e)
+        return None
+
+
+async def vg_get_etf_inception_date_async(
+    ticker: str,
+    session: aiohttp.ClientSession,
+    scheduler: FetchScheduler,
+    cj: http.cookiejar = None,
+) -> str:
+    # same profile endpoint as the fund id lookup, so usually a cache hit
+    try:
+        url = f"https://investor.vanguard.com/investment-products/etfs/profile/api/{ticker}/profile"
+        headers = vg_get_headers(
+            "investor.vanguard.com",
+            f"/investment-products/etfs/profile/api/{ticker}/profile",
+            url,
+            cj,
+        )
+        res = await cached_fetch(session, scheduler, url, headers=headers)
         json = res.json()
         inception_date = datetime.strptime(
             str(json["fundProfile"]["inceptionDate"]).split("T")[0], "%Y-%m-%d"
@@ -254,166 +318,269 @@ def is_valid_date(date_string, format_string="%m-%d-%Y") -> bool:
         return False
 
 
+def vg_parse_nav_table(html_string: str) -> List[Dict[str, str]]:
+    # third table on the page, price rows alternate between the "wr" and "ar" classes
+    tree = lxml.html.fromstring(html_string)
+    tables = tree.xpath("//table")
+    if len(tables) < 3:
+        return []
+
+    rows = tables[2].xpath(
+        ".//tr[contains(concat(' ', normalize-space(@class), ' '), ' wr ')"
+        " or contains(concat(' ', normalize-space(@class), ' '), ' ar ')]"
+    )
+    list = []
+    for row in rows:
+        cols = row.findall("td")
+        if len(cols) < 2:
+            continue
+
+        nav_date = cols[0].text_content().strip()
+        price = cols[1].text_content().strip().replace(",", "")
+        if "$" not in price or not is_valid_date(nav_date.replace("/", "-")):
+            continue
+
+        list.append({"date": nav_date, "navPrice": price})
+
+    return list
+
+
+def merge_date_intervals(intervals: List[List[date]]) -> List[List[date]]:
+    # inclusive [start, end] day intervals - touching or overlapping ones collapse
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1] + timedelta(days=1):
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+
+    return merged
+
+
+def missing_date_intervals(
+    start: date, end: date, covered: List[List[date]]
+) -> List[List[date]]:
+    missing = []
+    curr = start
+    for covered_start, covered_end in merge_date_intervals(covered):
+        if covered_end < curr:
+            continue
+        if covered_start > end:
+            break
+        if covered_start > curr:
+            missing.append([curr, covered_start - timedelta(days=1)])
+        curr = covered_end + timedelta(days=1)
+
+    if curr <= end:
+        missing.append([curr, end])
+
+    return missing
+
+
+def merge_nav_frames(existing_df: pd.DataFrame, rows: List[Dict[str, str]]) -> pd.DataFrame:
+    df = pd.concat([existing_df, pd.DataFrame(rows)], ignore_index=True)
+    if df.empty:
+        return df
+
+    # keep the stored mm/dd/yyyy strings, sort on the parsed date
+    dates = pd.to_datetime(df["date"], format="%m/%d/%Y")
+    df = df.assign(_date=dates).drop_duplicates(subset="_date", keep="last")
+    df = df.sort_values("_date", kind="mergesort")
+
+    return df.drop(columns="_date").reset_index(drop=True)
+
+
 # custom_start_date format: "%m-%d-%Y"
-def vg_get_historical_nav_prices(
+async def vg_get_historical_nav_prices_async(
     tickers: List[str],
+    session: aiohttp.ClientSession,
+    scheduler: FetchScheduler,
     raw_path: str = None,
     fetch_from_inception=False,
     cj: http.cookiejar = None,
+    make_xlsx=False,
+    max_windows: int = 16,
 ) -> dict[str, pd.DataFrame]:
-    async def fetch(
-        session: aiohttp.ClientSession,
-        url: str,
-        ticker: str,
-        existing_df: pd.DataFrame,
-    ) -> pd.DataFrame:
+    """
+    windows already in the store (tracked as date intervals in vanguard_nav/_meta.json) are never requested again -
+    only the gaps between inception and today get split into 365 day windows and fetched,
+    a window only counts as stored once it returned nav rows
+    """
+    window_pool = asyncio.Semaphore(max_windows)
+
+    async def fetch(url: str, ticker: str, window: List[date]) -> Dict:
         try:
             referer = url.split(".com")[1]
             headers = vg_get_headers("personal.vanguard.com", referer, url, cj)
-            async with session.get(url, headers=headers) as response:
-                if response.status == 200:
-                    html_string = await response.text()
-                    soup = bs4.BeautifulSoup(html_string, "html.parser")
-
-                    def vg_table_html_filter_class(tag):
-                        return (
-                            tag.name == "tr"
-                            and ("class" in tag.attrs)
-                            and ("wr" in tag["class"] or "ar" in tag["class"])
-                        )
-
-                    tbody = soup.findAll("table")[2].findAll(vg_table_html_filter_class)
-                    list = []
-                    for row in tbody:
-                        try:
-                            cols = row.find_all("td")
-                            if len(cols) >= 2:
-                                date = cols[0].get_text(strip=True)
-                                price = cols[1].get_text(strip=True).replace(",", "")
-
-                                if "$" not in str(price) or not is_valid_date(
-                                    str(date).replace("/", "-")
-                                ):
-                                    continue
-
-                                list.append({"date": date, "navPrice": price})
-
-                        except Exception as e:
-                            print(e)
-                            continue
-
-                    return {"ticker": ticker, "data": list, "existing": existing_df}
-
-                else:
-                    raise Exception(f"Bad Status: {response.status}")
-        except Exception as e:
-            print(e)
-            return []
-
-    async def get_promises(
-        session: aiohttp.ClientSession,
-        fund_ids: Dict[str, int],
-    ):
-        tasks = []
-        for ticker, fund_id in fund_ids.items():
-            existing_df = pd.DataFrame()
-            # only update by most recent week - no need to fetch since inception - if dne then fetch from inception
-            if (
-                os.path.exists(f"{raw_path}/{ticker}_nav_prices.xlsx")
-                and not fetch_from_inception
-            ):
-                existing_df = pd.read_excel(f"{raw_path}/{ticker}_nav_prices.xlsx")
-                inception_date_str = str(existing_df["date"].iloc[-1]).replace("/", "-")
-            else:
-                inception_date_str = vg_get_etf_inception_date(ticker, cj, None)
-
-            today_date_str = datetime.today().strftime("%m-%d-%Y")
-            targets = create_12_month_periods(inception_date_str, today_date_str)
-            for date in targets:
-                begin, end = [urllib.parse.quote_plus(x) for x in date]
-                curr_url = f"https://personal.vanguard.com/us/funds/tools/pricehistorysearch?radio=1&results=get&FundType=ExchangeTradedShares&FundIntExt=INT&FundId={fund_id}&fundName=0930&radiobutton2=1&beginDate={begin}&endDate={end}&year=#res"
+            # a page without nav rows (error/login page) is a failed fetch - never cached, window stays missing
+            parsed: Dict[str, List[Dict[str, str]]] = {}
 
-                print(begin, end, curr_url)
+            def validate(res) -> bool:
+                parsed["rows"] = vg_parse_nav_table(res.text)
+                return bool(parsed["rows"])
 
-                task = fetch(session, curr_url, ticker, existing_df)
-                tasks.append(task)
+            async with window_pool:
+                await cached_fetch(
+                    session, scheduler, url, headers=headers, validate=validate
+                )
+            return {"ticker": ticker, "data": parsed["rows"], "window": window}
 
-        return await asyncio.gather(*tasks)
+        except Exception as e:
+            print(e)
+            return {}
+
+    metadata = read_metadata("vanguard_nav")
+    stored_windows: Dict[str, List[List[str]]] = metadata.get("stored_windows", {})
+
+    fund_ids = await vg_multi_ticker_to_ticker_id_async(tickers, session, scheduler, cj)
+    # all profile lookups at once, before any window gets planned
+    live_tickers = [ticker for ticker, fund_id in fund_ids.items() if fund_id != -1]
+    inception_dates = dict(
+        zip(
+            live_tickers,
+            await asyncio.gather(
+                *[
+                    vg_get_etf_inception_date_async(ticker, session, scheduler, cj)
+                    for ticker in live_tickers
+                ]
+            ),
+        )
+    )
+    today = date.today()
+    existing_dfs: Dict[str, pd.DataFrame] = {}
+    covered: Dict[str, List[List[date]]] = {}
+    tasks = []
+    for ticker, fund_id in fund_ids.items():
+        if fund_id == -1:
+            continue
+
+        existing_dfs[ticker] = pd.DataFrame()
+        covered[ticker] = []
+        if has_frame("vanguard_nav", ticker) and not fetch_from_inception:
+            existing_dfs[ticker] = read_frame("vanguard_nav", ticker)
+            covered[ticker] = [
+                [date.fromisoformat(start), date.fromisoformat(end)]
+                for start, end in stored_windows.get(ticker, [])
+            ]
+            if not covered[ticker] and not existing_dfs[ticker].empty:
+                # stored before windows were tracked - trust first to last stored date
+                dates = pd.to_datetime(existing_dfs[ticker]["date"], format="%m/%d/%Y")
+                covered[ticker] = [[dates.min().date(), dates.max().date()]]
+
+        # always from inception (profile is cached) - stores written before windows were tracked
+        # only cover first to last stored date, anything before that still needs backfilling
+        inception_date_str = inception_dates[ticker]
+        if inception_date_str:
+            start = datetime.strptime(inception_date_str, "%m-%d-%Y").date()
+        elif covered[ticker]:
+            start = min(x[0] for x in covered[ticker])
+        else:
+            continue
 
-    async def run_fetch_all(
-        fund_ids: List[Dict[str, Dict[str, str | pd.DataFrame]]],
-    ) -> List:
-        async with aiohttp.ClientSession() as session:
-            all_data = await get_promises(session, fund_ids)
-            return all_data
+        for gap_start, gap_end in missing_date_intervals(start, today, covered[ticker]):
+            targets = create_12_month_periods(
+                gap_start.strftime("%m-%d-%Y"), gap_end.strftime("%m-%d-%Y")
+            )
+            # single day gap - create_12_month_periods wants start < end
+            if not targets:
+                targets = [[gap_start.strftime("%m-%d-%Y")] * 2]
 
-    fund_ids = vg_multi_ticker_to_ticker_id(tickers, cj)
-    nested = asyncio.run(run_fetch_all(fund_ids))
-    dict_dfs: Dict[str, List(List[Dict[str, str]], pd.DataFrame | None)] = {}
+            for window in targets:
+                begin, end = [urllib.parse.quote_plus(x) for x in window]
+                curr_url = f"https://personal.vanguard.com/us/funds/tools/pricehistorysearch?radio=1&results=get&FundType=ExchangeTradedShares&FundIntExt=INT&FundId={fund_id}&fundName=0930&radiobutton2=1&beginDate={begin}&endDate={end}&year=#res"
+                window_dates = [datetime.strptime(x, "%m-%d-%Y").date() for x in window]
+                tasks.append(fetch(curr_url, ticker, window_dates))
+
+    nested = await asyncio.gather(*tasks)
+    new_rows: Dict[str, List[Dict[str, str]]] = {ticker: [] for ticker in existing_dfs}
     for data in nested:
-        curr_ticker = data["ticker"]
-        curr_nav_data: List[Dict[str, str]] = data["data"]
-        curr_existing_df: pd.DataFrame = data["existing"]
+        if not data:
+            continue
 
-        if curr_ticker in dict_dfs:
-            dict_dfs[curr_ticker][0].extend(curr_nav_data)
-        else:
-            dict_dfs[curr_ticker] = [None] * 2
-            dict_dfs[curr_ticker][0] = curr_nav_data
-            dict_dfs[curr_ticker][1] = curr_existing_df
+        curr_ticker = data["ticker"]
+        if not data["data"]:
+            continue
+        new_rows[curr_ticker].extend(data["data"])
+
+        window_start, window_end = data["window"]
+        if window_end >= today:
+            # today's nav may not be published yet - only the days we actually got count as stored
+            last_dates = [datetime.strptime(x["date"], "%m/%d/%Y").date() for x in data["data"]]
+            if not last_dates:
+                continue
+            window_end = min(max(last_dates), today - timedelta(days=1))
+            if window_end < window_start:
+                continue
+        covered[curr_ticker].append([window_start, window_end])
 
     result_dict_dfs: Dict[str, pd.DataFrame] = {}
-    for curr_ticker, list in dict_dfs.items():
-        list, existing_df = list
-        new_df = pd.DataFrame()
-        if not existing_df.empty:
-            copy_existing_df = existing_df.copy()
-            to_add_df = pd.DataFrame(list)
-            new_df = pd.concat([copy_existing_df, to_add_df], ignore_index=True)
-            new_df = new_df.drop_duplicates(subset="date", keep="last")
-        else:
-            new_df = pd.DataFrame(list)
+    for curr_ticker, rows in new_rows.items():
+        new_df = merge_nav_frames(existing_dfs[curr_ticker], rows)
+        if new_df.empty:
+            continue
 
         result_dict_dfs[curr_ticker] = new_df
-        new_df.to_excel(f"{raw_path}/{curr_ticker}_nav_prices.xlsx", index=False)
+        write_frame(new_df, "vanguard_nav", curr_ticker)
+        stored_windows[curr_ticker] = [
+            [start.isoformat(), end.isoformat()]
+            for start, end in merge_date_intervals(covered[curr_ticker])
+        ]
+        if make_xlsx:
+            new_df.to_excel(f"{raw_path}/{curr_ticker}_nav_prices.xlsx", index=False)
+
+    metadata["stored_windows"] = stored_windows
+    write_metadata("vanguard_nav", metadata)
 
     return result_dict_dfs
 
 
+def vg_get_historical_nav_prices(
+    tickers: List[str],
+    raw_path: str = None,
+    fetch_from_inception=False,
+    cj: http.cookiejar = None,
+    make_xlsx=False,
+    scheduler: FetchScheduler = None,
+) -> dict[str, pd.DataFrame]:
+    async def run_fetch_all() -> dict[str, pd.DataFrame]:
+        async with aiohttp.ClientSession() as session:
+            return await vg_get_historical_nav_prices_async(
+                tickers,
+                session,
+                scheduler or FetchScheduler(),
+                raw_path,
+                fetch_from_inception,
+                cj,
+                make_xlsx,
+            )
+
+    return asyncio.run(run_fetch_all())
+
+
 def vg_daily_data(
     ticker: str,
-    fund_data_path: str,
-    fund_flow_path: str,
     raw_path=None,
     make_wb: bool = False,
     starting_date: str = None,
     shares_outstanding: int = None,
     cj: http.cookiejar = None,
 ) -> pd.DataFrame:
-    def get_next_idx(df, current_idx):
-        after = df.truncate(before=current_idx).iloc[1:]
-        return after.index[0] if 0 < len(after) else None
-
-    def get_prev_idx(df, current_idx):
-        before = df.truncate(after=current_idx).iloc[:-1]
-        return before.index[-1] if 0 < len(before) else None
-
-    nav_price_path = f"{os.path.dirname(os.path.realpath(__file__))}/vg_nav_data/{ticker}_nav_prices.xlsx"
-    nav_df = pd.read_excel(nav_price_path, parse_dates=["date"]).sort_values("date")
+    nav_df = read_frame("vanguard_nav", ticker)
     nav_df["date"] = pd.to_datetime(nav_df["date"], format="%m/%d/%Y")
+    nav_df = nav_df.sort_values("date")
     nav_df = nav_df[nav_df["date"].dt.year == 2023]
     nav_df.set_index("date", inplace=True)
     nav_df.index.names = ["Date"]
     nav_df = nav_df.loc[~nav_df.index.duplicated(keep="first")]
 
-    fund_flow_df = pd.read_excel(fund_flow_path, parse_dates=["asOf"], index_col=0)
+    fund_flow_df = get_fund_flow_data_by_ticker(ticker, cj).set_index("asOf")
     fund_flow_df.index.names = ["Date"]
     fund_flow_df.rename(columns={"value": "flow"}, inplace=True)
     fund_flow_df["flow"] = fund_flow_df["flow"].apply(lambda x: x * 1e6)
     fund_flow_df.replace(np.nan, 0, inplace=True)
     fund_flow_df = fund_flow_df.loc[~fund_flow_df.index.duplicated(keep="first")]
 
-    fund_data_df = pd.read_excel(fund_data_path, parse_dates=["Date"], index_col=0)
+    fund_data_df = get_yahoofinance_data_by_ticker(ticker, cj).set_index("Date")
     fund_data_df = fund_data_df.loc[~fund_data_df.index.duplicated(keep="first")]
 
     df = pd.concat([fund_data_df, nav_df, fund_flow_df], axis=1)
@@ -433,7 +600,7 @@ def vg_daily_data(
     if not starting_date or not shares_outstanding:
         try:
             fund_id = vg_ticker_to_ticker_id(ticker, cj)
-            res = requests.get(
+            res = cached_get(
                 f"https://advisors.vanguard.com/web/ecs/fpp-fas-product-details/valuation-analytics-data/outstanding-shares/{fund_id}",
                 headers=vg_get_headers(
                     "advisors.vanguard.com",
@@ -443,10 +610,12 @@ def vg_daily_data(
                 ),
             )
             json = res.json()
-            year, month, day = json["effectiveDate"].split("-")
 
             # vanguard runs reports on saturdays
-            starting_date = f"{year}-{month}-{int(day) - 1}"
+            starting_date = (
+                datetime.strptime(json["effectiveDate"], "%Y-%m-%d")
+                - timedelta(days=1)
+            ).strftime("%Y-%m-%d")
             shares_outstanding = json["outstandingShares"]
         except Exception as e:
             print(e)
@@ -458,22 +627,12 @@ def vg_daily_data(
     }
     print(shares_outstanding_starting)
 
-    df["Estimated Shares Outstanding"] = np.nan
-    df.at[
-        shares_outstanding_starting["date"], "Estimated Shares Outstanding"
-    ] = shares_outstanding_starting["shares"]
-    for idx in df.index:
-        if idx > datetime.strptime(shares_outstanding_starting["date"], "%Y-%m-%d"):
-            df.loc[idx, "Estimated Shares Outstanding"] = (
-                df.loc[get_prev_idx(df, idx), "Estimated Shares Outstanding"]
-                + df.loc[idx, "Estimated Daily Creation Units"]
-            )
-    for idx in reversed(df.index):
-        if idx < datetime.strptime(shares_outstanding_starting["date"], "%Y-%m-%d"):
-            df.loc[idx, "Estimated Shares Outstanding"] = (
-                df.loc[get_next_idx(df, idx), "Estimated Shares Outstanding"]
-                - df.loc[idx, "Estimated Daily Creation Units"]
-            )
+    df["Estimated Shares Outstanding"] = calc_estimated_shares_outstanding(
+        df.index,
+        df["Estimated Daily Creation Units"],
+        shares_outstanding_starting["date"],
+        shares_outstanding_starting["shares"],
+    )
 
     if make_wb:
         df.to_excel(
@@ -19,7 +19,9 @@ import zipfile
 from multiprocessing import Process
 import shutil
 from vanguard.vg_summary import vg_get_basic_headers
-import requests
+from common.store import write_frame
+from common.scheduler import FetchScheduler
+from common.http_cache import cached_get, cached_fetch
 
 
 @dataclass
@@ -72,42 +74,39 @@ def run_in_parallel(*fns):
         p.join()
 
 
-def vg_parallel_get_portfolio_data_api(
-    funds: List[ETFInfo], cj: http.cookiejar, clean_path: str
+async def vg_parallel_get_portfolio_data_api_async(
+    funds: List[ETFInfo],
+    cj: http.cookiejar,
+    session: aiohttp.ClientSession,
+    scheduler: FetchScheduler,
+    clean_path: str = None,
+    make_xlsx=False,
 ):
     async def fetch(
-        session: aiohttp.ClientSession, url: str, curr_ticker: str, curr_asset: Asset
+        url: str, curr_ticker: str, curr_asset: Asset
     ) -> Union[List[Dict], None]:
         try:
             headers = vg_get_basic_headers(cj)
             headers[
                 "path"
             ] = f"/investment-products/etfs/profile/api/{curr_ticker}/portfolio-holding/{curr_asset.value}"
-            async with session.get(url, headers=headers) as response:
-                json_data = await response.json()
-                return json_data
+            res = await cached_fetch(session, scheduler, url, headers=headers)
+            return res.json()
         except Exception as e:
-            print(f"An error occurred: {e}")
+            print(f"An error occurred: {curr_ticker} - {e}")
             return {}
 
-    async def get_promises(session: aiohttp.ClientSession) -> List[Dict]:
-        tasks = []
-        for fund in funds:
-            curr_url = f"https://investor.vanguard.com/investment-products/etfs/profile/api/{fund.ticker}/portfolio-holding/{fund.asset_class.value}"
-            task = fetch(session, curr_url, fund.ticker, fund.asset_class)
-            tasks.append(task)
-
-        return await asyncio.gather(*tasks)
-
-    async def run_fetch_all():
-        async with aiohttp.ClientSession() as session:
-            all_data = await get_promises(session)
-            return all_data
+    tasks = []
+    for fund in funds:
+        curr_url = f"https://investor.vanguard.com/investment-products/etfs/profile/api/{fund.ticker}/portfolio-holding/{fund.asset_class.value}"
+        tasks.append(fetch(curr_url, fund.ticker, fund.asset_class))
 
-    responses = asyncio.run(run_fetch_all())
+    responses = await asyncio.gather(*tasks)
     holdings_data = dict(zip([fund.ticker for fund in funds], responses))
 
     for ticker in holdings_data:
+        if not holdings_data[ticker]:
+            continue
         try:
             as_of_date_raw = holdings_data[ticker]["asOfDate"]
             date_obj = datetime.strptime(as_of_date_raw, "%Y-%m-%dT%H:%M:%S%z")
@@ -125,8 +124,9 @@ def vg_parallel_get_portfolio_data_api(
 
         try:
             curr_df = pd.DataFrame(holdings_data[ticker]["fund"]["entity"])
-            curr_df = curr_df.fillna("DNE")
-            curr_df.to_excel(wb_name, index=False)
+            write_frame(curr_df, "vanguard_holdings", ticker, date_obj)
+            if make_xlsx:
+                curr_df.fillna("DNE").to_excel(wb_name, index=False)
         except Exception as e:
             print(
                 f"Error with {ticker} - Is this the correct Ticker? - Does this exist?"
@@ -137,14 +137,37 @@ def vg_parallel_get_portfolio_data_api(
     return holdings_data
 
 
-def vg_single_get_portfolio_data_api(funds: ETFInfo, cj: http.cookiejar, clean_path: str):
+def vg_parallel_get_portfolio_data_api(
+    funds: List[ETFInfo],
+    cj: http.cookiejar,
+    clean_path: str = None,
+    make_xlsx=False,
+    scheduler: FetchScheduler = None,
+):
+    async def run_fetch_all():
+        async with aiohttp.ClientSession() as session:
+            return await vg_parallel_get_portfolio_data_api_async(
+                funds,
+                cj,
+                session,
+                scheduler or FetchScheduler(),
+                clean_path,
+                make_xlsx,
+            )
+
+    return asyncio.run(run_fetch_all())
+
+
+def vg_single_get_portfolio_data_api(
+    funds: ETFInfo, cj: http.cookiejar, clean_path: str = None, make_xlsx=False
+):
     ticker, asset = funds.ticker, funds.asset_class.value
     headers = vg_get_basic_headers(cj)
     headers[
         "path"
     ] = f"/investment-products/etfs/profile/api/{ticker}/portfolio-holding/{asset}"
     url = f"https://investor.vanguard.com/investment-products/etfs/profile/api/{ticker}/portfolio-holding/{asset}"
-    res = requests.get(url, headers=headers)
+    res = cached_get(url, headers=headers)
 
     holdings_data = res.json()
     try:
@@ -160,8 +183,9 @@ def vg_single_get_portfolio_data_api(funds: ETFInfo, cj: http.cookiejar, clean_p
 
     try:
         curr_df = pd.DataFrame(holdings_data["fund"]["entity"])
-        curr_df = curr_df.fillna("DNE")
-        curr_df.to_excel(wb_name, index=False)
+        write_frame(curr_df, "vanguard_holdings", ticker, date_obj)
+        if make_xlsx:
+            curr_df.fillna("DNE").to_excel(wb_name, index=False)
     except Exception as e:
         print(f"Error with {ticker} - Is this the correct Ticker? - Does this exist?")
         print(e)
@@ -1,4 +1,3 @@
-import requests
 import pandas as pd
 from datetime import datetime
 import http
@@ -7,6 +6,11 @@ from typing import Tuple
 import webbrowser
 import time
 
+from common.store import write_frame
+from common.http_cache import cached_get
+from common.symbology import get_symbology
+
+
 # need to update path
 def vg_get_basic_headers(cj: http.cookiejar, open_chrome=False) -> Tuple[dict, str]:
     # gets short term cookies
@@ -51,7 +55,7 @@ def vg_get_basic_headers(cj: http.cookiejar, open_chrome=False) -> Tuple[dict, s
 
 def vg_get_all_fund_data() -> dict:
     url = "https://investor.vanguard.com/investment-products/list/funddetail"
-    res = requests.get(url)
+    res = cached_get(url)
     json_res = res.json()
     fund_info_list = json_res["fund"]["entity"]
 
@@ -70,6 +74,7 @@ def vg_filter_all_fund_data(fund_data: dict) -> dict:
 
     filtered["ticker"] = profile.get("ticker", "DNE")
     filtered["cusip"] = profile.get("cusip", "DNE")
+    filtered["fund_id"] = profile.get("fundId", "DNE")
     filtered["name"] = profile.get("longName", "DNE")
     filtered["expenseRatio"] = profile.get("expenseRatio", "DNE")
     filtered["active"] = profile.get("fundFact", {}).get("isActiveFund", "DNE")
@@ -222,23 +227,23 @@ def vg_all_funds_data(parent_dir: str = None) -> pd.DataFrame:
         filtered.append(vg_filter_all_fund_data(fund))
         flatten.append(flatten_json(fund))
 
-    curr_date = datetime.today().strftime("%Y-%m-%d")
-    wb_name = (
-        f"{parent_dir}/{curr_date}_vg_fund_info.xlsx"
-        if (parent_dir)
-        else f"{curr_date}_vg_fund_info.xlsx"
-    )
+    filtered_df = pd.DataFrame(filtered)
+    filtered_df.drop(filtered_df[filtered_df.ticker == "DNE"].index, inplace=True)
 
-    with pd.ExcelWriter(wb_name) as writer:
-        filtered_df = pd.DataFrame(filtered)
-        filtered_df.drop(filtered_df[filtered_df.ticker == "DNE"].index, inplace=True)
-        filtered_df.to_excel(writer, sheet_name="vg_fund_info_filtered", index=False)
+    flatten_df = pd.DataFrame(flatten)
+    flatten_df = flatten_df.dropna(subset=["profile_ticker"])
 
-        flatten_df = pd.DataFrame(flatten)
-        flatten_df = flatten_df.fillna("DNE")
-        flatten_df.drop(
-            flatten_df[flatten_df.profile_ticker == "DNE"].index, inplace=True
-        )
-        flatten_df.to_excel(writer, sheet_name="vg_fund_info_flatten", index=False)
+    curr_date = datetime.today().strftime("%Y-%m-%d")
+    write_frame(filtered_df, "vanguard_funds", "filtered", curr_date)
+    write_frame(flatten_df, "vanguard_funds", "flatten", curr_date)
+    get_symbology().add_vanguard_funds(filtered_df)
+
+    if parent_dir:
+        wb_name = f"{parent_dir}/{curr_date}_vg_fund_info.xlsx"
+        with pd.ExcelWriter(wb_name) as writer:
+            filtered_df.to_excel(writer, sheet_name="vg_fund_info_filtered", index=False)
+            flatten_df.fillna("DNE").to_excel(
+                writer, sheet_name="vg_fund_info_flatten", index=False
+            )
 
     return filtered_df